@@ -0,0 +1,60 @@
+"""
+Registo de atividade (auditoria) com escrita em lote.
+
+`activity_logger.log(...)` só acrescenta o evento ao buffer do
+BufferedWriter; os eventos são gravados com `insert_many(ordered=False)`.
+"""
+from typing import Optional, Dict, Any, List
+import logging
+import os
+
+from pymongo.errors import BulkWriteError
+
+from batching import BufferedWriter
+from database import activity_logs_collection
+from models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityLogger(BufferedWriter):
+    name = "activity-logger"
+
+    def __init__(self, collection, **kwargs):
+        super().__init__(**kwargs)
+        self.collection = collection
+
+    @classmethod
+    def from_env(cls, collection) -> "ActivityLogger":
+        return cls(
+            collection,
+            batch_size=int(os.environ.get("ACTIVITY_BATCH_SIZE", 200)),
+            flush_interval=float(os.environ.get("ACTIVITY_FLUSH_INTERVAL", 2.0)),
+            max_buffer=int(os.environ.get("ACTIVITY_MAX_BUFFER", 10000)),
+            overflow_policy=os.environ.get("ACTIVITY_OVERFLOW", "drop_oldest"),
+        )
+
+    def log(
+        self,
+        action: str,
+        user_id: Optional[str] = None,
+        details: Optional[str] = None,
+    ) -> None:
+        """Regista um evento sem esperar pela DB (não bloqueia o request)."""
+        self.submit(ActivityLog(user_id=user_id, action=action, details=details).dict())
+
+    async def write_batch(self, batch: List[Dict[str, Any]]) -> int:
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+            return len(batch)
+        except BulkWriteError as e:
+            # ordered=False: os restantes foram gravados
+            self.stats["flush_errors"] += 1
+            logger.warning(
+                "Activity log batch partially failed: %d errors",
+                len(e.details.get("writeErrors", [])),
+            )
+            return e.details.get("nInserted", 0)
+
+
+activity_logger = ActivityLogger.from_env(activity_logs_collection)
@@ -0,0 +1,280 @@
+"""
+Arquivo de pedidos antigos (hot/cold).
+
+OrderArchiver move os pedidos concluídos (estado terminal: entregue,
+cancelado, expirado) sem alterações há mais de `archive_after`, e os
+respetivos pagamentos, para `orders_archive` / `payments_archive`. Cada lote:
+
+1. copia pagamentos e pedidos para o arquivo (ReplaceOne com upsert, por isso
+   repetir um lote interrompido é seguro);
+2. apaga os pedidos da coleção quente, com o mesmo filtro da seleção: um
+   pedido alterado entretanto fica onde está e volta a ser copiado depois;
+3. apaga os pagamentos dos pedidos que saíram de facto.
+
+As leituras (`repos.orders`, admin_get_order, a exportação e os totais do
+dashboard) procuram também no arquivo; um pedido que esteja nas duas
+coleções a meio de um lote é devolvido uma só vez (o da coleção quente, nas
+leituras por número). Os números de pedido têm 10 dígitos aleatórios
+(checkout.py), por isso o checkout não volta a sortear números arquivados na
+prática, sem ter de ler o arquivo a cada pedido.
+"""
+from typing import Any, AsyncIterator, Dict, List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import heapq
+import logging
+import os
+import time
+
+from pymongo import ReplaceOne
+
+from database import (
+    db,
+    orders_archive_collection,
+    orders_collection,
+    payments_archive_collection,
+    payments_collection,
+)
+from order_owners import order_owner_keys
+from order_states import ORDER_TRANSITIONS
+
+logger = logging.getLogger(__name__)
+
+# estados sem transições de saída
+ARCHIVABLE_STATUSES = sorted(s for s, nxt in ORDER_TRANSITIONS.items() if not nxt)
+
+SIZE_REPORT_COLLECTIONS = ("orders", "payments", "orders_archive", "payments_archive")
+
+
+async def collection_sizes() -> Dict[str, Any]:
+    """Documentos, tamanho de dados e memória de índices por coleção."""
+    report: Dict[str, Any] = {}
+    for name in SIZE_REPORT_COLLECTIONS:
+        try:
+            stats = await db[name].aggregate(
+                [{"$collStats": {"storageStats": {}}}]
+            ).to_list(1)
+            storage = stats[0]["storageStats"] if stats else {}
+            report[name] = {
+                "count": storage.get("count", 0),
+                "size_bytes": storage.get("size", 0),
+                "storage_bytes": storage.get("storageSize", 0),
+                "index_bytes": storage.get("totalIndexSize", 0),
+                "index_sizes": storage.get("indexSizes", {}),
+            }
+        except Exception as e:
+            # servidor/cliente sem $collStats: o relatório fica só com o erro
+            report[name] = {"error": str(e)}
+    return report
+
+
+async def merge_by_created_at(
+    *cursors, unique: str = "order_number"
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Junta cursores já ordenados por created_at desc numa única sequência.
+    Um documento presente em dois cursores (a meio de um lote de arquivo) sai
+    uma só vez: as cópias têm o mesmo created_at, logo saem seguidas.
+    """
+    iterators = [cursor.__aiter__() for cursor in cursors]
+    heap: List[Any] = []
+    last_key: Optional[float] = None
+    seen_at_key: set = set()
+
+    async def push(i: int) -> None:
+        try:
+            doc = await iterators[i].__anext__()
+        except StopAsyncIteration:
+            return
+        # created_at negado via timestamp: heapq é um min-heap
+        heapq.heappush(heap, (-doc["created_at"].timestamp(), i, doc))
+
+    for i in range(len(iterators)):
+        await push(i)
+    while heap:
+        key, i, doc = heapq.heappop(heap)
+        if key != last_key:
+            last_key, seen_at_key = key, set()
+        if doc.get(unique) not in seen_at_key:
+            seen_at_key.add(doc.get(unique))
+            yield doc
+        await push(i)
+
+
+class OrderArchiver:
+    def __init__(
+        self,
+        interval_seconds: float = 86400.0,
+        archive_after: timedelta = timedelta(days=180),
+        batch_size: int = 500,
+        max_batches_per_run: int = 20,
+    ):
+        self.interval_seconds = interval_seconds
+        self.archive_after = archive_after
+        self.batch_size = batch_size
+        self.max_batches_per_run = max_batches_per_run
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.stats: Dict[str, Any] = {
+            "runs": 0,
+            "last_run_at": None,
+            "last_duration_ms": None,
+            "archived_orders": 0,
+            "archived_payments": 0,
+            "last_report": None,
+            "last_error": None,
+        }
+
+    @classmethod
+    def from_env(cls) -> "OrderArchiver":
+        return cls(
+            interval_seconds=float(
+                os.environ.get("ORDER_ARCHIVE_INTERVAL_SECONDS", 86400)
+            ),
+            archive_after=timedelta(
+                days=float(os.environ.get("ORDER_ARCHIVE_AFTER_DAYS", 180))
+            ),
+            batch_size=int(os.environ.get("ORDER_ARCHIVE_BATCH_SIZE", 500)),
+            max_batches_per_run=int(os.environ.get("ORDER_ARCHIVE_MAX_BATCHES", 20)),
+        )
+
+    # -----------------------------------------------------------------
+    # ciclo de vida
+    # -----------------------------------------------------------------
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="order-archiver")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["last_error"] = str(e)
+                logger.error("Order archiving failed: %s", e)
+            await asyncio.sleep(self.interval_seconds)
+
+    # -----------------------------------------------------------------
+    # execução
+    # -----------------------------------------------------------------
+    def archivable_filter(self, now: datetime) -> Dict[str, Any]:
+        return {
+            "status": {"$in": ARCHIVABLE_STATUSES},
+            "updated_at": {"$lt": now - self.archive_after},
+        }
+
+    async def run_once(self, report: bool = True) -> Dict[str, Any]:
+        """Arquiva até `max_batches_per_run` lotes; com `report`, mede antes/depois."""
+        async with self._lock:
+            started = time.perf_counter()
+            now = datetime.utcnow()
+            totals: Dict[str, Any] = {"archived_orders": 0, "archived_payments": 0}
+            before = await collection_sizes() if report else None
+
+            for _ in range(self.max_batches_per_run):
+                orders, payments = await self._archive_batch(now)
+                totals["archived_orders"] += orders
+                totals["archived_payments"] += payments
+                if orders < self.batch_size:
+                    break
+                await asyncio.sleep(0)
+
+            if report:
+                totals["sizes_before"] = before
+                totals["sizes_after"] = await collection_sizes()
+                self.stats["last_report"] = totals["sizes_after"]
+
+            duration_ms = (time.perf_counter() - started) * 1000
+            self.stats["runs"] += 1
+            self.stats["last_run_at"] = now.isoformat()
+            self.stats["last_duration_ms"] = round(duration_ms, 2)
+            self.stats["last_error"] = None
+            self.stats["archived_orders"] += totals["archived_orders"]
+            self.stats["archived_payments"] += totals["archived_payments"]
+            if totals["archived_orders"]:
+                logger.info(
+                    "Archived %d orders and %d payments in %.1fms",
+                    totals["archived_orders"],
+                    totals["archived_payments"],
+                    duration_ms,
+                )
+            return totals
+
+    async def _archive_batch(self, now: datetime):
+        selection = self.archivable_filter(now)
+        orders = await orders_collection.find(selection).limit(
+            self.batch_size
+        ).to_list(self.batch_size)
+        if not orders:
+            return 0, 0
+
+        numbers = [order["order_number"] for order in orders]
+        payments = await payments_collection.find(
+            {"order_number": {"$in": numbers}}
+        ).to_list(None)
+
+        if payments:
+            await payments_archive_collection.bulk_write(
+                [
+                    ReplaceOne(
+                        {"_id": p["_id"]}, {**p, "archived_at": now}, upsert=True
+                    )
+                    for p in payments
+                ],
+                ordered=False,
+            )
+        # owner_keys sempre presentes no arquivo: "os meus pedidos" só usa o
+        # $in sobre elas nesta coleção (ver order_owners.py)
+        await orders_archive_collection.bulk_write(
+            [
+                ReplaceOne(
+                    {"_id": o["_id"]},
+                    {
+                        **o,
+                        "owner_keys": o.get("owner_keys") or order_owner_keys(o),
+                        "archived_at": now,
+                    },
+                    upsert=True,
+                )
+                for o in orders
+            ],
+            ordered=False,
+        )
+
+        result = await orders_collection.delete_many(
+            {"_id": {"$in": [o["_id"] for o in orders]}, **selection}
+        )
+        moved = set(numbers)
+        if result.deleted_count < len(orders):
+            # alterados entre a leitura e o delete: ficam na coleção quente
+            async for doc in orders_collection.find(
+                {"order_number": {"$in": numbers}}, {"order_number": 1}
+            ):
+                moved.discard(doc["order_number"])
+
+        payments_deleted = 0
+        moved_payments = [p["_id"] for p in payments if p["order_number"] in moved]
+        if moved_payments:
+            payments_deleted = (
+                await payments_collection.delete_many({"_id": {"$in": moved_payments}})
+            ).deleted_count
+        return result.deleted_count, payments_deleted
+
+
+order_archiver = OrderArchiver.from_env()
@@ -0,0 +1,120 @@
+"""
+Escritor em lote genérico para eventos "fire-and-forget".
+
+`submit(doc)` só acrescenta ao buffer; uma task em background chama
+`write_batch` (abstrato: cada subclasse decide como grava) quando o buffer
+chega a `batch_size` documentos ou a cada `flush_interval` segundos. O
+buffer é limitado (`max_buffer`) e a política de overflow decide o que se
+perde: "drop_oldest" (default) ou "drop_newest".
+"""
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Optional, Dict, Any, Deque, List
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedWriter(ABC):
+    name = "buffered-writer"
+
+    def __init__(
+        self,
+        batch_size: int = 200,
+        flush_interval: float = 2.0,
+        max_buffer: int = 10000,
+        overflow_policy: str = "drop_oldest",
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.overflow_policy = overflow_policy
+        self._buffer: Deque[Dict[str, Any]] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {
+            "submitted": 0,
+            "flushed": 0,
+            "dropped": 0,
+            "flush_errors": 0,
+        }
+
+    @abstractmethod
+    async def write_batch(self, batch: List[Dict[str, Any]]) -> int:
+        """Grava um lote; devolve quantos documentos foram escritos."""
+
+    def submit(self, doc: Dict[str, Any]) -> None:
+        """Acrescenta um documento sem esperar pela DB (não bloqueia o request)."""
+        if len(self._buffer) >= self.max_buffer:
+            self.stats["dropped"] += 1
+            if self.overflow_policy == "drop_newest":
+                return
+            self._buffer.popleft()
+
+        self._buffer.append(doc)
+        self.stats["submitted"] += 1
+
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buffer)
+
+    # -----------------------------------------------------------------
+    # ciclo de vida
+    # -----------------------------------------------------------------
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name=self.name)
+
+    async def stop(self) -> None:
+        """Pára o flusher e grava tudo o que ainda está no buffer."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        written = 0
+        while self._buffer:
+            batch = [
+                self._buffer.popleft()
+                for _ in range(min(self.batch_size, len(self._buffer)))
+            ]
+            try:
+                written += await self.write_batch(batch)
+            except asyncio.CancelledError:
+                # stop() a meio de uma escrita: o lote volta ao buffer
+                self._requeue(batch)
+                raise
+            except Exception as e:
+                self.stats["flush_errors"] += 1
+                self._requeue(batch)
+                logger.error("%s flush failed: %s", self.name, e)
+                break
+        self.stats["flushed"] += written
+        return written
+
+    def _requeue(self, batch: List[Dict[str, Any]]) -> None:
+        """Devolve um lote falhado ao início do buffer, sem passar o limite."""
+        room = max(self.max_buffer - len(self._buffer), 0)
+        if room < len(batch):
+            self.stats["dropped"] += len(batch) - room
+            batch = batch[len(batch) - room:]
+        self._buffer.extendleft(reversed(batch))
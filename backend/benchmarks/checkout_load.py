@@ -0,0 +1,118 @@
+"""
+Benchmark de carga do checkout: N pedidos POST /api/orders com concorrência
+fixa, contra a app real (ASGI em processo) e o MongoDB de MONGO_URL/DB_NAME.
+
+Mostra throughput, p50/p95/p99 do request e a duração de cada etapa do
+pipeline (validate, price, allocate, insert, enqueue).
+
+    cd backend && DB_NAME=lrstore_bench python benchmarks/checkout_load.py \\
+        [--requests 2000] [--concurrency 32]
+
+Usar sempre uma base de dados descartável: o benchmark cria pedidos reais.
+"""
+from pathlib import Path
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+
+from metrics import http_metrics  # noqa: E402
+from server import app  # noqa: E402
+from seed_data import products_data  # noqa: E402
+
+
+def _order_payload(rng: random.Random) -> dict:
+    items = [
+        {
+            "product_id": product["id"],
+            "name": product["name"],
+            "quantity": rng.randint(1, 3),
+            "price": product["price"],
+            "image": product["image"],
+        }
+        for product in rng.sample(products_data, k=rng.randint(1, 3))
+    ]
+    return {
+        "customer": {
+            "name": "Bench",
+            "email": f"Bench{rng.randint(1, 500)}@Example.com",
+            "phone": "923000000",
+            "address": "Rua do Benchmark",
+            "city": "Luanda",
+        },
+        "items": items,
+        "payment_method": "multicaixa-reference",
+        "total": sum(i["price"] * i["quantity"] for i in items),
+    }
+
+
+def _percentile(sorted_values, q: float) -> float:
+    index = min(int(q * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+async def main(total_requests: int, concurrency: int) -> None:
+    rng = random.Random(42)
+    payloads = [_order_payload(rng) for _ in range(total_requests)]
+    latencies: list = []
+    errors = 0
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        await app.router.startup()
+        queue: asyncio.Queue = asyncio.Queue()
+        for payload in payloads:
+            queue.put_nowait(payload)
+
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                payload = queue.get_nowait()
+                started = time.perf_counter()
+                response = await client.post("/api/orders", json=payload)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    errors += 1
+
+        # aquecimento (ligações do pool, caches do servidor)
+        for payload in payloads[: min(50, total_requests)]:
+            await client.post("/api/orders", json=payload)
+        http_metrics.stages.clear()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        await app.router.shutdown()
+
+    latencies.sort()
+    print(f"requests:    {total_requests} (concurrency {concurrency}, {errors} errors)")
+    print(f"throughput:  {total_requests / elapsed:.1f} orders/s")
+    print(
+        f"latency:     p50 {_percentile(latencies, 0.5):.2f}ms  "
+        f"p95 {_percentile(latencies, 0.95):.2f}ms  "
+        f"p99 {_percentile(latencies, 0.99):.2f}ms  "
+        f"mean {statistics.mean(latencies):.2f}ms"
+    )
+    print("stages (bucket upper bounds):")
+    for (pipeline, stage), hist in sorted(http_metrics.stages.items()):
+        snap = hist.snapshot()
+        print(
+            f"  {stage:<9} avg {snap['avg_ms']:.3f}ms  p50 {snap['p50_ms']}ms  "
+            f"p95 {snap['p95_ms']}ms  p99 {snap['p99_ms']}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,438 @@
+"""
+Gerador determinístico de dados sintéticos em volume (testes de escala).
+
+Parte das formas de `categories_data`/`products_data` do seed_data.py e
+gera produtos, utilizadores, moradas, carrinhos, favoritos, pedidos e
+pagamentos em quantidades configuráveis. Cada lote tem o seu próprio
+gerador aleatório (semente + tipo + nº do lote), por isso o resultado é o
+mesmo qualquer que seja o paralelismo. Os lotes são gravados com
+`insert_many(ordered=False)`, vários em paralelo.
+
+Os ids sintéticos têm prefixo próprio (`syn-`, números de pedido `S…`)
+para não colidirem com o seed nem com pedidos reais.
+
+    cd backend && DB_NAME=lrstore_scale python benchmarks/generate_dataset.py \\
+        --products 50000 --orders 1000000 --users 200000 --drop --explain
+"""
+from datetime import datetime, timedelta
+from itertools import accumulate
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from order_owners import order_owner_keys  # noqa: E402
+from seed_data import categories_data, products_data  # noqa: E402
+
+NOW = datetime(2026, 1, 1)
+COLORS = sorted({color for p in products_data for color in p.get("colors", [])})
+PROVINCES = ["Luanda", "Benguela", "Huíla", "Huambo", "Cabinda", "Namibe"]
+
+# nº de itens por pedido: a maioria compra 1-2 produtos
+ITEMS_PER_ORDER = [1, 2, 3, 4, 5, 6]
+ITEMS_WEIGHTS = [50, 25, 12, 7, 4, 2]
+
+# (status, payment_status, peso) — pedidos antigos estão quase todos fechados
+ORDER_STATES = [
+    ("delivered", "paid", 55),
+    ("shipped", "paid", 8),
+    ("processing", "paid", 5),
+    ("confirmed", "paid", 10),
+    ("pending", "pending", 12),
+    ("cancelled", "failed", 5),
+    ("expired", "expired", 5),
+]
+STATE_PATHS = {
+    "pending": ["pending"],
+    "confirmed": ["pending", "confirmed"],
+    "processing": ["pending", "confirmed", "processing"],
+    "shipped": ["pending", "confirmed", "processing", "shipped"],
+    "delivered": ["pending", "confirmed", "processing", "shipped", "delivered"],
+    "cancelled": ["pending", "cancelled"],
+    "expired": ["pending", "expired"],
+}
+
+
+def _rng(seed: int, kind: str, chunk: int) -> random.Random:
+    return random.Random(f"{seed}:{kind}:{chunk}")
+
+
+def _past(rng: random.Random, days: int) -> datetime:
+    return NOW - timedelta(seconds=rng.randrange(days * 86400))
+
+
+class Dataset:
+    """Parâmetros partilhados pelos geradores de cada coleção."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.seed = args.seed
+        self.products = args.products
+        self.users = args.users
+        self.categories = [c["slug"] for c in categories_data if c.get("slug")]
+        # popularidade tipo Zipf: poucos produtos concentram as vendas
+        self.product_cum_weights = list(
+            accumulate(1 / (rank + 1) ** 0.9 for rank in range(self.products))
+        )
+        self._catalog: Dict[int, Tuple[str, str, float, str]] = {}
+        self.password_hash = _password_hash()
+
+    def product_fields(self, index: int) -> Tuple[str, str, float, str]:
+        """(id, nome, preço, imagem) do produto sintético nº `index`."""
+        cached = self._catalog.get(index)
+        if cached is None:
+            rng = _rng(self.seed, "product", index)
+            template = products_data[index % len(products_data)]
+            price = round(template["price"] * rng.uniform(0.5, 2.0), -1)
+            cached = self._catalog[index] = (
+                f"syn-p{index}",
+                f"{template['name']} #{index}",
+                price,
+                template["image"],
+            )
+        return cached
+
+    def pick_product(self, rng: random.Random) -> int:
+        return rng.choices(
+            range(self.products), cum_weights=self.product_cum_weights
+        )[0]
+
+
+def _password_hash() -> str:
+    # pbkdf2 é lento de propósito: um hash único para todos (password123)
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["pbkdf2_sha256"]).hash("password123")
+
+
+# =====================================================================
+# GERADORES (um lote de cada vez)
+# =====================================================================
+def gen_products(ds: Dataset, start: int, end: int, chunk: int) -> List[Dict]:
+    docs = []
+    for i in range(start, end):
+        rng = _rng(ds.seed, "product", i)
+        template = products_data[i % len(products_data)]
+        product_id, name, price, image = ds.product_fields(i)
+        is_promo = rng.random() < 0.15
+        created = _past(rng, 730)
+        docs.append(
+            {
+                "id": product_id,
+                "name": name,
+                "category": rng.choice(ds.categories),
+                "price": price,
+                "original_price": round(price * 1.2, -1) if is_promo else None,
+                "image": image,
+                "description": template["description"],
+                "stock": rng.choice([0, rng.randint(1, 20), rng.randint(20, 500)]),
+                "colors": rng.sample(COLORS, k=min(len(COLORS), rng.randint(1, 4))),
+                "featured": rng.random() < 0.02,
+                "is_new": rng.random() < 0.05,
+                "is_promo": is_promo,
+                "rating": round(rng.uniform(3.0, 5.0), 1),
+                "gallery": template.get("gallery", []),
+                "created_at": created,
+                "updated_at": created,
+            }
+        )
+    return docs
+
+
+def gen_users(ds: Dataset, start: int, end: int, chunk: int) -> List[Dict]:
+    rng = _rng(ds.seed, "users", chunk)
+    docs = []
+    for i in range(start, end):
+        created = _past(rng, 1095)
+        docs.append(
+            {
+                "id": f"syn-u{i}",
+                "name": f"Cliente {i}",
+                "email": f"cliente{i}@synthetic.lrstore.ao",
+                "phone": f"9{rng.randrange(10**8):08d}",
+                "is_admin": False,
+                "hashed_password": ds.password_hash,
+                "created_at": created,
+                "updated_at": created,
+            }
+        )
+    return docs
+
+
+def gen_addresses(ds: Dataset, start: int, end: int, chunk: int) -> List[Dict]:
+    rng = _rng(ds.seed, "addresses", chunk)
+    docs = []
+    for i in range(start, end):
+        user = rng.randrange(ds.users)
+        created = _past(rng, 1095)
+        docs.append(
+            {
+                "id": f"syn-a{i}",
+                "user_id": f"syn-u{user}",
+                "contact_name": f"Cliente {user}",
+                "phone": f"9{rng.randrange(10**8):08d}",
+                "province": rng.choice(PROVINCES),
+                "municipality": f"Município {rng.randint(1, 30)}",
+                "neighborhood": f"Bairro {rng.randint(1, 200)}",
+                "street": f"Rua {rng.randint(1, 999)}",
+                "created_at": created,
+                "updated_at": created,
+            }
+        )
+    return docs
+
+
+def gen_carts(ds: Dataset, start: int, end: int, chunk: int) -> List[Dict]:
+    # um carrinho por utilizador (índice único em user_id)
+    rng = _rng(ds.seed, "carts", chunk)
+    return [
+        {
+            "id": f"syn-c{i}",
+            "user_id": f"syn-u{i}",
+            "items": [
+                {
+                    "product_id": ds.product_fields(ds.pick_product(rng))[0],
+                    "quantity": rng.randint(1, 3),
+                    "selected_color": rng.choice(COLORS) if COLORS else None,
+                }
+                for _ in range(rng.randint(1, 5))
+            ],
+            "updated_at": _past(rng, 60),
+        }
+        for i in range(start, end)
+    ]
+
+
+def _user_favorites(ds: Dataset, user: int, count: int) -> List[int]:
+    """
+    Os primeiros `count` produtos favoritos do utilizador, sem repetidos
+    (índice único em user_id + product_id). O gerador é por utilizador, por
+    isso a lista é a mesma em qualquer lote; um produto repetido passa ao
+    seguinte ainda livre.
+    """
+    rng = _rng(ds.seed, "favorite-products", user)
+    picked: List[int] = []
+    seen = set()
+    for _ in range(min(count, ds.products)):
+        index = ds.pick_product(rng)
+        while index in seen:
+            index = (index + 1) % ds.products
+        seen.add(index)
+        picked.append(index)
+    return picked
+
+
+def gen_favorites(ds: Dataset, start: int, end: int, chunk: int) -> List[Dict]:
+    # o favorito i é o nº i // users do utilizador i % users
+    rng = _rng(ds.seed, "favorites", chunk)
+    per_user: Dict[int, List[int]] = {}
+    docs = []
+    for i in range(start, end):
+        user, slot = i % ds.users, i // ds.users
+        if user not in per_user:
+            per_user[user] = _user_favorites(ds, user, (end - 1 - user) // ds.users + 1)
+        docs.append(
+            {
+                "id": f"syn-f{i}",
+                "user_id": f"syn-u{user}",
+                "product_id": ds.product_fields(per_user[user][slot])[0],
+                "created_at": _past(rng, 730),
+            }
+        )
+    return docs
+
+
+_STATES, _STATE_WEIGHTS = (
+    [(s, p) for s, p, _ in ORDER_STATES],
+    [w for _, _, w in ORDER_STATES],
+)
+
+
+def gen_orders(ds: Dataset, start: int, end: int, chunk: int) -> List[Dict]:
+    rng = _rng(ds.seed, "orders", chunk)
+    docs = []
+    for i in range(start, end):
+        created = _past(rng, 730)
+        status, payment_status = rng.choices(_STATES, _STATE_WEIGHTS)[0]
+        items = []
+        for _ in range(rng.choices(ITEMS_PER_ORDER, ITEMS_WEIGHTS)[0]):
+            product_id, name, price, image = ds.product_fields(ds.pick_product(rng))
+            items.append(
+                {
+                    "product_id": product_id,
+                    "name": name,
+                    "quantity": rng.choices([1, 2, 3, 5], [70, 20, 7, 3])[0],
+                    "selected_color": rng.choice(COLORS) if COLORS else None,
+                    "price": price,
+                    "image": image,
+                }
+            )
+
+        # 70% clientes registados, o resto checkout como convidado
+        user = rng.randrange(ds.users) if ds.users else None
+        registered = user is not None and rng.random() < 0.7
+        history = [
+            {"at": created + timedelta(hours=6 * step), "status": state}
+            for step, state in enumerate(STATE_PATHS[status])
+        ]
+        history[0]["payment_status"] = "pending"
+        if payment_status != "pending":
+            history[min(1, len(history) - 1)]["payment_status"] = payment_status
+
+        docs.append(
+            {
+                "id": f"syn-o{i}",
+                "order_number": f"S{i:07d}",
+                "user_id": f"syn-u{user}" if registered else None,
+                "customer": {
+                    "name": f"Cliente {user}",
+                    "email": (
+                        f"cliente{user}@synthetic.lrstore.ao"
+                        if registered
+                        else f"convidado{i}@synthetic.lrstore.ao"
+                    ),
+                    "phone": f"9{rng.randrange(10**8):08d}",
+                    "address": f"Rua {rng.randint(1, 999)}",
+                    "city": rng.choice(PROVINCES),
+                },
+                "items": items,
+                "payment_method": rng.choice(
+                    ["multicaixa-reference", "multicaixa-express"]
+                ),
+                "payment_status": payment_status,
+                "payment_reference": None,
+                "payment_expires_at": None,
+                "total": round(sum(it["price"] * it["quantity"] for it in items), 2),
+                "status": status,
+                "status_history": history,
+                "created_at": created,
+                "updated_at": history[-1]["at"],
+            }
+        )
+        docs[-1]["owner_keys"] = order_owner_keys(docs[-1])
+    return docs
+
+
+def gen_payments(ds: Dataset, start: int, end: int, chunk: int) -> List[Dict]:
+    """Um pagamento por pedido que passou da fase de checkout."""
+    docs = []
+    for order in gen_orders(ds, start, end, chunk):
+        if order["payment_status"] == "pending":
+            continue
+        docs.append(
+            {
+                "id": f"syn-pay{order['id'][5:]}",
+                "transaction_id": f"SYN-{order['order_number']}",
+                "order_number": order["order_number"],
+                "method": order["payment_method"],
+                "amount": order["total"],
+                "status": order["payment_status"],
+                "reference": None,
+                "phone": order["customer"]["phone"],
+                "expires_at": None,
+                "created_at": order["created_at"],
+                "updated_at": order["updated_at"],
+            }
+        )
+    return docs
+
+
+# =====================================================================
+# CARGA
+# =====================================================================
+async def load(
+    collection,
+    generate: Callable[[Dataset, int, int, int], List[Dict[str, Any]]],
+    ds: Dataset,
+    total: int,
+    batch_size: int,
+    parallel: int,
+) -> int:
+    """Gera e insere `total` documentos em lotes, `parallel` de cada vez."""
+    semaphore = asyncio.Semaphore(parallel)
+    inserted = 0
+
+    async def insert_chunk(chunk: int) -> None:
+        nonlocal inserted
+        async with semaphore:
+            start = chunk * batch_size
+            docs = generate(ds, start, min(start + batch_size, total), chunk)
+            if docs:
+                await collection.insert_many(docs, ordered=False)
+                inserted += len(docs)
+
+    chunks = (total + batch_size - 1) // batch_size
+    await asyncio.gather(*(insert_chunk(c) for c in range(chunks)))
+    return inserted
+
+
+async def main(args: argparse.Namespace) -> None:
+    import database
+
+    ds = Dataset(args)
+    plan = [
+        ("products", gen_products, args.products),
+        ("users", gen_users, args.users),
+        ("addresses", gen_addresses, args.addresses),
+        ("carts", gen_carts, min(args.carts, args.users)),
+        # no máximo um favorito por par (utilizador, produto)
+        ("favorites", gen_favorites, min(args.favorites, args.users * args.products)),
+        ("orders", gen_orders, args.orders),
+        ("payments", gen_payments, args.orders if args.payments else 0),
+    ]
+
+    if args.drop:
+        for name, _, _ in plan:
+            await database.db[name].delete_many({"id": {"$regex": "^syn-"}})
+
+    # categorias reais do seed (os produtos sintéticos usam os slugs delas)
+    for category in categories_data:
+        if category.get("slug"):
+            await database.categories_collection.update_one(
+                {"id": category["id"]},
+                {"$setOnInsert": {**category, "created_at": NOW}},
+                upsert=True,
+            )
+
+    for name, generate, total in plan:
+        if not total:
+            continue
+        started = time.perf_counter()
+        inserted = await load(
+            database.db[name], generate, ds, total, args.batch_size, args.parallel
+        )
+        elapsed = time.perf_counter() - started
+        print(f"{name:<10} {inserted:>9} docs in {elapsed:7.1f}s "
+              f"({inserted / max(elapsed, 1e-9):,.0f}/s)")
+
+    if args.explain:
+        # índices primeiro (como no startup), depois os planos à escala real
+        await database.init_indexes()
+        for check in await database.check_query_plans():
+            mark = "ok " if check["ok"] else "BAD"
+            print(f"[{mark}] {check['route']}: {', '.join(check['used_indexes'])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LR Store synthetic dataset")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--users", type=int, default=200_000)
+    parser.add_argument("--addresses", type=int, default=200_000)
+    parser.add_argument("--carts", type=int, default=60_000)
+    parser.add_argument("--favorites", type=int, default=400_000)
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--no-payments", dest="payments", action="store_false")
+    parser.add_argument("--batch-size", type=int, default=5_000)
+    parser.add_argument("--parallel", type=int, default=8)
+    parser.add_argument("--drop", action="store_true", help="remove syn-* docs first")
+    parser.add_argument("--explain", action="store_true", help="run explain() checks")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    asyncio.run(main(args))
@@ -0,0 +1,86 @@
+"""
+Custo de CPU das rotas da loja sem I/O: a app corre com os repositórios em
+memória (REPOSITORY_BACKEND=memory), por isso o tempo medido é só Python
+(routing, validação Pydantic, serialização, middlewares).
+
+    cd backend && python benchmarks/handler_overhead.py [iterações]
+
+Comparar com benchmarks/http_suite.py (mesmas rotas, com MongoDB) separa o
+custo da aplicação do custo da base de dados.
+"""
+from pathlib import Path
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# antes de importar a app: repositórios em memória, sem ligação ao Mongo
+os.environ["REPOSITORY_BACKEND"] = "memory"
+os.environ.setdefault("MONGO_URL", "mongodb://unused")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx  # noqa: E402
+
+from models import Product  # noqa: E402
+from repositories import repos  # noqa: E402
+from seed_data import products_data  # noqa: E402
+from server import app  # noqa: E402
+
+
+def _order_payload(product):
+    return {
+        "user_id": "bench-user",
+        "customer": {
+            "name": "Bench",
+            "email": "bench@example.com",
+            "phone": "923000000",
+            "address": "Rua do Benchmark",
+            "city": "Luanda",
+        },
+        "items": [
+            {
+                "product_id": product["id"],
+                "name": product["name"],
+                "quantity": 1,
+                "price": product["price"],
+                "image": product["image"],
+            }
+        ],
+        "payment_method": "multicaixa-reference",
+        "total": product["price"],
+    }
+
+
+async def main(iterations: int) -> None:
+    for product in products_data:
+        await repos.products.store.insert_one(Product(**product).dict())
+    product = products_data[0]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        created = await client.post("/api/orders", json=_order_payload(product))
+        order_number = created.json()["order"]["order_number"]
+
+        cases = [
+            ("GET /api/products", "GET", "/api/products", None),
+            ("GET /api/products/{id}", "GET", f"/api/products/{product['id']}", None),
+            ("GET /api/users/{id}/cart", "GET", "/api/users/bench-user/cart", None),
+            ("GET /api/orders/{number}", "GET", f"/api/orders/{order_number}", None),
+            ("POST /api/orders", "POST", "/api/orders", _order_payload(product)),
+        ]
+        for label, method, url, body in cases:
+            for _ in range(min(200, iterations)):  # aquecimento
+                await client.request(method, url, json=body)
+            started = time.perf_counter()
+            for _ in range(iterations):
+                response = await client.request(method, url, json=body)
+            elapsed = (time.perf_counter() - started) / iterations * 1e6
+            print(f"{label:<28} {elapsed:8.1f} µs/request  ({response.status_code})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
@@ -0,0 +1,432 @@
+"""
+Benchmark HTTP ponta a ponta da LR Store API.
+
+Arranca a app (ASGI em processo, com startup/shutdown reais) contra um
+MongoDB local semeado a partir de seed_data.py e gera tráfego misto com
+concorrência fixa: catálogo, detalhe de produto, carrinho, checkout,
+pagamentos e listagens de admin. Mede throughput e p50/p95/p99 por rota e
+grava tudo em JSON para comparar execuções.
+
+Base de dados (escolher uma):
+    --mongod PATH    lança um mongod temporário (dbpath em /tmp, porta livre)
+    (default)        usa MONGO_URL já a correr, com DB_NAME=--db-name
+    --inmemory       mongomock-motor (só para validar o harness; os tempos
+                     não representam o MongoDB real)
+
+    cd backend && python benchmarks/http_suite.py --mongod $(which mongod) \\
+        --duration 30 --concurrency 32
+    python benchmarks/http_suite.py --compare benchmarks/results/base.json
+
+Usar sempre uma base de dados descartável: o benchmark cria pedidos reais.
+"""
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+sys.path.insert(0, str(BACKEND_DIR))
+
+ADMIN_HEADERS = {"X-User-Id": "bench-admin", "X-Is-Admin": "true"}
+SHOPPERS = 200
+
+
+# =====================================================================
+# MONGODB
+# =====================================================================
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mongod(binary: str) -> Tuple[subprocess.Popen, str, str]:
+    """Lança um mongod descartável; devolve (processo, url, dbpath)."""
+    dbpath = tempfile.mkdtemp(prefix="lrstore-bench-")
+    port = _free_port()
+    proc = subprocess.Popen(
+        [binary, "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return proc, f"mongodb://127.0.0.1:{port}", dbpath
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("mongod did not start within 30s")
+
+
+def use_inmemory_mongo() -> None:
+    try:
+        import mongomock_motor
+        import motor.motor_asyncio
+    except ImportError:
+        raise SystemExit("--inmemory requires mongomock-motor")
+    os.environ.setdefault("MONGO_URL", "mongodb://inmemory")
+    motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+
+# =====================================================================
+# CENÁRIOS
+# =====================================================================
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.enabled = False
+
+    async def call(self, client, label: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        duration_ms = (time.perf_counter() - started) * 1000
+        if self.enabled:
+            self.samples.setdefault(label, []).append(duration_ms)
+            if response.status_code >= 400:
+                self.errors[label] = self.errors.get(label, 0) + 1
+        return response
+
+
+class Context:
+    """Estado partilhado pelos workers (ids do catálogo, pedidos recentes)."""
+
+    def __init__(self, products: List[Dict[str, Any]], categories: List[str]):
+        self.products = products
+        self.categories = categories
+        self.recent_orders: Deque[Tuple[str, float]] = deque(maxlen=500)
+
+
+async def browse_catalog(client, rec, rng, ctx):
+    params = rng.choice(
+        [{}, {"featured": "true"}, {"is_promo": "true"}, {"category": None}]
+    )
+    if "category" in params:
+        params = {"category": rng.choice(ctx.categories)}
+    await rec.call(client, "GET /api/products", "GET", "/api/products", params=params)
+
+
+async def view_product(client, rec, rng, ctx):
+    product = rng.choice(ctx.products)
+    await rec.call(
+        client,
+        "GET /api/products/{product_id}",
+        "GET",
+        f"/api/products/{product['id']}",
+    )
+
+
+async def list_categories(client, rec, rng, ctx):
+    await rec.call(client, "GET /api/categories", "GET", "/api/categories")
+
+
+async def cart_ops(client, rec, rng, ctx):
+    user_id = f"bench-user-{rng.randrange(SHOPPERS)}"
+    product = rng.choice(ctx.products)
+    await rec.call(
+        client,
+        "POST /api/users/{user_id}/cart/items",
+        "POST",
+        f"/api/users/{user_id}/cart/items",
+        json={"product_id": product["id"], "quantity": 1},
+    )
+    await rec.call(
+        client, "GET /api/users/{user_id}/cart", "GET", f"/api/users/{user_id}/cart"
+    )
+
+
+async def checkout(client, rec, rng, ctx):
+    items = [
+        {
+            "product_id": product["id"],
+            "name": product["name"],
+            "quantity": rng.randint(1, 2),
+            "price": product["price"],
+            "image": product["image"],
+        }
+        for product in rng.sample(ctx.products, k=rng.randint(1, 3))
+    ]
+    shopper = rng.randrange(SHOPPERS)
+    response = await rec.call(
+        client,
+        "POST /api/orders",
+        "POST",
+        "/api/orders",
+        json={
+            "user_id": f"bench-user-{shopper}",
+            "customer": {
+                "name": "Bench",
+                "email": f"bench{shopper}@example.com",
+                "phone": "923000000",
+                "address": "Rua do Benchmark",
+                "city": "Luanda",
+            },
+            "items": items,
+            "payment_method": "multicaixa-reference",
+            "total": sum(i["price"] * i["quantity"] for i in items),
+        },
+    )
+    if response.status_code == 200:
+        order = response.json()["order"]
+        ctx.recent_orders.append((order["order_number"], order["total"]))
+
+
+async def pay_order(client, rec, rng, ctx):
+    if not ctx.recent_orders:
+        return await checkout(client, rec, rng, ctx)
+    order_number, total = ctx.recent_orders.popleft()
+    response = await rec.call(
+        client,
+        "POST /api/payments/multicaixa/reference",
+        "POST",
+        "/api/payments/multicaixa/reference",
+        json={"order_number": order_number, "amount": total},
+    )
+    if response.status_code == 200:
+        reference = response.json()["reference"]
+        await rec.call(
+            client,
+            "POST /api/payments/mock/pay/{transaction_id}",
+            "POST",
+            f"/api/payments/mock/pay/REF-{reference}",
+        )
+
+
+async def admin_lists(client, rec, rng, ctx):
+    label, url = rng.choice(
+        [
+            ("GET /api/admin/orders", "/api/admin/orders"),
+            ("GET /api/admin/products", "/api/admin/products"),
+            ("GET /api/admin/dashboard/summary", "/api/admin/dashboard/summary"),
+        ]
+    )
+    await rec.call(client, label, "GET", url, headers=ADMIN_HEADERS)
+
+
+# (cenário, peso): perfil de loja com muita navegação e pouco admin
+SCENARIOS: List[Tuple[Callable, int]] = [
+    (browse_catalog, 30),
+    (view_product, 25),
+    (list_categories, 10),
+    (cart_ops, 15),
+    (checkout, 10),
+    (pay_order, 6),
+    (admin_lists, 4),
+]
+
+
+# =====================================================================
+# EXECUÇÃO
+# =====================================================================
+async def _prepare(database) -> Context:
+    """Admin + clientes de teste; o catálogo vem do seed do startup."""
+    from seed_data import categories_data, products_data
+
+    now = datetime.utcnow()
+    await database.users.update_one(
+        {"id": ADMIN_HEADERS["X-User-Id"]},
+        {
+            "$setOnInsert": {
+                "id": ADMIN_HEADERS["X-User-Id"],
+                "name": "Bench Admin",
+                "email": "bench-admin@example.com",
+                "is_admin": True,
+                "created_at": now,
+                "updated_at": now,
+            }
+        },
+        upsert=True,
+    )
+    products = [p for p in products_data if p.get("stock", 0) > 100]
+    categories = [c["slug"] for c in categories_data if c.get("slug")]
+    return Context(products or products_data, categories)
+
+
+async def run(duration: float, warmup: float, concurrency: int, seed: int) -> Dict:
+    import httpx
+    from database import db
+    from server import app
+
+    recorder = Recorder()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        await app.router.startup()
+        try:
+            ctx = await _prepare(db)
+            scenarios, weights = zip(*SCENARIOS)
+            stop_at = time.perf_counter() + warmup + duration
+            measure_from = time.perf_counter() + warmup
+
+            async def worker(index: int):
+                rng = random.Random(seed + index)
+                while time.perf_counter() < stop_at:
+                    if not recorder.enabled and time.perf_counter() >= measure_from:
+                        recorder.enabled = True
+                    scenario = rng.choices(scenarios, weights)[0]
+                    await scenario(client, recorder, rng, ctx)
+
+            await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        finally:
+            await app.router.shutdown()
+
+    routes = {}
+    for label, samples in sorted(recorder.samples.items()):
+        samples.sort()
+        routes[label] = {
+            "count": len(samples),
+            "errors": recorder.errors.get(label, 0),
+            "rps": round(len(samples) / duration, 2),
+            "mean_ms": round(statistics.mean(samples), 3),
+            "p50_ms": round(_percentile(samples, 0.50), 3),
+            "p95_ms": round(_percentile(samples, 0.95), 3),
+            "p99_ms": round(_percentile(samples, 0.99), 3),
+            "max_ms": round(samples[-1], 3),
+        }
+    total = sum(r["count"] for r in routes.values())
+    return {
+        "totals": {
+            "requests": total,
+            "errors": sum(r["errors"] for r in routes.values()),
+            "rps": round(total / duration, 2),
+        },
+        "routes": routes,
+    }
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    index = min(int(q * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# =====================================================================
+# RELATÓRIO / COMPARAÇÃO
+# =====================================================================
+def print_report(result: Dict) -> None:
+    print(
+        f"{'route':<48} {'count':>7} {'rps':>8} {'p50':>8} {'p95':>8} "
+        f"{'p99':>8} {'err':>5}"
+    )
+    for label, r in result["routes"].items():
+        print(
+            f"{label:<48} {r['count']:>7} {r['rps']:>8.1f} {r['p50_ms']:>8.2f} "
+            f"{r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['errors']:>5}"
+        )
+    totals = result["totals"]
+    print(
+        f"total: {totals['requests']} requests, {totals['rps']} req/s, "
+        f"{totals['errors']} errors"
+    )
+
+
+def compare(result: Dict, baseline: Dict, threshold_pct: float) -> List[str]:
+    """Rotas cujo p95 piorou mais do que `threshold_pct` face à baseline."""
+    regressions = []
+    print(f"\n{'route':<48} {'p95 base':>9} {'p95 now':>9} {'delta':>8}")
+    for label, r in result["routes"].items():
+        base = baseline.get("routes", {}).get(label)
+        if not base:
+            continue
+        delta = (r["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100
+        flag = "  <-- regression" if delta > threshold_pct else ""
+        print(
+            f"{label:<48} {base['p95_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+            f"{delta:>7.1f}%{flag}"
+        )
+        if flag:
+            regressions.append(label)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="LR Store end-to-end HTTP benchmark")
+    parser.add_argument("--duration", type=float, default=30, help="seconds measured")
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db-name", default="lrstore_bench")
+    parser.add_argument("--mongod", help="path to a mongod binary to launch")
+    parser.add_argument("--inmemory", action="store_true")
+    parser.add_argument("--out", help="results JSON (default benchmarks/results/)")
+    parser.add_argument("--compare", help="baseline results JSON")
+    parser.add_argument(
+        "--threshold", type=float, default=10.0, help="p95 regression %%"
+    )
+    args = parser.parse_args()
+
+    # o database.py lê o ambiente no import: configurar antes de importar a app
+    os.environ["DB_NAME"] = args.db_name
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    mongod = dbpath = None
+    if args.mongod:
+        mongod, os.environ["MONGO_URL"], dbpath = start_mongod(args.mongod)
+    elif args.inmemory:
+        use_inmemory_mongo()
+    elif "MONGO_URL" not in os.environ:
+        os.environ["MONGO_URL"] = "mongodb://127.0.0.1:27017"
+
+    try:
+        result = asyncio.run(
+            run(args.duration, args.warmup, args.concurrency, args.seed)
+        )
+    finally:
+        if mongod is not None:
+            mongod.terminate()
+            mongod.wait(timeout=30)
+            shutil.rmtree(dbpath, ignore_errors=True)
+
+    result["meta"] = {
+        "started_at": datetime.utcnow().isoformat(),
+        "git_revision": _git_revision(),
+        "duration_s": args.duration,
+        "warmup_s": args.warmup,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+        "database": "mongomock" if args.inmemory else "mongod",
+        "python": platform.python_version(),
+        "host": platform.node(),
+    }
+    print_report(result)
+
+    out = Path(args.out) if args.out else (
+        RESULTS_DIR / f"http-{datetime.utcnow():%Y%m%d-%H%M%S}.json"
+    )
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2))
+    print(f"\nresults written to {out}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if compare(result, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
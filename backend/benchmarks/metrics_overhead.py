@@ -0,0 +1,57 @@
+"""
+Microbenchmark do MetricsMiddleware: custo por request com e sem o
+middleware à volta de uma app ASGI vazia.
+
+    cd backend && python benchmarks/metrics_overhead.py [iterações]
+"""
+from pathlib import Path
+import asyncio
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from metrics import HttpMetrics, MetricsMiddleware  # noqa: E402
+
+
+class _Route:
+    path = "/api/products/{product_id}"
+
+
+async def _app(scope, receive, send):
+    scope["route"] = _Route
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def _send(message):
+    pass
+
+
+async def _run(app, iterations: int) -> float:
+    scope = {"type": "http", "method": "GET", "path": "/api/products/1"}
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await app(dict(scope), _receive, _send)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def main(iterations: int) -> None:
+    wrapped = MetricsMiddleware(_app, HttpMetrics())
+    # aquecimento
+    await _run(_app, 1000)
+    await _run(wrapped, 1000)
+
+    bare = min([await _run(_app, iterations) for _ in range(5)])
+    instrumented = min([await _run(wrapped, iterations) for _ in range(5)])
+    print(f"bare app:        {bare:.2f} µs/request")
+    print(f"with middleware: {instrumented:.2f} µs/request")
+    print(f"overhead:        {instrumented - bare:.2f} µs/request")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000))
@@ -0,0 +1,241 @@
+"""
+Sincronização dos caches em memória entre workers/pods.
+
+O ChangeWatcher subscreve um change stream da base de dados filtrado para
+`products`, `categories` e `users` e, para cada evento, avisa os caches
+locais registados com `on_change(coleção, callback)`; produtos e categorias
+também passam por `catalog_cache.notify_local`.
+
+- O resume token é gravado em `meta` ({"_id": "change_stream:<WATCHER_ID>"})
+  e, depois de um restart, o stream continua a partir dele. Se o token já
+  não estiver no oplog, o watcher invalida tudo e recomeça do presente.
+- Sem replica set (change streams indisponíveis) cai para polling da versão
+  do catálogo em `meta.catalog`, a cada CACHE_POLL_INTERVAL segundos. Nesse
+  modo os caches de utilizadores dependem só do TTL.
+
+Para testar localmente com change streams basta um replica set de um nó:
+
+    mongod --replSet rs0 --dbpath /tmp/rs0 --port 27017
+    mongosh --eval 'rs.initiate()'
+"""
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+from datetime import datetime
+import asyncio
+import logging
+import os
+import socket
+import time
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from catalog_cache import catalog_state, notify_local
+from database import db, meta_collection
+
+logger = logging.getLogger(__name__)
+
+WATCHED_COLLECTIONS = ("products", "categories", "users")
+CATALOG_COLLECTIONS = ("products", "categories")
+
+# códigos do servidor: sem replica set / token fora do oplog
+_CHANGE_STREAMS_UNSUPPORTED = {40573, 40324}
+_HISTORY_LOST = {286, 280}
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """Cache simples por processo com expiração e tamanho máximo."""
+
+    def __init__(self, ttl_seconds: float, max_size: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._data: Dict[K, Tuple[float, V]] = {}
+
+    def get(self, key: K) -> Optional[V]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return entry[1]
+
+    def put(self, key: K, value: V, ttl_seconds: Optional[float] = None) -> None:
+        if len(self._data) >= self.max_size:
+            # descarta a entrada mais antiga (dicts mantêm a ordem de inserção)
+            self._data.pop(next(iter(self._data)))
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._data[key] = (time.monotonic() + ttl, value)
+
+    def pop(self, key: K) -> None:
+        self._data.pop(key, None)
+
+    def clear(self, *_: Any) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_listeners: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+
+
+def on_change(collection: str, callback: Callable[[Dict[str, Any]], None]):
+    """Regista um callback(evento) para mudanças numa coleção vigiada."""
+    _listeners.setdefault(collection, []).append(callback)
+    return callback
+
+
+def dispatch(collection: str, event: Dict[str, Any]) -> None:
+    for callback in _listeners.get(collection, []):
+        try:
+            callback(event)
+        except Exception as e:
+            logger.error("Cache listener for %s failed: %s", collection, e)
+    if collection in CATALOG_COLLECTIONS:
+        notify_local(f"{collection}.{event.get('operationType', 'change')}")
+
+
+def invalidate_all(reason: str) -> None:
+    """Esvazia todos os caches locais (ex.: eventos perdidos)."""
+    for collection in WATCHED_COLLECTIONS:
+        dispatch(collection, {"operationType": "invalidate", "reason": reason})
+
+
+# principais de admin (X-User-Id): evita um find_one por request de admin
+admin_principals: TTLCache[str, Any] = TTLCache(
+    float(os.environ.get("ADMIN_PRINCIPAL_TTL", 30))
+)
+on_change("users", admin_principals.clear)
+
+
+class ChangeWatcher:
+    def __init__(
+        self,
+        watcher_id: str,
+        poll_interval: float = 5.0,
+        token_save_interval: float = 1.0,
+    ):
+        self.watcher_id = watcher_id
+        self.poll_interval = poll_interval
+        self.token_save_interval = token_save_interval
+        self._task: Optional[asyncio.Task] = None
+        self.mode = "stopped"
+        self.stats: Dict[str, Any] = {
+            "events": 0,
+            "polls": 0,
+            "resumed": False,
+            "restarts": 0,
+            "last_event_at": None,
+        }
+
+    @classmethod
+    def from_env(cls) -> "ChangeWatcher":
+        return cls(
+            watcher_id=os.environ.get("WATCHER_ID", socket.gethostname()),
+            poll_interval=float(os.environ.get("CACHE_POLL_INTERVAL", 5.0)),
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def _token_key(self) -> str:
+        return f"change_stream:{self.watcher_id}"
+
+    def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self._run(), name="change-watcher")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.mode = "stopped"
+
+    async def _run(self) -> None:
+        backoff = 1.0
+        while True:
+            try:
+                await self._watch()
+            except OperationFailure as e:
+                if e.code in _CHANGE_STREAMS_UNSUPPORTED:
+                    logger.info("Change streams unavailable, polling catalog version")
+                    await self._poll()
+                    return
+                if e.code in _HISTORY_LOST:
+                    logger.warning("Resume token lost, invalidating local caches")
+                    await self._save_token(None)
+                    invalidate_all("history_lost")
+                else:
+                    logger.error("Change stream failed: %s", e)
+            except PyMongoError as e:
+                logger.warning("Change stream interrupted: %s", e)
+            except Exception as e:
+                # driver/cliente sem suporte a watch(): não há como recuperar
+                logger.error("Change stream setup failed, polling instead: %s", e)
+                await self._poll()
+                return
+            self.stats["restarts"] += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    async def _load_token(self) -> Optional[Dict[str, Any]]:
+        marker = await meta_collection.find_one({"_id": self._token_key})
+        return marker.get("token") if marker else None
+
+    async def _save_token(self, token: Optional[Dict[str, Any]]) -> None:
+        await meta_collection.update_one(
+            {"_id": self._token_key},
+            {"$set": {"token": token, "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+
+    async def _watch(self) -> None:
+        token = await self._load_token()
+        self.stats["resumed"] = token is not None
+        pipeline = [{"$match": {"ns.coll": {"$in": list(WATCHED_COLLECTIONS)}}}]
+
+        async with db.watch(pipeline, resume_after=token) as stream:
+            self.mode = "change_stream"
+            saved_at = time.monotonic()
+            pending_token = False
+            while True:
+                # try_next não bloqueia: o token é gravado mesmo com pouco tráfego
+                change = await stream.try_next()
+                if change is not None:
+                    self.stats["events"] += 1
+                    self.stats["last_event_at"] = datetime.utcnow()
+                    dispatch(change["ns"]["coll"], change)
+                    pending_token = True
+                elif not stream.alive:
+                    return
+                else:
+                    await asyncio.sleep(0.2)
+
+                if pending_token and (
+                    time.monotonic() - saved_at >= self.token_save_interval
+                ):
+                    await self._save_token(stream.resume_token)
+                    saved_at = time.monotonic()
+                    pending_token = False
+
+    async def _poll(self) -> None:
+        self.mode = "polling"
+        while True:
+            marker = await meta_collection.find_one({"_id": "catalog"}, {"version": 1})
+            self.stats["polls"] += 1
+            version = marker.get("version", 0) if marker else 0
+            if version != catalog_state["version"]:
+                catalog_state["version"] = version
+                notify_local("catalog.poll")
+            await asyncio.sleep(self.poll_interval)
+
+
+change_watcher = ChangeWatcher.from_env()
@@ -0,0 +1,50 @@
+"""
+Invalidação do catálogo (produtos/categorias).
+
+Cada escrita no catálogo chama `invalidate_catalog()` uma vez (por request
+ou por lote, nunca por linha): incrementa a versão em `meta.catalog`, que
+os outros workers podem observar, e avisa os caches locais registados com
+`on_catalog_change`.
+"""
+from typing import Callable, List
+from datetime import datetime
+import logging
+
+from pymongo import ReturnDocument
+
+from database import meta_collection
+
+logger = logging.getLogger(__name__)
+
+_listeners: List[Callable[[str], None]] = []
+
+# última versão conhecida por este processo
+catalog_state = {"version": 0}
+
+
+def on_catalog_change(callback: Callable[[str], None]) -> Callable[[str], None]:
+    """Regista um callback(motivo) chamado sempre que o catálogo muda."""
+    _listeners.append(callback)
+    return callback
+
+
+def notify_local(reason: str) -> None:
+    """Invalida os caches deste processo (sem tocar na DB)."""
+    for callback in _listeners:
+        try:
+            callback(reason)
+        except Exception as e:
+            logger.error("Catalog listener failed: %s", e)
+
+
+async def invalidate_catalog(reason: str) -> int:
+    """Incrementa a versão do catálogo e invalida os caches locais."""
+    marker = await meta_collection.find_one_and_update(
+        {"_id": "catalog"},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow()}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    catalog_state["version"] = marker["version"]
+    notify_local(reason)
+    return marker["version"]
@@ -0,0 +1,99 @@
+"""
+Categorias com contagens e intervalo de preços dos seus produtos.
+
+Um único `$group` sobre `products` calcula, por categoria, o número de
+produtos, o preço mínimo/máximo e quantos têm stock. O resultado fica em
+memória até o catálogo mudar (`on_catalog_change`); como os produtos guardam
+em `category` o slug ou o id da categoria, as duas chaves são aceites.
+"""
+from typing import Any, Dict, List, Optional
+import logging
+
+from catalog_cache import on_catalog_change
+from database import categories_collection, products_collection
+from models import Category, CategoryWithStats
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+STATS_PIPELINE = [
+    {
+        "$group": {
+            "_id": "$category",
+            "product_count": {"$sum": 1},
+            "min_price": {"$min": "$price"},
+            "max_price": {"$max": "$price"},
+            "in_stock_count": {"$sum": {"$cond": [{"$gt": ["$stock", 0]}, 1, 0]}},
+        }
+    }
+]
+
+_EMPTY_STATS = {
+    "product_count": 0,
+    "min_price": None,
+    "max_price": None,
+    "in_stock_count": 0,
+}
+
+
+def valid_categories(docs: List[Dict[str, Any]]) -> List[Category]:
+    """Uma categoria inválida não deve derrubar a listagem inteira."""
+    categories = []
+    for doc in docs:
+        try:
+            categories.append(Category(**doc))
+        except ValueError as e:
+            logger.warning("Skipping invalid category %s: %s", doc.get("id"), e)
+    return categories
+
+
+def _merge(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """Junta as estatísticas agrupadas pelo slug e pelo id da mesma categoria."""
+    prices_min = [p for p in (a["min_price"], b["min_price"]) if p is not None]
+    prices_max = [p for p in (a["max_price"], b["max_price"]) if p is not None]
+    return {
+        "product_count": a["product_count"] + b["product_count"],
+        "min_price": min(prices_min) if prices_min else None,
+        "max_price": max(prices_max) if prices_max else None,
+        "in_stock_count": a["in_stock_count"] + b["in_stock_count"],
+    }
+
+
+class CategoryStatsCache:
+    def __init__(self):
+        self.cached: Optional[List[CategoryWithStats]] = None
+        self._generation = 0
+        self._builds = SingleFlight("category_stats")
+
+    def invalidate(self, *_: Any) -> None:
+        self._generation += 1
+        self.cached = None
+
+    async def get(self) -> List[CategoryWithStats]:
+        cached = self.cached
+        if cached is not None:
+            return cached
+        return await self._builds.do(self._generation, self._build)
+
+    async def _build(self) -> List[CategoryWithStats]:
+        generation = self._generation
+        docs = await categories_collection.find().to_list(100)
+        by_key: Dict[Any, Dict[str, Any]] = {}
+        async for row in products_collection.aggregate(STATS_PIPELINE):
+            by_key[row.pop("_id")] = row
+
+        result = []
+        for category in valid_categories(docs):
+            stats = _EMPTY_STATS
+            for key in {category.slug, category.id}:
+                if key in by_key:
+                    stats = _merge(stats, by_key[key])
+            result.append(CategoryWithStats(**category.dict(), **stats))
+
+        if generation == self._generation:
+            self.cached = result
+        return result
+
+
+category_stats = CategoryStatsCache()
+on_catalog_change(category_stats.invalidate)
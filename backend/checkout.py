@@ -0,0 +1,180 @@
+"""
+Pipeline de checkout (POST /api/orders).
+
+Etapas explícitas, cada uma cronometrada em `http_metrics.stages`
+(pipeline="checkout") e exposta em /metrics:
+
+1. validate  - itens, quantidades, email normalizado
+2. price     - preços/nome/imagem vindos do catálogo numa só query `$in`,
+               total recalculado no servidor, verificação de stock
+3. allocate  - número de pedido aleatório de 10 dígitos
+4. insert    - insert_one; colisão no índice único de `order_number`
+               volta à etapa 3 (sem find_one prévio, nem no arquivo: com
+               9x10^9 números a hipótese de sortear um já usado é desprezável)
+5. enqueue   - atividade + notificação (buffers em memória, sem round trip)
+"""
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+from datetime import datetime
+import logging
+import random
+import time
+
+from fastapi import HTTPException, status
+from pymongo.errors import DuplicateKeyError
+
+from activity import activity_logger
+from metrics import http_metrics
+from models import Order, OrderCreate, OrderItem
+from notifications import notification_fanout
+from order_owners import order_owner_keys
+from order_states import history_entry
+from repositories import repos
+
+logger = logging.getLogger(__name__)
+
+ORDER_NUMBER_ATTEMPTS = 5
+ORDER_NUMBER_DIGITS = 10
+
+_PRICE_PROJECTION = {
+    "_id": 0, "id": 1, "name": 1, "price": 1, "image": 1, "stock": 1
+}
+
+
+@contextmanager
+def _stage(name: str, timings: Dict[str, float]) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration_ms = (time.perf_counter() - started) * 1000
+        timings[name] = round(duration_ms, 3)
+        http_metrics.observe_stage("checkout", name, duration_ms)
+
+
+def _bad_request(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+
+def _validate(order_data: OrderCreate) -> OrderCreate:
+    if not order_data.items:
+        raise _bad_request("Order has no items.")
+    if any(item.quantity < 1 for item in order_data.items):
+        raise _bad_request("Item quantity must be at least 1.")
+
+    customer = order_data.customer.copy()
+    customer.email = customer.email.strip().lower()
+    return order_data.copy(update={"customer": customer})
+
+
+async def _price(items: List[OrderItem]) -> List[OrderItem]:
+    """Reprecifica os itens com os dados atuais do catálogo."""
+    product_ids = list({item.product_id for item in items})
+    catalog = {
+        doc["id"]: doc
+        for doc in await repos.products.get_many(product_ids, _PRICE_PROJECTION)
+    }
+
+    missing = [pid for pid in product_ids if pid not in catalog]
+    if missing:
+        raise _bad_request(f"Unknown products: {', '.join(sorted(missing))}")
+
+    requested: Dict[str, int] = {}
+    for item in items:
+        requested[item.product_id] = requested.get(item.product_id, 0) + item.quantity
+    short = [
+        pid for pid, qty in requested.items() if catalog[pid].get("stock", 0) < qty
+    ]
+    if short:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Insufficient stock: {', '.join(sorted(short))}",
+        )
+
+    return [
+        item.copy(
+            update={
+                "name": catalog[item.product_id]["name"],
+                "price": catalog[item.product_id]["price"],
+                "image": catalog[item.product_id].get("image", item.image),
+            }
+        )
+        for item in items
+    ]
+
+
+def _allocate_number() -> str:
+    return str(
+        random.randint(10 ** (ORDER_NUMBER_DIGITS - 1), 10**ORDER_NUMBER_DIGITS - 1)
+    )
+
+
+def _enqueue_side_effects(order: Order) -> None:
+    activity_logger.log(
+        "order.create", user_id=order.user_id, details=order.order_number
+    )
+    notification_fanout.notify(
+        order.user_id,
+        title=f"Pedido #{order.order_number} recebido",
+        message="Recebemos o seu pedido e estamos a aguardar o pagamento.",
+        link=f"/pedido/{order.order_number}",
+    )
+
+
+async def place_order(order_data: OrderCreate) -> Order:
+    """Corre as etapas do checkout e devolve o pedido gravado."""
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+
+    with _stage("validate", timings):
+        order_data = _validate(order_data)
+
+    with _stage("price", timings):
+        items = await _price(order_data.items)
+        total = round(sum(item.price * item.quantity for item in items), 2)
+
+    if abs(total - order_data.total) > 0.01:
+        logger.info(
+            "Order total recalculated: client %s, catalog %s",
+            order_data.total,
+            total,
+        )
+
+    now = datetime.utcnow()
+    order_fields: Dict[str, Any] = {
+        "user_id": order_data.user_id,
+        "customer": order_data.customer,
+        "items": items,
+        "payment_method": order_data.payment_method,
+        "total": total,
+        "status": "pending",
+        "payment_status": "pending",
+        "status_history": [history_entry("pending", "pending", at=now)],
+        "created_at": now,
+        "updated_at": now,
+    }
+
+    for attempt in range(1, ORDER_NUMBER_ATTEMPTS + 1):
+        with _stage("allocate", timings):
+            order = Order(order_number=_allocate_number(), **order_fields)
+        try:
+            with _stage("insert", timings):
+                order_doc = order.dict()
+                order_doc["owner_keys"] = order_owner_keys(order_doc)
+                await repos.orders.insert(order_doc)
+            break
+        except DuplicateKeyError:
+            if attempt == ORDER_NUMBER_ATTEMPTS:
+                raise
+            logger.info("Order number collision, retrying (attempt %d)", attempt)
+
+    with _stage("enqueue", timings):
+        _enqueue_side_effects(order)
+
+    timings["total"] = round((time.perf_counter() - started) * 1000, 3)
+    logger.info(
+        "Order created: %s",
+        order.order_number,
+        extra={"order_number": order.order_number, "checkout_ms": timings},
+    )
+    return order
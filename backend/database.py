@@ -1,7 +1,19 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
 from dotenv import load_dotenv
 from pathlib import Path
+from typing import Dict, List, Any, Optional
+from datetime import datetime
+import asyncio
+import logging
 import os
+import time
+
+from db_monitoring import db_metrics, CommandLatencyListener, PoolListener
+from tracing import TraceCommandListener
+
+logger = logging.getLogger(__name__)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / ".env")
@@ -9,7 +21,42 @@ load_dotenv(ROOT_DIR / ".env")
 mongo_url = os.environ["MONGO_URL"]
 db_name = os.environ.get("DB_NAME", "lrstore")
 
-client = AsyncIOMotorClient(mongo_url)
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+def client_options() -> Dict[str, Any]:
+    """
+    Opções do pool/cliente a partir do ambiente. Variáveis não definidas
+    ficam com o default do driver.
+    """
+    options: Dict[str, Any] = {
+        "maxPoolSize": _env_int("MONGO_MAX_POOL_SIZE"),
+        "minPoolSize": _env_int("MONGO_MIN_POOL_SIZE"),
+        "maxIdleTimeMS": _env_int("MONGO_MAX_IDLE_TIME_MS"),
+        "waitQueueTimeoutMS": _env_int("MONGO_WAIT_QUEUE_TIMEOUT_MS"),
+        "serverSelectionTimeoutMS": _env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS"),
+        "connectTimeoutMS": _env_int("MONGO_CONNECT_TIMEOUT_MS"),
+        "socketTimeoutMS": _env_int("MONGO_SOCKET_TIMEOUT_MS"),
+        # ex.: "zstd,snappy,zlib" (zstd/snappy precisam dos pacotes opcionais)
+        "compressors": os.environ.get("MONGO_COMPRESSORS") or None,
+        # ex.: "primaryPreferred", "secondaryPreferred"
+        "readPreference": os.environ.get("MONGO_READ_PREFERENCE") or None,
+    }
+    return {key: value for key, value in options.items() if value is not None}
+
+
+client = AsyncIOMotorClient(
+    mongo_url,
+    event_listeners=[
+        CommandLatencyListener(db_metrics),
+        PoolListener(db_metrics),
+        TraceCommandListener(),
+    ],
+    **client_options(),
+)
 db = client[db_name]
 
 # ----------------------------
@@ -20,6 +67,9 @@ products_collection = db["products"]
 
 orders_collection = db["orders"]
 payments_collection = db["payments"]
+# pedidos concluídos antigos e os seus pagamentos (archiving.py)
+orders_archive_collection = db["orders_archive"]
+payments_archive_collection = db["payments_archive"]
 
 users_collection = db["users"]
 addresses_collection = db["addresses"]
@@ -27,57 +77,513 @@ addresses_collection = db["addresses"]
 carts_collection = db["carts"]
 favorites_collection = db["favorites"]
 notifications_collection = db["notifications"]
+notification_counters_collection = db["notification_counters"]
 activity_logs_collection = db["activity_logs"]
 support_messages_collection = db["support_messages"]
 
+# "comprados juntos" pré-calculados (recommendations.py)
+product_recommendations_collection = db["product_recommendations"]
 
-async def init_indexes():
-    """Inicializa todos os índices necessários."""
+# documentos de controlo (marcador de seed, etc.)
+meta_collection = db["meta"]
+
+
+# ----------------------------
+# Index plan
+# ----------------------------
+ACTIVITY_LOG_TTL_SECONDS = int(os.environ.get("ACTIVITY_LOG_TTL_DAYS", 90)) * 86400
+
+# Índices declarados a partir das queries reais das rotas. Os compostos
+# seguem a regra igualdade -> ordenação -> intervalo; os prefixos que já são
+# servidos por um composto deixam de ter índice próprio (REDUNDANT_INDEXES).
+INDEX_PLAN: Dict[str, List[IndexModel]] = {
+    "categories": [
+        IndexModel("slug", unique=True),
+        IndexModel("id", unique=True),
+    ],
+    "products": [
+        IndexModel("id", unique=True),
+        # get_products: category (+ featured)
+        IndexModel([("category", 1), ("featured", 1)]),
+        IndexModel("featured"),
+        # só os produtos marcados entram no índice
+        IndexModel(
+            "is_new",
+            name="is_new_true",
+            partialFilterExpression={"is_new": True},
+        ),
+        IndexModel(
+            "is_promo",
+            name="is_promo_true",
+            partialFilterExpression={"is_promo": True},
+        ),
+        IndexModel([("name", "text"), ("description", "text")]),
+        IndexModel("price"),
+        IndexModel("rating"),
+    ],
+    "product_recommendations": [
+        IndexModel("product_id", unique=True),
+    ],
+    "orders": [
+        IndexModel("order_number", unique=True),
+        # get_my_orders: $in sobre owner_keys (ver order_owners.py)
+        IndexModel([("owner_keys", 1), ("created_at", -1), ("order_number", -1)]),
+        # admin_list_orders
+        IndexModel([("status", 1), ("payment_status", 1), ("created_at", -1)]),
+        IndexModel("created_at"),
+        # dashboard: receita só de pedidos pagos (query coberta)
+        IndexModel(
+            [("payment_status", 1), ("total", 1)],
+            name="payment_status_paid_total",
+            partialFilterExpression={"payment_status": "paid"},
+        ),
+    ],
+    # o arquivo serve leituras por número/dono, a exportação por data e as
+    # contagens/receita do dashboard
+    "orders_archive": [
+        IndexModel("order_number", unique=True),
+        IndexModel([("owner_keys", 1), ("created_at", -1), ("order_number", -1)]),
+        IndexModel("created_at"),
+        IndexModel("status"),
+        IndexModel(
+            [("payment_status", 1), ("total", 1)],
+            name="payment_status_paid_total",
+            partialFilterExpression={"payment_status": "paid"},
+        ),
+    ],
+    "payments_archive": [
+        IndexModel("transaction_id", unique=True),
+        IndexModel("order_number"),
+    ],
+    "payments": [
+        IndexModel("transaction_id", unique=True),
+        IndexModel("order_number"),
+        IndexModel([("status", 1), ("expires_at", 1)]),
+    ],
+    "users": [
+        IndexModel("email", unique=True),
+        IndexModel("id", unique=True),
+        IndexModel("phone", sparse=True),
+        IndexModel("is_admin"),
+    ],
+    "addresses": [
+        IndexModel("user_id"),
+        IndexModel("province"),
+        IndexModel("municipality"),
+    ],
+    "carts": [
+        IndexModel("user_id", unique=True),
+    ],
+    "favorites": [
+        IndexModel([("user_id", 1), ("product_id", 1)], unique=True),
+    ],
+    "notifications": [
+        # um lote repetido depois de uma falha a meio não duplica notificações
+        IndexModel("id", unique=True),
+        # listagem paginada por cursor (created_at, id)
+        IndexModel([("user_id", 1), ("created_at", -1), ("id", -1)]),
+        # marcar como lidas em bloco
+        IndexModel(
+            [("user_id", 1), ("id", 1)],
+            name="user_id_1_id_1_unread",
+            partialFilterExpression={"is_read": False},
+        ),
+    ],
+    "notification_counters": [
+        IndexModel("user_id", unique=True),
+    ],
+    "activity_logs": [
+        IndexModel("user_id"),
+        IndexModel("action"),
+        # TTL: o Mongo apaga sozinho os registos mais antigos
+        IndexModel("created_at", expireAfterSeconds=ACTIVITY_LOG_TTL_SECONDS),
+    ],
+    "support_messages": [
+        IndexModel("email"),
+        IndexModel("status"),
+        IndexModel("created_at"),
+    ],
+}
+
+# Índices antigos que só custam escrita: são prefixo de um composto acima
+# ou foram substituídos por uma versão parcial.
+REDUNDANT_INDEXES: Dict[str, List[str]] = {
+    "products": ["category_1", "is_new_1", "is_promo_1"],
+    "orders": ["user_id_1", "customer.email_1", "status_1"],
+    "notifications": ["user_id_1", "is_read_1", "created_at_1"],
+}
 
-    await categories_collection.create_index("slug", unique=True)
+# Índices das queries antigas de "os meus pedidos" (user_id / customer.email).
+# Ficam enquanto o backfill de owner_keys não acabar, porque até lá a rota
+# também procura por esses campos (ver order_owners.py); depois são removidos.
+LEGACY_OWNER_INDEXES: Dict[str, List[IndexModel]] = {
+    "orders": [
+        IndexModel([("user_id", 1), ("created_at", -1)]),
+        IndexModel([("customer.email", 1), ("created_at", -1)]),
+    ],
+}
 
-    await products_collection.create_index("category")
-    await products_collection.create_index("featured")
-    await products_collection.create_index([("name", "text"), ("description", "text")])
-    await products_collection.create_index("price")
-    await products_collection.create_index("rating")
-    await products_collection.create_index("is_new")
-    await products_collection.create_index("is_promo")
 
-    await orders_collection.create_index("order_number", unique=True)
-    await orders_collection.create_index("customer.email")
-    await orders_collection.create_index("status")
-    await orders_collection.create_index("created_at")
-    await orders_collection.create_index("user_id", sparse=True)
+async def owner_keys_backfill_done() -> bool:
+    from order_owners import BACKFILL_MARKER_ID
 
-    await payments_collection.create_index("transaction_id", unique=True)
-    await payments_collection.create_index("order_number")
+    marker = await meta_collection.find_one({"_id": BACKFILL_MARKER_ID}, {"done_at": 1})
+    return bool(marker and marker.get("done_at"))
 
-    await users_collection.create_index("email", unique=True)
-    await users_collection.create_index("phone", sparse=True)
-    await users_collection.create_index("is_admin")
 
-    await addresses_collection.create_index("user_id")
-    await addresses_collection.create_index("province")
-    await addresses_collection.create_index("municipality")
+async def drop_legacy_owner_indexes() -> None:
+    """Chamado quando o backfill de owner_keys acaba."""
+    for collection_name, models in LEGACY_OWNER_INDEXES.items():
+        for model in models:
+            name = model.document["name"]
+            try:
+                await db[collection_name].drop_index(name)
+            except OperationFailure:
+                continue  # já não existe
+            logger.info("Dropped legacy index %s.%s", collection_name, name)
+
+
+# Forma das queries quentes de cada rota e o índice que o planner deve
+# escolher para elas (ver check_query_plans).
+QUERY_PLAN_CHECKS: List[Dict[str, Any]] = [
+    {
+        "route": "get_my_orders",
+        "collection": "orders",
+        "filter": {"owner_keys": {"$in": ["user:__probe__", "email:__probe__"]}},
+        "sort": [("created_at", -1), ("order_number", -1)],
+        "expected_index": "owner_keys_1_created_at_-1_order_number_-1",
+    },
+    {
+        "route": "admin_list_orders",
+        "collection": "orders",
+        "filter": {
+            "status": "pending",
+            "payment_status": "pending",
+            "created_at": {"$gte": datetime(2000, 1, 1)},
+        },
+        "sort": [("created_at", -1)],
+        "expected_index": "status_1_payment_status_1_created_at_-1",
+    },
+    {
+        "route": "admin_dashboard_summary (revenue)",
+        "collection": "orders",
+        "filter": {"payment_status": "paid"},
+        "projection": {"_id": 0, "total": 1},
+        "expected_index": "payment_status_paid_total",
+    },
+    {
+        "route": "get_products (category + featured)",
+        "collection": "products",
+        "filter": {"category": "__probe__", "featured": True},
+        "expected_index": "category_1_featured_1",
+    },
+    {
+        "route": "storefront_home (featured)",
+        "collection": "products",
+        "filter": {"featured": True},
+        "sort": [("created_at", -1), ("id", 1)],
+        "expected_index": "featured_1",
+    },
+    {
+        "route": "storefront_home (is_new)",
+        "collection": "products",
+        "filter": {"is_new": True},
+        "sort": [("created_at", -1), ("id", 1)],
+        "expected_index": "is_new_true",
+    },
+    {
+        "route": "storefront_home (is_promo)",
+        "collection": "products",
+        "filter": {"is_promo": True},
+        "sort": [("created_at", -1), ("id", 1)],
+        "expected_index": "is_promo_true",
+    },
+    {
+        "route": "get_product_by_id",
+        "collection": "products",
+        "filter": {"id": "__probe__"},
+        "expected_index": "id_1",
+    },
+]
+
+
+def _winning_indexes(plan: Any) -> List[str]:
+    """Recolhe os `indexName` usados num winningPlan (qualquer profundidade)."""
+    found: List[str] = []
+    if isinstance(plan, dict):
+        if "indexName" in plan:
+            found.append(plan["indexName"])
+        for value in plan.values():
+            found.extend(_winning_indexes(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            found.extend(_winning_indexes(value))
+    return found
+
+
+async def check_query_plans() -> List[Dict[str, Any]]:
+    """Corre explain() para cada query de QUERY_PLAN_CHECKS e compara o índice."""
+    results: List[Dict[str, Any]] = []
+    for check in QUERY_PLAN_CHECKS:
+        cursor = db[check["collection"]].find(
+            check["filter"], check.get("projection")
+        )
+        if check.get("sort"):
+            cursor = cursor.sort(check["sort"])
+        explain = await cursor.explain()
+        winning = explain.get("queryPlanner", {}).get("winningPlan", {})
+        used = _winning_indexes(winning)
+        results.append(
+            {
+                "route": check["route"],
+                "expected_index": check["expected_index"],
+                "used_indexes": used,
+                "ok": check["expected_index"] in used,
+            }
+        )
+    return results
+
+
+# Índices que garantem correção (unicidade) — a API só fica "ready"
+# depois de existirem.
+CRITICAL_INDEXES: Dict[str, List[str]] = {
+    "orders": ["order_number_1"],
+    "payments": ["transaction_id_1"],
+    "users": ["email_1"],
+    "categories": ["slug_1"],
+    "carts": ["user_id_1"],
+    "favorites": ["user_id_1_product_id_1"],
+}
+
+# Estado da reconciliação de índices (lido pelo endpoint de readiness).
+index_state: Dict[str, Any] = {
+    "ready": False,
+    "done": False,
+    "created": [],
+    "dropped": [],
+    "modified": [],
+    "duration_ms": None,
+    "error": None,
+}
+
+_INDEX_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+
+def _index_matches(existing: Dict[str, Any], wanted: Dict[str, Any]) -> bool:
+    """Compara a spec de um índice existente (list_indexes) com a declarada."""
+    # índices de texto são guardados com chaves internas (_fts/_ftsx)
+    is_text = "text" in wanted["key"].values()
+    if not is_text and list(existing["key"].items()) != list(wanted["key"].items()):
+        return False
+    return all(
+        existing.get(option) == wanted.get(option)
+        for option in _INDEX_OPTIONS
+        if option in existing or option in wanted
+    )
 
-    await carts_collection.create_index("user_id", unique=True)
 
-    await favorites_collection.create_index(
-        [("user_id", 1), ("product_id", 1)],
-        unique=True,
+def _only_ttl_changed(existing: Dict[str, Any], wanted: Dict[str, Any]) -> bool:
+    """Mesmas chaves e opções, só `expireAfterSeconds` diferente (ou novo)."""
+    if "expireAfterSeconds" not in wanted:
+        return False
+    same_keys = list(existing["key"].items()) == list(wanted["key"].items())
+    return same_keys and all(
+        existing.get(option) == wanted.get(option)
+        for option in _INDEX_OPTIONS
+        if option != "expireAfterSeconds"
     )
 
-    await notifications_collection.create_index("user_id")
-    await notifications_collection.create_index("is_read")
-    await notifications_collection.create_index("created_at")
 
-    await activity_logs_collection.create_index("user_id")
-    await activity_logs_collection.create_index("action")
-    await activity_logs_collection.create_index("created_at")
+async def _set_index_ttl(collection, wanted: Dict[str, Any]) -> bool:
+    """
+    Muda o TTL no próprio índice com `collMod`, sem o recriar. Servidores
+    antigos não aceitam tornar TTL um índice que não o era: devolve False e
+    o índice é recriado.
+    """
+    try:
+        await collection.database.command(
+            "collMod",
+            collection.name,
+            index={
+                "name": wanted["name"],
+                "expireAfterSeconds": wanted["expireAfterSeconds"],
+            },
+        )
+    except OperationFailure as e:
+        logger.warning(
+            "collMod refused for %s.%s, rebuilding: %s",
+            collection.name,
+            wanted["name"],
+            e,
+        )
+        return False
+    return True
 
-    await support_messages_collection.create_index("email")
-    await support_messages_collection.create_index("status")
-    await support_messages_collection.create_index("created_at")
 
-    print("✓ All database indexes created successfully")
+async def _rebuild_index(collection, model: IndexModel) -> None:
+    """
+    Recria um índice cujo nome se mantém mas a spec mudou. Não pode haver
+    dois índices com o mesmo nome, por isso uma cópia temporária serve as
+    queries enquanto o original é substituído; se o servidor recusar a cópia
+    (mesmas chaves com outras opções, segundo índice de texto), o índice
+    fica em falta só durante o rebuild.
+    """
+    wanted = model.document
+    temp_name: Optional[str] = f"{wanted['name']}__rebuild"
+    options = {k: v for k, v in wanted.items() if k not in ("key", "name")}
+    try:
+        await collection.create_index(
+            list(wanted["key"].items()), name=temp_name, **options
+        )
+    except OperationFailure as e:
+        logger.warning(
+            "Index %s.%s rebuilt without a temporary copy: %s",
+            collection.name,
+            wanted["name"],
+            e,
+        )
+        temp_name = None
+    await collection.drop_index(wanted["name"])
+    await collection.create_indexes([model])
+    if temp_name:
+        await collection.drop_index(temp_name)
+
+
+async def _reconcile_collection(
+    collection_name: str,
+    indexes: List[IndexModel],
+    redundant_names: Optional[List[str]] = None,
+) -> None:
+    if redundant_names is None:
+        redundant_names = REDUNDANT_INDEXES.get(collection_name, [])
+    collection = db[collection_name]
+    existing = {idx["name"]: idx async for idx in collection.list_indexes()}
+
+    missing: List[IndexModel] = []
+    changed: List[IndexModel] = []
+    ttl_changed: List[IndexModel] = []
+    for model in indexes:
+        wanted = model.document
+        current = existing.get(wanted["name"])
+        if current is None:
+            missing.append(model)
+        elif _index_matches(current, wanted):
+            continue
+        elif _only_ttl_changed(current, wanted):
+            ttl_changed.append(model)
+        else:
+            changed.append(model)
+
+    redundant = [name for name in redundant_names if name in existing]
+
+    async def drop_redundant() -> None:
+        while redundant:
+            index_name = redundant.pop(0)
+            await collection.drop_index(index_name)
+            index_state["dropped"].append(f"{collection_name}.{index_name}")
+
+    # primeiro os índices novos, para que as queries servidas por um índice
+    # redundante já tenham o substituto quando este for removido
+    if missing:
+        try:
+            await collection.create_indexes(missing)
+        except OperationFailure as e:
+            if not redundant:
+                raise
+            # servidores antigos recusam um parcial com as mesmas chaves de um
+            # índice redundante (is_new_1 -> is_new_true): remove-o antes
+            logger.warning(
+                "Dropping redundant indexes on %s before creating: %s",
+                collection_name,
+                e,
+            )
+            await drop_redundant()
+            await collection.create_indexes(missing)
+        index_state["created"].extend(
+            f"{collection_name}.{model.document['name']}" for model in missing
+        )
+
+    await drop_redundant()
+
+    for model in ttl_changed:
+        if await _set_index_ttl(collection, model.document):
+            index_state["modified"].append(
+                f"{collection_name}.{model.document['name']}"
+            )
+        else:
+            changed.append(model)
+
+    for model in changed:
+        await _rebuild_index(collection, model)
+        index_state["created"].append(f"{collection_name}.{model.document['name']}")
+
+
+async def init_indexes():
+    """
+    Reconcilia os índices com INDEX_PLAN: só cria os que faltam (ou cuja spec
+    mudou) e remove os redundantes. As coleções são tratadas em paralelo.
+    LEGACY_OWNER_INDEXES entram no plano até o backfill de owner_keys acabar
+    e passam a redundantes depois.
+    """
+    started = time.perf_counter()
+    index_state.update(created=[], dropped=[], modified=[], error=None)
+    try:
+        legacy_done = await owner_keys_backfill_done()
+        plan: Dict[str, Any] = {}
+        for name, indexes in INDEX_PLAN.items():
+            legacy = LEGACY_OWNER_INDEXES.get(name, [])
+            redundant = list(REDUNDANT_INDEXES.get(name, []))
+            if legacy_done:
+                redundant += [model.document["name"] for model in legacy]
+            else:
+                indexes = indexes + legacy
+            plan[name] = (indexes, redundant)
+        await asyncio.gather(
+            *(
+                _reconcile_collection(name, indexes, redundant)
+                for name, (indexes, redundant) in plan.items()
+            )
+        )
+    except Exception as e:
+        # corre em background: regista o erro em vez de o propagar
+        index_state["error"] = str(e)
+        logger.error("Index reconciliation failed: %s", e)
+
+    index_state["ready"] = await critical_indexes_present()
+    index_state["done"] = True
+    index_state["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    logger.info(
+        "Database indexes reconciled in %sms (%d created, %d modified, %d dropped)",
+        index_state["duration_ms"],
+        len(index_state["created"]),
+        len(index_state["modified"]),
+        len(index_state["dropped"]),
+    )
+
+
+async def critical_indexes_present() -> bool:
+    async def _has_all(collection_name: str, names: List[str]) -> bool:
+        existing = await db[collection_name].index_information()
+        return all(name in existing for name in names)
+
+    checks = await asyncio.gather(
+        *(_has_all(name, names) for name, names in CRITICAL_INDEXES.items())
+    )
+    return all(checks)
+
+
+# ----------------------------
+# Seed marker
+# ----------------------------
+async def get_seed_version() -> int:
+    marker = await meta_collection.find_one({"_id": "seed"}, {"version": 1})
+    return marker.get("version", 0) if marker else 0
+
+
+async def set_seed_version(version: int) -> None:
+    await meta_collection.update_one(
+        {"_id": "seed"},
+        {"$set": {"version": version, "updated_at": datetime.utcnow()}},
+        upsert=True,
+    )
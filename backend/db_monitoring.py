@@ -0,0 +1,155 @@
+"""
+Monitorização do cliente Motor/PyMongo.
+
+- CommandLatencyListener: latência por (coleção, comando).
+- PoolListener: tempo de espera por uma ligação do pool, ligações em uso e
+  falhas de checkout (pool esgotado / timeouts).
+
+Os eventos do PyMongo chegam nas threads do executor do Motor, por isso o
+acesso aos contadores é protegido por um lock.
+"""
+from typing import Dict, Any, Tuple
+import threading
+import time
+
+from pymongo import monitoring
+
+from metrics import Histogram
+
+
+class DbMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.commands: Dict[Tuple[str, str], Histogram] = {}
+        self.failures: Dict[Tuple[str, str], int] = {}
+        self.pool_wait = Histogram()
+        self.pool: Dict[str, int] = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checked_out": 0,
+            "max_checked_out": 0,
+            "checkout_failures": 0,
+            "checkout_timeouts": 0,
+        }
+
+    def record_command(self, collection: str, command: str, duration_ms: float) -> None:
+        key = (collection, command)
+        with self.lock:
+            hist = self.commands.get(key)
+            if hist is None:
+                hist = self.commands[key] = Histogram()
+            hist.observe(duration_ms)
+
+    def record_failure(self, collection: str, command: str) -> None:
+        key = (collection, command)
+        with self.lock:
+            self.failures[key] = self.failures.get(key, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "commands": [
+                    {
+                        "collection": collection,
+                        "command": command,
+                        "failures": self.failures.get((collection, command), 0),
+                        **hist.snapshot(),
+                    }
+                    for (collection, command), hist in sorted(self.commands.items())
+                ],
+                "pool": {**self.pool, "wait": self.pool_wait.snapshot()},
+            }
+
+
+db_metrics = DbMetrics()
+
+# comandos cujo valor não é o nome da coleção
+_NO_COLLECTION_COMMANDS = {"getMore", "endSessions", "hello", "isMaster", "ping"}
+
+
+class CommandLatencyListener(monitoring.CommandListener):
+    def __init__(self, metrics: DbMetrics):
+        self.metrics = metrics
+        self._inflight: Dict[Tuple[int, Any], str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        name = event.command_name
+        if name == "getMore":
+            collection = event.command.get("collection", "")
+        elif name in _NO_COLLECTION_COMMANDS:
+            collection = ""
+        else:
+            target = event.command.get(name)
+            collection = target if isinstance(target, str) else ""
+        self._inflight[(event.request_id, event.connection_id)] = collection
+
+    def _collection(self, event) -> str:
+        return self._inflight.pop((event.request_id, event.connection_id), "")
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self.metrics.record_command(
+            self._collection(event), event.command_name, event.duration_micros / 1000
+        )
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        collection = self._collection(event)
+        self.metrics.record_command(
+            collection, event.command_name, event.duration_micros / 1000
+        )
+        self.metrics.record_failure(collection, event.command_name)
+
+
+class PoolListener(monitoring.ConnectionPoolListener):
+    """O checkout é síncrono na thread que pede a ligação: mede com thread-local."""
+
+    def __init__(self, metrics: DbMetrics):
+        self.metrics = metrics
+        self._local = threading.local()
+
+    def connection_check_out_started(self, event) -> None:
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event) -> None:
+        started = getattr(self._local, "started", None)
+        pool = self.metrics.pool
+        with self.metrics.lock:
+            if started is not None:
+                self.metrics.pool_wait.observe((time.perf_counter() - started) * 1000)
+            pool["checked_out"] += 1
+            pool["max_checked_out"] = max(pool["max_checked_out"], pool["checked_out"])
+        self._local.started = None
+
+    def connection_check_out_failed(self, event) -> None:
+        with self.metrics.lock:
+            self.metrics.pool["checkout_failures"] += 1
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                self.metrics.pool["checkout_timeouts"] += 1
+        self._local.started = None
+
+    def connection_checked_in(self, event) -> None:
+        with self.metrics.lock:
+            self.metrics.pool["checked_out"] -= 1
+
+    def connection_created(self, event) -> None:
+        with self.metrics.lock:
+            self.metrics.pool["connections_created"] += 1
+
+    def connection_closed(self, event) -> None:
+        with self.metrics.lock:
+            self.metrics.pool["connections_closed"] += 1
+
+    # eventos sem interesse para as métricas
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        pass
+
+    def connection_ready(self, event) -> None:
+        pass
@@ -0,0 +1,125 @@
+"""
+Pipeline de logging não bloqueante.
+
+Os handlers dos loggers só põem o LogRecord numa fila em memória; a
+formatação (JSON) e a escrita no stdout acontecem na thread do
+QueueListener, fora do caminho do request.
+
+Variáveis de ambiente:
+- LOG_LEVEL:    nível base (default INFO)
+- LOG_LEVELS:   níveis por módulo, ex. "tracing=WARNING,workers=DEBUG"
+- LOG_FORMAT:   "json" (default) ou "text"
+- LOG_SAMPLING: fração de logs INFO/DEBUG mantidos por logger,
+                ex. "tracing=0.1" (WARNING ou acima nunca são amostrados)
+"""
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+
+# atributos standard de um LogRecord (tudo o resto veio por `extra=`)
+_RECORD_ATTRS = set(
+    logging.LogRecord("", 0, "", 0, "", (), None).__dict__
+) | {"message", "asctime", "taskName"}
+
+DEFAULT_LOG_LEVELS = "pymongo=WARNING,httpx=WARNING"
+DEFAULT_LOG_SAMPLING = "tracing=0.1"
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    O QueueHandler standard formata a mensagem antes de a pôr na fila (na
+    thread do request). Aqui o record segue tal como está; o `%` dos args
+    só acontece no listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """Mantém só uma fração dos logs INFO/DEBUG de um logger."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.INFO or random.random() < self.rate
+
+
+def _parse_pairs(value: str) -> Dict[str, str]:
+    pairs: Dict[str, str] = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, _, level = item.partition("=")
+            pairs[name.strip()] = level.strip()
+    return pairs
+
+
+def setup_logging() -> None:
+    """Configura o root logger (idempotente)."""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if os.environ.get("LOG_FORMAT", "json").lower() == "text":
+        stream_handler.setFormatter(
+            logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+        )
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    root = logging.getLogger()
+    root.handlers[:] = [LazyQueueHandler(log_queue)]
+    root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+
+    levels = _parse_pairs(DEFAULT_LOG_LEVELS)
+    levels.update(_parse_pairs(os.environ.get("LOG_LEVELS", "")))
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    for name, rate in _parse_pairs(
+        os.environ.get("LOG_SAMPLING", DEFAULT_LOG_SAMPLING)
+    ).items():
+        sampled = logging.getLogger(name)
+        sampled.filters = [f for f in sampled.filters if not isinstance(f, SamplingFilter)]
+        if float(rate) < 1.0:
+            sampled.addFilter(SamplingFilter(float(rate)))
+
+
+def shutdown_logging() -> None:
+    """Escoa a fila e pára o listener (chamado no shutdown / atexit)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
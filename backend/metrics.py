@@ -0,0 +1,262 @@
+"""
+Primitivas de métricas em memória (por processo).
+
+Histogramas com buckets fixos: `observe` é um bisect + três somas, barato o
+suficiente para correr em cada request / comando Mongo.
+"""
+from bisect import bisect_left
+from typing import Dict, Any, Sequence, Optional, Tuple, List
+import asyncio
+import time
+
+# buckets em milissegundos
+DEFAULT_BUCKETS_MS = (
+    0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000,
+)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        # um contador por bucket + overflow (+Inf)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Pares (le, contagem acumulada), incluindo +Inf no fim."""
+        total = 0
+        for le, c in zip(self.buckets + (float("inf"),), self.counts):
+            total += c
+            yield le, total
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Aproximação pelo limite superior do bucket que contém o quantil."""
+        if not self.count:
+            return None
+        target = q * self.count
+        for le, total in self.cumulative():
+            if total >= target:
+                return le if le != float("inf") else self.buckets[-1]
+        return self.buckets[-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum, 3),
+            "avg_ms": round(self.sum / self.count, 3) if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+        }
+
+
+# =====================================================================
+# HTTP
+# =====================================================================
+class HttpMetrics:
+    """Contadores por (método, rota template, status) e latência por rota."""
+
+    def __init__(self):
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.in_flight = 0
+        self.loop_lag = Histogram()
+        self.loop_lag_last_ms = 0.0
+        # etapas de pipelines internos, ex. ("checkout", "price")
+        self.stages: Dict[Tuple[str, str], Histogram] = {}
+        # lookups single-flight: (nome, executed|coalesced|negative_hit)
+        self.lookups: Dict[Tuple[str, str], int] = {}
+
+    def observe(self, method: str, route: str, status: int, duration_ms: float) -> None:
+        key = (method, route, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        hist = self.latency.get((method, route))
+        if hist is None:
+            hist = self.latency[(method, route)] = Histogram()
+        hist.observe(duration_ms)
+
+    def observe_stage(self, pipeline: str, stage: str, duration_ms: float) -> None:
+        hist = self.stages.get((pipeline, stage))
+        if hist is None:
+            hist = self.stages[(pipeline, stage)] = Histogram()
+        hist.observe(duration_ms)
+
+    def count_lookup(self, name: str, outcome: str) -> None:
+        key = (name, outcome)
+        self.lookups[key] = self.lookups.get(key, 0) + 1
+
+
+http_metrics = HttpMetrics()
+
+
+def route_template(scope: Dict[str, Any]) -> str:
+    """`/api/products/{product_id}` em vez do path real (cardinalidade fixa)."""
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI puro (sem BaseHTTPMiddleware): só mede o tempo até ao fim
+    da resposta e apanha o status no `http.response.start`.
+    """
+
+    def __init__(self, app, metrics: HttpMetrics = http_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        metrics = self.metrics
+        status_holder = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        metrics.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.in_flight -= 1
+            metrics.observe(
+                scope["method"],
+                route_template(scope),
+                status_holder[0],
+                (time.perf_counter() - started) * 1000,
+            )
+
+
+async def monitor_event_loop_lag(
+    metrics: HttpMetrics = http_metrics, interval: float = 0.5
+) -> None:
+    """Mede o atraso do event loop: quanto um sleep(interval) demora a mais."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag_ms = max(0.0, (loop.time() - started - interval) * 1000)
+        metrics.loop_lag_last_ms = lag_ms
+        metrics.loop_lag.observe(lag_ms)
+
+
+# =====================================================================
+# EXPOSIÇÃO (formato texto Prometheus)
+# =====================================================================
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: Any) -> str:
+    inner = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+    return "{" + inner + "}"
+
+
+def _histogram_lines(name: str, hist: Histogram, **labels: Any) -> List[str]:
+    """Histograma em segundos (convenção Prometheus)."""
+    lines = []
+    for le, total in hist.cumulative():
+        le_label = "+Inf" if le == float("inf") else repr(le / 1000)
+        lines.append(f"{name}_bucket{_labels(**labels, le=le_label)} {total}")
+    lines.append(f"{name}_sum{_labels(**labels)} {hist.sum / 1000}")
+    lines.append(f"{name}_count{_labels(**labels)} {hist.count}")
+    return lines
+
+
+def render_prometheus(
+    metrics: HttpMetrics = http_metrics, db: Optional[Any] = None
+) -> str:
+    """`db` é o DbMetrics do cliente Mongo (opcional)."""
+    lines: List[str] = [
+        "# HELP http_requests_total Requests handled, by route template and status.",
+        "# TYPE http_requests_total counter",
+    ]
+    for (method, route, status), count in sorted(metrics.requests.items()):
+        lines.append(
+            f"http_requests_total{_labels(method=method, route=route, status=status)} {count}"
+        )
+
+    lines += [
+        "# HELP http_request_duration_seconds Request latency by route template.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route), hist in sorted(metrics.latency.items()):
+        lines += _histogram_lines(
+            "http_request_duration_seconds", hist, method=method, route=route
+        )
+
+    lines += [
+        "# HELP http_requests_in_flight Requests currently being handled.",
+        "# TYPE http_requests_in_flight gauge",
+        f"http_requests_in_flight {metrics.in_flight}",
+        "# HELP event_loop_lag_seconds Event loop scheduling delay.",
+        "# TYPE event_loop_lag_seconds histogram",
+        *_histogram_lines("event_loop_lag_seconds", metrics.loop_lag),
+        "# TYPE event_loop_lag_last_seconds gauge",
+        f"event_loop_lag_last_seconds {metrics.loop_lag_last_ms / 1000}",
+        "# HELP pipeline_stage_duration_seconds Duration of internal pipeline stages.",
+        "# TYPE pipeline_stage_duration_seconds histogram",
+    ]
+    for (pipeline, stage), hist in sorted(metrics.stages.items()):
+        lines += _histogram_lines(
+            "pipeline_stage_duration_seconds", hist, pipeline=pipeline, stage=stage
+        )
+
+    lines += [
+        "# HELP lookup_requests_total Single-flight lookups by outcome.",
+        "# TYPE lookup_requests_total counter",
+    ]
+    for (name, outcome), count in sorted(metrics.lookups.items()):
+        lines.append(
+            f"lookup_requests_total{_labels(lookup=name, outcome=outcome)} {count}"
+        )
+
+    if db is not None:
+        with db.lock:
+            commands = sorted(db.commands.items())
+            failures = dict(db.failures)
+            pool = dict(db.pool)
+            pool_wait = db.pool_wait
+            lines += [
+                "# HELP mongodb_command_duration_seconds MongoDB command latency.",
+                "# TYPE mongodb_command_duration_seconds histogram",
+            ]
+            for (collection, command), hist in commands:
+                lines += _histogram_lines(
+                    "mongodb_command_duration_seconds",
+                    hist,
+                    collection=collection,
+                    command=command,
+                )
+            lines.append("# TYPE mongodb_command_failures_total counter")
+            for (collection, command), count in sorted(failures.items()):
+                lines.append(
+                    "mongodb_command_failures_total"
+                    f"{_labels(collection=collection, command=command)} {count}"
+                )
+            lines += [
+                "# HELP mongodb_pool_wait_seconds Time waiting for a pooled connection.",
+                "# TYPE mongodb_pool_wait_seconds histogram",
+                *_histogram_lines("mongodb_pool_wait_seconds", pool_wait),
+                "# TYPE mongodb_pool_checked_out gauge",
+                f"mongodb_pool_checked_out {pool['checked_out']}",
+                "# TYPE mongodb_pool_checkout_failures_total counter",
+                f"mongodb_pool_checkout_failures_total {pool['checkout_failures']}",
+            ]
+
+    return "\n".join(lines) + "\n"
@@ -1,8 +1,10 @@
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, field_validator
 from typing import List, Optional
 from datetime import datetime
 import uuid
 
+from order_states import normalize_order_status, normalize_payment_status
+
 # =====================================================================
 # HELPERS
 # =====================================================================
@@ -41,6 +43,18 @@ class Category(BaseModel):
 class CategoryResponse(BaseModel):
     categories: List[Category]
 
+
+class CategoryWithStats(Category):
+    """Categoria + agregados dos produtos (ver category_stats.py)."""
+    product_count: int = 0
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    in_stock_count: int = 0
+
+
+class CategoryWithStatsResponse(BaseModel):
+    categories: List[CategoryWithStats]
+
 # =====================================================================
 # PRODUCT MODELS
 # =====================================================================
@@ -100,6 +114,13 @@ class OrderCreate(BaseModel):
     user_id: Optional[str] = None
 
 
+class OrderStatusChange(BaseModel):
+    at: datetime
+    status: Optional[str] = None
+    payment_status: Optional[str] = None
+    by: Optional[str] = None
+
+
 class Order(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     order_number: str
@@ -109,8 +130,10 @@ class Order(BaseModel):
     payment_method: str
     payment_status: str = "pending"
     payment_reference: Optional[str] = None
+    payment_expires_at: Optional[datetime] = None
     total: float
     status: str = "pending"
+    status_history: List[OrderStatusChange] = []
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -119,10 +142,53 @@ class OrderResponse(BaseModel):
     order: Order
 
 
+class OrderSummary(BaseModel):
+    """Linha de "os meus pedidos"; o detalhe vem de /orders/my/{order_number}."""
+    id: str
+    order_number: str
+    created_at: datetime
+    total: float
+    status: str
+    payment_status: str
+    item_count: int
+    first_image: Optional[str] = None
+
+
+class OrderSummaryPage(BaseModel):
+    orders: List[OrderSummary]
+    next_cursor: Optional[str] = None
+
+
 class AdminOrderUpdate(BaseModel):
     status: Optional[str] = None
     payment_status: Optional[str] = None
 
+    @field_validator("status")
+    @classmethod
+    def check_status(cls, value: Optional[str]) -> Optional[str]:
+        return value if value is None else normalize_order_status(value)
+
+    @field_validator("payment_status")
+    @classmethod
+    def check_payment_status(cls, value: Optional[str]) -> Optional[str]:
+        return value if value is None else normalize_payment_status(value)
+
+
+class AdminOrderBulkStatus(BaseModel):
+    order_numbers: List[str] = Field(..., min_length=1, max_length=500)
+    status: str
+    payment_status: Optional[str] = None
+
+    @field_validator("status")
+    @classmethod
+    def check_status(cls, value: str) -> str:
+        return normalize_order_status(value)
+
+    @field_validator("payment_status")
+    @classmethod
+    def check_payment_status(cls, value: Optional[str]) -> Optional[str]:
+        return value if value is None else normalize_payment_status(value)
+
 # =====================================================================
 # PAYMENT MODELS (Multicaixa mock, já usados)
 # =====================================================================
@@ -164,6 +230,7 @@ class Payment(BaseModel):
     status: str
     reference: Optional[str] = None
     phone: Optional[str] = None
+    expires_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -289,12 +356,23 @@ class Notification(BaseModel):
     user_id: str
     title: str
     message: str
+    link: Optional[str] = None
     is_read: bool = False
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
 class NotificationsResponse(BaseModel):
     notifications: List[Notification]
+    next_cursor: Optional[str] = None
+
+
+class NotificationsMarkRead(BaseModel):
+    ids: List[str] = Field(default_factory=list)
+    all: bool = False    # marca todas as não lidas
+
+
+class UnreadCountResponse(BaseModel):
+    unread: int
 
 # =====================================================================
 # ACTIVITY LOGS (registo de ações do utilizador/admin)
@@ -0,0 +1,192 @@
+"""
+Notificações para os utilizadores.
+
+- Fan-out: `notification_fanout.notify(...)` só põe a notificação no buffer;
+  o BufferedWriter grava-as em lote (`insert_many`) e atualiza os contadores
+  de não lidas com um único `bulk_write` de `$inc` por lote. Se esse
+  `bulk_write` falhar, as notificações já estão gravadas e não voltam ao
+  buffer: só os incrementos em falta ficam pendentes e são repetidos no
+  flush seguinte. Se o `insert_many` falhar de outra forma (ex.: timeout),
+  o lote inteiro volta ao buffer; o índice único em `id` faz com que as
+  notificações já gravadas na tentativa anterior deem duplicate key (11000)
+  e contem como gravadas, sem duplicar.
+- O contador de não lidas vive em `notification_counters` (um doc por
+  utilizador), por isso ler o badge é um `find_one` e nunca um
+  `count_documents`.
+"""
+from typing import Optional, Dict, Any, List, Tuple
+from datetime import datetime
+import base64
+import logging
+import os
+
+from fastapi import HTTPException
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from batching import BufferedWriter
+from database import notifications_collection, notification_counters_collection
+from models import Notification
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class NotificationFanout(BufferedWriter):
+    name = "notification-fanout"
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        # incrementos de `unread` ainda por gravar, por utilizador
+        self._pending_counts: Dict[str, int] = {}
+        self.stats["counter_errors"] = 0
+
+    @classmethod
+    def from_env(cls) -> "NotificationFanout":
+        return cls(
+            batch_size=int(os.environ.get("NOTIFICATION_BATCH_SIZE", 200)),
+            flush_interval=float(os.environ.get("NOTIFICATION_FLUSH_INTERVAL", 1.0)),
+            max_buffer=int(os.environ.get("NOTIFICATION_MAX_BUFFER", 10000)),
+        )
+
+    def notify(
+        self,
+        user_id: Optional[str],
+        title: str,
+        message: str,
+        link: Optional[str] = None,
+    ) -> None:
+        """Enfileira uma notificação (pedidos de convidados não têm user_id)."""
+        if not user_id:
+            return
+        self.submit(
+            Notification(user_id=user_id, title=title, message=message, link=link).dict()
+        )
+
+    async def write_batch(self, batch: List[Dict[str, Any]]) -> int:
+        inserted = batch
+        try:
+            await notifications_collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # duplicate key: já gravada por uma tentativa anterior deste lote,
+            # que falhou antes de contar (o lote voltou inteiro ao buffer)
+            failed = {
+                err["index"]
+                for err in e.details.get("writeErrors", [])
+                if err.get("code") != DUPLICATE_KEY_ERROR
+            }
+            inserted = [doc for i, doc in enumerate(batch) if i not in failed]
+            if failed:
+                self.stats["flush_errors"] += 1
+                logger.warning(
+                    "Notification batch partially failed: %d errors", len(failed)
+                )
+
+        for doc in inserted:
+            user_id = doc["user_id"]
+            self._pending_counts[user_id] = self._pending_counts.get(user_id, 0) + 1
+        await self._write_counters()
+        return len(inserted)
+
+    async def flush(self) -> int:
+        written = await super().flush()
+        if self._pending_counts:
+            # lotes anteriores cujos contadores falharam
+            await self._write_counters()
+        return written
+
+    async def _write_counters(self) -> None:
+        """Grava os incrementos pendentes; os que falharem ficam para depois."""
+        pending = list(self._pending_counts.items())
+        if not pending:
+            return
+        self._pending_counts = {}
+        failed: List[int] = []
+        try:
+            await notification_counters_collection.bulk_write(
+                [
+                    UpdateOne({"user_id": user_id}, {"$inc": {"unread": n}}, upsert=True)
+                    for user_id, n in pending
+                ],
+                ordered=False,
+            )
+        except BulkWriteError as e:
+            failed = [err["index"] for err in e.details.get("writeErrors", [])]
+        except Exception as e:
+            logger.warning("Unread counter update failed: %s", e)
+            failed = list(range(len(pending)))
+        if failed:
+            self.stats["counter_errors"] += 1
+            for i in failed:
+                user_id, n = pending[i]
+                self._pending_counts[user_id] = (
+                    self._pending_counts.get(user_id, 0) + n
+                )
+
+
+notification_fanout = NotificationFanout.from_env()
+
+
+# =====================================================================
+# LEITURA / MARCAR COMO LIDAS
+# =====================================================================
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    raw = f"{doc['created_at'].isoformat()}|{doc['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, _, doc_id = raw.partition("|")
+        return datetime.fromisoformat(created_at), doc_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+async def list_notifications(
+    user_id: str, cursor: Optional[str] = None, limit: int = 20
+) -> Tuple[List[Notification], Optional[str]]:
+    """Página de notificações (mais recentes primeiro) com cursor (created_at, id)."""
+    query: Dict[str, Any] = {"user_id": user_id}
+    if cursor:
+        created_at, doc_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": doc_id}},
+        ]
+
+    docs = (
+        await notifications_collection.find(query, {"_id": 0})
+        .sort([("created_at", -1), ("id", -1)])
+        .limit(limit + 1)
+        .to_list(limit + 1)
+    )
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return [Notification(**doc) for doc in docs[:limit]], next_cursor
+
+
+async def mark_read(user_id: str, ids: List[str], all_unread: bool = False) -> int:
+    query: Dict[str, Any] = {"user_id": user_id, "is_read": False}
+    if not all_unread:
+        if not ids:
+            return 0
+        query["id"] = {"$in": ids}
+
+    result = await notifications_collection.update_many(
+        query, {"$set": {"is_read": True}}
+    )
+    if result.modified_count:
+        await notification_counters_collection.update_one(
+            {"user_id": user_id},
+            {"$inc": {"unread": -result.modified_count}},
+        )
+    return result.modified_count
+
+
+async def unread_count(user_id: str) -> int:
+    counter = await notification_counters_collection.find_one(
+        {"user_id": user_id}, {"_id": 0, "unread": 1}
+    )
+    return max(counter.get("unread", 0), 0) if counter else 0
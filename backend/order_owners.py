@@ -0,0 +1,199 @@
+"""
+Chave normalizada de dono dos pedidos (`owner_keys`).
+
+Cada pedido guarda `["user:<id>", "email:<email>"]` (só as que existirem):
+pedidos de convidados ficam com a chave de email e aparecem na conta que
+vier a ser criada com esse email. "Os meus pedidos" é então um `$in` sobre
+um único índice (owner_keys, created_at, order_number) em vez de um `$or`
+entre `user_id` e `customer.email`.
+
+OwnerKeysBackfill preenche `owner_keys` nos pedidos que não as têm, em
+background: percorre a coleção por `_id` a partir do último `_id` visto
+(gravado em `meta.owner_keys_backfill` a cada lote, por isso retoma onde
+parou) e volta a correr periodicamente. Pedidos escritos por pods antigos
+durante um rolling deploy têm `_id` posteriores ao marcador e são apanhados
+na passagem seguinte; os `_id` dos últimos SETTLE_DELAY ficam para depois,
+porque ObjectIds de processos diferentes não chegam por ordem.
+
+Enquanto a primeira passagem completa não acabar (`done_at` no marcador),
+"os meus pedidos" também procura por `user_id`/`customer.email` e os índices
+antigos dessas queries ficam (database.LEGACY_OWNER_INDEXES); `on_done` corre
+uma vez, quando o marcador passa a `done_at`.
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import os
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_MARKER_ID = "owner_keys_backfill"
+SETTLE_DELAY = timedelta(minutes=1)
+
+
+def owner_keys(user_id: Optional[str], email: Optional[str]) -> List[str]:
+    keys = []
+    if user_id:
+        keys.append(f"user:{user_id}")
+    if email:
+        keys.append(f"email:{email.strip().lower()}")
+    return keys
+
+
+def order_owner_keys(order: Dict[str, Any]) -> List[str]:
+    return owner_keys(order.get("user_id"), (order.get("customer") or {}).get("email"))
+
+
+class OwnerKeysBackfill:
+    def __init__(
+        self,
+        orders,
+        meta,
+        interval_seconds: float = 300.0,
+        batch_size: int = 500,
+        marker_id: str = BACKFILL_MARKER_ID,
+        on_done: Optional[Callable[[], Awaitable[Any]]] = None,
+    ):
+        self.orders = orders
+        self.meta = meta
+        self.marker_id = marker_id
+        self.on_done = on_done
+        # True quando alguma passagem (deste ou de outro processo) chegou ao fim
+        self.done = False
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, Any] = {
+            "runs": 0,
+            "last_run_at": None,
+            "scanned": 0,
+            "updated": 0,
+            "last_error": None,
+        }
+
+    @classmethod
+    def from_env(
+        cls,
+        orders,
+        meta,
+        marker_id: str = BACKFILL_MARKER_ID,
+        on_done: Optional[Callable[[], Awaitable[Any]]] = None,
+    ) -> "OwnerKeysBackfill":
+        return cls(
+            orders,
+            meta,
+            marker_id=marker_id,
+            on_done=on_done,
+            interval_seconds=float(
+                os.environ.get("OWNER_KEYS_BACKFILL_INTERVAL_SECONDS", 300)
+            ),
+            batch_size=int(os.environ.get("OWNER_KEYS_BACKFILL_BATCH_SIZE", 500)),
+        )
+
+    # -----------------------------------------------------------------
+    # ciclo de vida
+    # -----------------------------------------------------------------
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(
+                self._run(), name=f"backfill-{self.marker_id}"
+            )
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["last_error"] = str(e)
+                logger.error("owner_keys backfill failed: %s", e)
+            await asyncio.sleep(self.interval_seconds)
+
+    # -----------------------------------------------------------------
+    # execução
+    # -----------------------------------------------------------------
+    async def run_once(self) -> Dict[str, int]:
+        """Percorre os pedidos desde o marcador, um lote de cada vez."""
+        totals = {"scanned": 0, "updated": 0}
+        marker = await self.meta.find_one({"_id": self.marker_id}) or {}
+        self.done = bool(marker.get("done_at"))
+        last_id = marker.get("last_id")
+        settled = ObjectId.from_datetime(datetime.utcnow() - SETTLE_DELAY)
+
+        while True:
+            id_range: Dict[str, Any] = {"$lt": settled}
+            if last_id is not None:
+                id_range["$gt"] = last_id
+            batch = await self.orders.find(
+                {"_id": id_range},
+                {"_id": 1, "owner_keys": 1, "user_id": 1, "customer.email": 1},
+            ).sort("_id", 1).limit(self.batch_size).to_list(self.batch_size)
+            if not batch:
+                break
+
+            operations = [
+                UpdateOne(
+                    {"_id": order["_id"], "owner_keys": {"$exists": False}},
+                    {"$set": {"owner_keys": order_owner_keys(order)}},
+                )
+                for order in batch
+                if "owner_keys" not in order
+            ]
+            if operations:
+                result = await self.orders.bulk_write(operations, ordered=False)
+                totals["updated"] += result.modified_count
+            totals["scanned"] += len(batch)
+
+            last_id = batch[-1]["_id"]
+            await self.meta.update_one(
+                {"_id": self.marker_id},
+                {"$set": {"last_id": last_id, "updated_at": datetime.utcnow()}},
+                upsert=True,
+            )
+            if len(batch) < self.batch_size:
+                break
+            await asyncio.sleep(0)
+
+        if not self.done:
+            # primeira passagem completa: todos os pedidos até aqui têm chaves
+            await self.meta.update_one(
+                {"_id": self.marker_id},
+                {"$set": {"done_at": datetime.utcnow()}},
+                upsert=True,
+            )
+            self.done = True
+            logger.info("owner_keys backfill complete (%s)", self.marker_id)
+            if self.on_done is not None:
+                await self.on_done()
+
+        self.stats["runs"] += 1
+        self.stats["last_run_at"] = datetime.utcnow().isoformat()
+        self.stats["last_error"] = None
+        for key, value in totals.items():
+            self.stats[key] += value
+        if totals["updated"]:
+            logger.info(
+                "Backfilled owner_keys on %d orders (%s)",
+                totals["updated"],
+                self.marker_id,
+            )
+        return totals
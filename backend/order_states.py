@@ -0,0 +1,133 @@
+"""
+Máquina de estados dos pedidos e pagamentos.
+
+Cada estado lista os estados para onde pode passar. `allowed_sources(target)`
+dá o inverso, usado como guarda no filtro dos updates
+(`{"status": {"$in": ...}}`) para que uma transição inválida nunca seja
+aplicada, mesmo com pedidos alterados em concorrência.
+
+Grafias antigas ("new") são normalizadas para o estado canónico, e cada
+mudança fica num `status_history` só de acréscimo, limitado às últimas
+STATUS_HISTORY_LIMIT entradas (`$push` com `$slice`).
+"""
+from typing import Any, Dict, FrozenSet, List, Optional
+from datetime import datetime
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+ORDER_TRANSITIONS: Dict[str, FrozenSet[str]] = {
+    "pending": frozenset({"confirmed", "processing", "cancelled", "expired"}),
+    "confirmed": frozenset({"processing", "shipped", "cancelled"}),
+    "processing": frozenset({"shipped", "cancelled"}),
+    "shipped": frozenset({"delivered"}),
+    "delivered": frozenset(),
+    "cancelled": frozenset(),
+    "expired": frozenset(),
+}
+
+PAYMENT_TRANSITIONS: Dict[str, FrozenSet[str]] = {
+    "pending": frozenset({"paid", "failed", "expired"}),
+    "failed": frozenset({"pending", "paid"}),
+    "expired": frozenset({"pending"}),
+    "paid": frozenset({"refunded"}),
+    "refunded": frozenset(),
+}
+
+ORDER_STATUSES = frozenset(ORDER_TRANSITIONS)
+PAYMENT_STATUSES = frozenset(PAYMENT_TRANSITIONS)
+
+# grafias antigas ainda presentes em pedidos já gravados
+ORDER_STATUS_ALIASES = {"new": "pending"}
+
+STATUS_HISTORY_LIMIT = int(os.environ.get("ORDER_STATUS_HISTORY_LIMIT", 20))
+
+
+def normalize_order_status(value: str) -> str:
+    """Devolve o estado canónico; ValueError se não existir."""
+    value = ORDER_STATUS_ALIASES.get(value, value)
+    if value not in ORDER_STATUSES:
+        raise ValueError(f"Unknown order status: {value}")
+    return value
+
+
+def normalize_payment_status(value: str) -> str:
+    if value not in PAYMENT_STATUSES:
+        raise ValueError(f"Unknown payment status: {value}")
+    return value
+
+
+def can_transition(current: str, target: str) -> bool:
+    current = ORDER_STATUS_ALIASES.get(current, current)
+    return target in ORDER_TRANSITIONS.get(current, frozenset())
+
+
+def can_transition_payment(current: str, target: str) -> bool:
+    return target in PAYMENT_TRANSITIONS.get(current, frozenset())
+
+
+def allowed_sources(target: str) -> List[str]:
+    """Estados a partir dos quais se pode chegar a `target`."""
+    return sorted(
+        state for state, targets in ORDER_TRANSITIONS.items() if target in targets
+    )
+
+
+def allowed_payment_sources(target: str) -> List[str]:
+    return sorted(
+        state for state, targets in PAYMENT_TRANSITIONS.items() if target in targets
+    )
+
+
+def transition_guard(
+    status: Optional[str] = None, payment_status: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Condições a juntar ao filtro do update. O próprio estado alvo também é
+    aceite, para que um PATCH que repete o estado atual não falhe.
+    """
+    guard: Dict[str, Any] = {}
+    if status is not None:
+        guard["status"] = {"$in": allowed_sources(status) + [status]}
+    if payment_status is not None:
+        guard["payment_status"] = {
+            "$in": allowed_payment_sources(payment_status) + [payment_status]
+        }
+    return guard
+
+
+def history_entry(
+    status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    by: Optional[str] = None,
+    at: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    entry: Dict[str, Any] = {"at": at or datetime.utcnow()}
+    if status is not None:
+        entry["status"] = status
+    if payment_status is not None:
+        entry["payment_status"] = payment_status
+    if by is not None:
+        entry["by"] = by
+    return entry
+
+
+def history_push(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Operador `$push` que acrescenta uma entrada e mantém só as últimas N."""
+    return {
+        "status_history": {"$each": [entry], "$slice": -STATUS_HISTORY_LIMIT}
+    }
+
+
+async def normalize_legacy_statuses(collection) -> int:
+    """Converte as grafias antigas gravadas em pedidos existentes."""
+    normalized = 0
+    for alias, canonical in ORDER_STATUS_ALIASES.items():
+        result = await collection.update_many(
+            {"status": alias}, {"$set": {"status": canonical}}
+        )
+        normalized += result.modified_count
+    if normalized:
+        logger.info("Normalized %d legacy order statuses", normalized)
+    return normalized
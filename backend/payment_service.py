@@ -0,0 +1,221 @@
+"""
+Serviço de estado de pedidos + pagamentos.
+
+Todas as mudanças que tocam em `payments` e `orders` ao mesmo tempo passam
+por aqui. Quando o MongoDB suporta transações (replica set / mongos) as duas
+escritas correm numa transação multi-documento; caso contrário aplicamos uma
+sequência ordenada com compensação, para nunca deixar pedido e pagamento
+divergentes.
+
+O caminho sem transações passa pelos repositórios (repositories.py), por
+isso também corre com o backend em memória.
+"""
+from typing import Optional, Dict, Any, Tuple
+from datetime import datetime
+import logging
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from database import client, orders_collection, payments_collection
+from models import Payment
+from order_states import (
+    allowed_payment_sources,
+    history_entry,
+    history_push,
+    transition_guard,
+)
+from repositories import repos
+
+logger = logging.getLogger(__name__)
+
+_transactions_supported: Optional[bool] = None
+
+_ORDER_OWNER_PROJECTION = {"_id": 0, "order_number": 1, "user_id": 1}
+
+
+async def supports_transactions() -> bool:
+    """Deteta (uma vez) se o servidor aceita transações multi-documento."""
+    global _transactions_supported
+    if repos.in_memory:
+        return False
+    if _transactions_supported is None:
+        try:
+            hello = await client.admin.command("hello")
+            _transactions_supported = bool(
+                hello.get("setName") or hello.get("msg") == "isdbgrid"
+            )
+        except Exception as e:
+            logger.warning("Could not detect transaction support: %s", e)
+            _transactions_supported = False
+    return _transactions_supported
+
+
+def _order_not_found() -> HTTPException:
+    return HTTPException(status_code=404, detail="Order not found")
+
+
+def _invalid_transition(what: str) -> HTTPException:
+    return HTTPException(status_code=409, detail=f"Invalid {what} transition.")
+
+
+async def _payment_rejected(transaction_id: str, session=None) -> HTTPException:
+    """404 se o pagamento não existe, 409 se o estado atual não permite a mudança."""
+    if session is not None:
+        exists = await payments_collection.find_one(
+            {"transaction_id": transaction_id}, {"_id": 1}, session=session
+        )
+    else:
+        exists = await repos.payments.get(transaction_id)
+    if not exists:
+        return HTTPException(status_code=404, detail="Payment not found")
+    return _invalid_transition("payment")
+
+
+async def _order_rejected(order_number: str, session=None) -> HTTPException:
+    """404 se o pedido não existe, 409 se já não aceita um novo pagamento."""
+    if session is not None:
+        exists = await orders_collection.find_one(
+            {"order_number": order_number}, {"_id": 1}, session=session
+        )
+    else:
+        exists = await repos.orders.get(order_number)
+    if not exists:
+        return _order_not_found()
+    return _invalid_transition("order")
+
+
+# um novo pagamento põe payment_status em "pending" e o pedido tem de poder
+# ainda ser confirmado: pedidos pagos, enviados ou fechados ficam de fora
+NEW_PAYMENT_GUARD = transition_guard("confirmed", "pending")
+
+
+async def register_payment(payment: Payment, order_fields: Dict[str, Any]) -> None:
+    """
+    Grava um novo pagamento e marca o pedido associado numa só operação lógica.
+
+    - Com transações: insert + update na mesma transação.
+    - Sem transações: insert do pagamento, update do pedido e, se o pedido
+      não existir ou o update falhar, remove o pagamento (compensação).
+
+    O update do pedido leva NEW_PAYMENT_GUARD: uma referência para um pedido
+    já pago ou fechado dá 409 e não grava nada.
+    """
+    payment_doc = payment.dict()
+    order_update = {"$set": {**order_fields, "updated_at": datetime.utcnow()}}
+    order_filter = {"order_number": payment.order_number, **NEW_PAYMENT_GUARD}
+
+    if await supports_transactions():
+        async with await client.start_session() as session:
+            async with session.start_transaction():
+                result = await orders_collection.update_one(
+                    order_filter, order_update, session=session
+                )
+                if result.matched_count == 0:
+                    raise await _order_rejected(payment.order_number, session)
+                await payments_collection.insert_one(payment_doc, session=session)
+        return
+
+    await repos.payments.insert(payment_doc)
+    try:
+        order_doc = await repos.orders.update_fields(
+            payment.order_number,
+            order_update,
+            projection=_ORDER_OWNER_PROJECTION,
+            guard=NEW_PAYMENT_GUARD,
+        )
+        if order_doc is None:
+            raise await _order_rejected(payment.order_number)
+    except Exception:
+        await repos.payments.delete(payment.transaction_id)
+        raise
+
+
+async def set_payment_status(
+    transaction_id: str,
+    payment_status: str,
+    order_status: Optional[str] = None,
+) -> Tuple[Payment, Optional[Dict[str, Any]]]:
+    """
+    Muda o estado de um pagamento e propaga-o para o pedido.
+
+    O pagamento é atualizado com `find_one_and_update(return_document=BEFORE)`,
+    o que elimina os `find_one` antes e depois do update: 2 round trips em vez
+    de 4. O documento anterior dá o estado a repor na compensação.
+
+    As duas escritas seguem a máquina de estados (order_states.py): o
+    pagamento só muda a partir de um estado que o permita e o pedido leva o
+    `transition_guard` do estado alvo; caso contrário nada fica gravado e a
+    resposta é 409 (404 se o pagamento não existir).
+
+    Devolve o pagamento e o pedido atualizado (só `order_number`/`user_id`,
+    para as notificações).
+    """
+    now = datetime.utcnow()
+    payment_sources = allowed_payment_sources(payment_status)
+    payment_update = {"$set": {"status": payment_status, "updated_at": now}}
+    order_fields: Dict[str, Any] = {"payment_status": payment_status, "updated_at": now}
+    if order_status:
+        order_fields["status"] = order_status
+    order_update = {
+        "$set": order_fields,
+        "$push": history_push(
+            history_entry(order_status, payment_status, by="payment", at=now)
+        ),
+    }
+
+    if await supports_transactions():
+        async with await client.start_session() as session:
+            async with session.start_transaction():
+                before = await payments_collection.find_one_and_update(
+                    {
+                        "transaction_id": transaction_id,
+                        "status": {"$in": payment_sources},
+                    },
+                    payment_update,
+                    return_document=ReturnDocument.BEFORE,
+                    session=session,
+                )
+                if not before:
+                    raise await _payment_rejected(transaction_id, session)
+                order_doc = await orders_collection.find_one_and_update(
+                    {
+                        "order_number": before["order_number"],
+                        **transition_guard(order_status, payment_status),
+                    },
+                    order_update,
+                    projection=_ORDER_OWNER_PROJECTION,
+                    return_document=ReturnDocument.AFTER,
+                    session=session,
+                )
+                if order_doc is None:
+                    # a exceção aborta a transação: o pagamento não muda
+                    raise _invalid_transition("order")
+        return Payment(**{**before, **payment_update["$set"]}), order_doc
+
+    before = await repos.payments.set_status(
+        transaction_id, payment_status, now, expected=payment_sources
+    )
+    if not before:
+        raise await _payment_rejected(transaction_id)
+
+    try:
+        order_doc = await repos.orders.update_fields(
+            before["order_number"],
+            order_update,
+            projection=_ORDER_OWNER_PROJECTION,
+            guard=transition_guard(order_status, payment_status),
+        )
+        if order_doc is None:
+            raise _invalid_transition("order")
+    except Exception:
+        # repõe o estado anterior do pagamento para não divergir do pedido
+        await repos.payments.set_status(
+            transaction_id,
+            before["status"],
+            datetime.utcnow(),
+            expected=payment_status,
+        )
+        raise
+
+    return Payment(**{**before, **payment_update["$set"]}), order_doc
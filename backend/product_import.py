@@ -0,0 +1,187 @@
+"""
+Importação/atualização em massa de produtos (CSV ou NDJSON).
+
+As linhas são lidas em streaming e processadas em blocos de
+IMPORT_CHUNK_SIZE: por bloco há um `find` dos produtos existentes e um
+`bulk_write(ordered=False)` de upserts. Cada linha é validada contra o
+modelo Product; linhas inválidas entram no relatório e não travam o resto.
+
+Linhas com `id` de um produto existente são atualizações parciais: só as
+colunas presentes são alteradas (ex.: um CSV só com `id,price`).
+"""
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+from datetime import datetime
+import csv
+import io
+import json
+import os
+
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from database import products_collection
+from models import Product
+
+IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", 500))
+# limite de erros devolvidos no relatório
+IMPORT_MAX_ERRORS = 1000
+
+_LIST_FIELDS = {"colors", "gallery"}
+_BOOL_FIELDS = {"featured", "is_new", "is_promo"}
+_PRODUCT_FIELDS = set(Product.model_fields) - {"created_at", "updated_at"}
+
+
+def _clean_csv_row(row: Dict[str, Optional[str]]) -> Dict[str, Any]:
+    """Converte strings do CSV: vazios são omitidos, listas separadas por '|'."""
+    cleaned: Dict[str, Any] = {}
+    for key, value in row.items():
+        if key is None or value is None:
+            continue
+        key = key.strip()
+        value = value.strip()
+        if value == "":
+            continue
+        if key in _LIST_FIELDS:
+            cleaned[key] = [part.strip() for part in value.split("|") if part.strip()]
+        elif key in _BOOL_FIELDS:
+            cleaned[key] = value.lower() in {"1", "true", "yes", "sim", "on"}
+        else:
+            cleaned[key] = value
+    return cleaned
+
+
+def iter_rows(stream, fmt: str) -> Iterator[Tuple[int, Any]]:
+    """(nº da linha, dados | erro de parsing) sem carregar o ficheiro todo."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        for line_no, row in enumerate(csv.DictReader(text), start=2):
+            yield line_no, _clean_csv_row(row)
+        return
+
+    for line_no, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, ValueError(f"Invalid JSON: {e.msg}")
+            continue
+        if not isinstance(data, dict):
+            yield line_no, ValueError("Each line must be a JSON object.")
+            continue
+        yield line_no, data
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}"
+        for err in error.errors()
+    )
+
+
+class ImportReport:
+    def __init__(self):
+        self.processed = 0
+        self.inserted = 0
+        self.updated = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.error_count = 0
+
+    def error(self, row: int, message: str, product_id: Optional[str] = None) -> None:
+        self.error_count += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"row": row, "id": product_id, "error": message})
+
+    def dict(self) -> Dict[str, Any]:
+        return {
+            "processed": self.processed,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "failed": self.error_count,
+            "errors": self.errors,
+        }
+
+
+async def _apply_chunk(
+    chunk: List[Tuple[int, Dict[str, Any]]], report: ImportReport
+) -> None:
+    ids = [data["id"] for _, data in chunk if data.get("id")]
+    existing: Dict[str, Dict[str, Any]] = {}
+    if ids:
+        async for doc in products_collection.find({"id": {"$in": ids}}, {"_id": 0}):
+            existing[doc["id"]] = doc
+
+    now = datetime.utcnow()
+    operations: List[UpdateOne] = []
+    op_rows: List[Tuple[int, str, bool]] = []
+    for row_no, data in chunk:
+        unknown = set(data) - _PRODUCT_FIELDS
+        if unknown:
+            message = f"Unknown columns: {', '.join(sorted(unknown))}"
+            report.error(row_no, message, data.get("id"))
+            continue
+
+        current = existing.get(data.get("id"))
+        try:
+            # atualização parcial: valida o produto resultante completo
+            product = Product(**{**(current or {}), **data})
+        except ValidationError as e:
+            report.error(row_no, _validation_message(e), data.get("id"))
+            continue
+
+        if current is not None:
+            changes = product.dict(include=set(data))
+            changes["updated_at"] = now
+            operations.append(UpdateOne({"id": product.id}, {"$set": changes}))
+        else:
+            doc = product.dict()
+            doc["created_at"] = doc["updated_at"] = now
+            # upsert: se outra linha/worker o criou entretanto, não duplica
+            operations.append(
+                UpdateOne({"id": product.id}, {"$setOnInsert": doc}, upsert=True)
+            )
+        op_rows.append((row_no, product.id, current is not None))
+
+    if not operations:
+        return
+
+    failed: Dict[int, str] = {}
+    try:
+        result = await products_collection.bulk_write(operations, ordered=False)
+        upserted = set(result.upserted_ids)
+    except BulkWriteError as e:
+        failed = {
+            err["index"]: err.get("errmsg", "write error")
+            for err in e.details.get("writeErrors", [])
+        }
+        upserted = {entry["index"] for entry in e.details.get("upserted", [])}
+
+    for index, (row_no, product_id, is_update) in enumerate(op_rows):
+        if index in failed:
+            report.error(row_no, failed[index], product_id)
+        elif is_update:
+            report.updated += 1
+        elif index in upserted:
+            report.inserted += 1
+        else:
+            # $setOnInsert sem efeito: id repetido no mesmo ficheiro
+            report.error(row_no, "Duplicate id in import.", product_id)
+
+
+async def import_products(stream, fmt: str) -> ImportReport:
+    report = ImportReport()
+    chunk: List[Tuple[int, Dict[str, Any]]] = []
+    for row_no, data in iter_rows(stream, fmt):
+        report.processed += 1
+        if isinstance(data, Exception):
+            report.error(row_no, str(data))
+            continue
+        chunk.append((row_no, data))
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            await _apply_chunk(chunk, report)
+            chunk = []
+    if chunk:
+        await _apply_chunk(chunk, report)
+    return report
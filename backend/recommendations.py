@@ -0,0 +1,372 @@
+"""
+"Comprados frequentemente juntos", a partir da co-ocorrência de produtos nos
+pedidos.
+
+RecommendationsJob percorre os pedidos novos desde a última execução
+(marcador `meta.recommendations`: created_at + order_number do último pedido
+lido), conta pares de `items.product_id` e grava em `product_recommendations`
+um documento compacto por produto:
+
+    {"product_id", "candidates": [{"id", "n"}], "related": [ids], "updated_at"}
+
+A memória fica limitada de três formas:
+- os pedidos são lidos por cursor e os pares gravados a cada `chunk_orders`;
+- no máximo MAX_ITEMS_PER_ORDER produtos distintos contam por pedido;
+- cada produto guarda só os `max_candidates` pares mais fortes, e
+  `related` tem os `top_k` primeiros.
+
+Todos os workers/pods correm o job, mas só um de cada vez conta pares: quem
+corre tem de ter o lease em `meta.recommendations_lease` (find_one_and_update
+com expiração, renovado a cada lote). Sem ele, cada processo somaria os
+mesmos pedidos e as contagens ficariam multiplicadas.
+
+`run_once(full=True)` apaga tudo e volta a contar desde o início: primeiro
+os pedidos arquivados (`orders_archive`, marcador `meta.recommendations_archive`),
+depois a coleção quente. A passagem pelo arquivo só acontece na reconstrução
+(nas execuções incrementais os pedidos arquivados já foram contados quando
+estavam na coleção quente) e, se for interrompida, a execução seguinte
+retoma-a a partir do seu marcador.
+
+A rota /api/products/{id}/related lê um documento pelo índice único em
+`product_id` e os cartões dos produtos com um `$in`; o resultado fica em
+cache até o catálogo mudar ou o job voltar a correr.
+"""
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import os
+import socket
+import time
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from cache_sync import TTLCache
+from catalog_cache import on_catalog_change
+from database import (
+    meta_collection,
+    orders_archive_collection,
+    orders_collection,
+    product_recommendations_collection,
+)
+from repositories import repos
+from storefront import CARD_PROJECTION
+
+logger = logging.getLogger(__name__)
+
+MAX_ITEMS_PER_ORDER = 20
+# pedidos que não chegaram a ser comprados não contam
+IGNORED_STATUSES = ["cancelled", "expired"]
+MARKER_ID = "recommendations"
+ARCHIVE_MARKER_ID = "recommendations_archive"
+LEASE_ID = "recommendations_lease"
+# pedidos mais recentes do que isto ficam para a próxima execução, para o
+# marcador não passar à frente de inserts concorrentes com created_at anterior
+SETTLE_DELAY = timedelta(minutes=1)
+
+PairCounts = Dict[str, Dict[str, int]]
+
+
+def merge_candidates(
+    current: List[Dict[str, Any]], delta: Dict[str, int], limit: int
+) -> List[Dict[str, Any]]:
+    """Soma `delta` aos candidatos atuais e mantém os `limit` mais fortes."""
+    counts = {c["id"]: c["n"] for c in current}
+    for other_id, n in delta.items():
+        counts[other_id] = counts.get(other_id, 0) + n
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    return [{"id": other_id, "n": n} for other_id, n in ranked[:limit]]
+
+
+class RecommendationsJob:
+    def __init__(
+        self,
+        interval_seconds: float = 3600.0,
+        chunk_orders: int = 1000,
+        top_k: int = 8,
+        max_candidates: int = 50,
+        lease_seconds: float = 600.0,
+        owner: Optional[str] = None,
+    ):
+        self.interval_seconds = interval_seconds
+        self.chunk_orders = chunk_orders
+        self.top_k = top_k
+        self.max_candidates = max_candidates
+        self.lease_seconds = lease_seconds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.stats: Dict[str, Any] = {
+            "runs": 0,
+            "last_run_at": None,
+            "last_duration_ms": None,
+            "orders_scanned": 0,
+            "products_updated": 0,
+            "skipped_runs": 0,
+            "last_error": None,
+        }
+
+    @classmethod
+    def from_env(cls) -> "RecommendationsJob":
+        return cls(
+            interval_seconds=float(
+                os.environ.get("RECOMMENDATIONS_INTERVAL_SECONDS", 3600)
+            ),
+            chunk_orders=int(os.environ.get("RECOMMENDATIONS_CHUNK_ORDERS", 1000)),
+            top_k=int(os.environ.get("RECOMMENDATIONS_TOP_K", 8)),
+            max_candidates=int(os.environ.get("RECOMMENDATIONS_MAX_CANDIDATES", 50)),
+            lease_seconds=float(os.environ.get("RECOMMENDATIONS_LEASE_SECONDS", 600)),
+        )
+
+    # -----------------------------------------------------------------
+    # ciclo de vida
+    # -----------------------------------------------------------------
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="recommendations-job")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["last_error"] = str(e)
+                logger.error("Recommendations run failed: %s", e)
+            await asyncio.sleep(self.interval_seconds)
+
+    # -----------------------------------------------------------------
+    # lease
+    # -----------------------------------------------------------------
+    async def _acquire_lease(self) -> bool:
+        """Fica com o lease se estiver livre, expirado ou já for deste processo."""
+        now = datetime.utcnow()
+        try:
+            lease = await meta_collection.find_one_and_update(
+                {
+                    "_id": LEASE_ID,
+                    "$or": [{"expires_at": {"$lt": now}}, {"owner": self.owner}],
+                },
+                {
+                    "$set": {
+                        "owner": self.owner,
+                        "expires_at": now + timedelta(seconds=self.lease_seconds),
+                    }
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # o lease existe e é de outro processo: o upsert colide no _id
+            return False
+        return lease is not None
+
+    async def _release_lease(self) -> None:
+        await meta_collection.update_one(
+            {"_id": LEASE_ID, "owner": self.owner},
+            {"$set": {"expires_at": datetime.utcnow()}},
+        )
+
+    # -----------------------------------------------------------------
+    # execução
+    # -----------------------------------------------------------------
+    async def run_once(self, full: bool = False) -> Dict[str, int]:
+        """
+        Processa os pedidos novos (ou todos, com `full=True`). Sem o lease
+        não faz nada: outro processo está a correr o job.
+        """
+        async with self._lock:
+            if not await self._acquire_lease():
+                self.stats["skipped_runs"] += 1
+                return {"orders_scanned": 0, "products_updated": 0}
+            started = time.perf_counter()
+            try:
+                if full:
+                    await product_recommendations_collection.delete_many({})
+                    await meta_collection.delete_one({"_id": MARKER_ID})
+                    await meta_collection.replace_one(
+                        {"_id": ARCHIVE_MARKER_ID}, {"done": False}, upsert=True
+                    )
+                totals = await self._scan_archive()
+                hot = await self._scan(orders_collection, MARKER_ID)
+                for key, value in hot.items():
+                    totals[key] += value
+            finally:
+                await self._release_lease()
+
+            duration_ms = (time.perf_counter() - started) * 1000
+            self.stats["runs"] += 1
+            self.stats["last_run_at"] = datetime.utcnow().isoformat()
+            self.stats["last_duration_ms"] = round(duration_ms, 2)
+            self.stats["last_error"] = None
+            for key, value in totals.items():
+                self.stats[key] += value
+            if totals["orders_scanned"]:
+                related_cache.clear()
+                logger.info(
+                    "Recommendations: %d orders, %d products in %.1fms",
+                    totals["orders_scanned"],
+                    totals["products_updated"],
+                    duration_ms,
+                )
+            return totals
+
+    async def _scan_archive(self) -> Dict[str, int]:
+        """Passagem pelo arquivo de uma reconstrução ainda por acabar."""
+        marker = await meta_collection.find_one({"_id": ARCHIVE_MARKER_ID})
+        if not marker or marker.get("done", True):
+            return {"orders_scanned": 0, "products_updated": 0}
+        totals = await self._scan(orders_archive_collection, ARCHIVE_MARKER_ID)
+        await meta_collection.update_one(
+            {"_id": ARCHIVE_MARKER_ID}, {"$set": {"done": True}}
+        )
+        return totals
+
+    async def _scan(self, collection, marker_id: str) -> Dict[str, int]:
+        totals = {"orders_scanned": 0, "products_updated": 0}
+        marker = await meta_collection.find_one({"_id": marker_id}) or {}
+        query: Dict[str, Any] = {
+            "status": {"$nin": IGNORED_STATUSES},
+            "created_at": {"$lt": datetime.utcnow() - SETTLE_DELAY},
+        }
+        if marker.get("created_at"):
+            last_at, last_number = marker["created_at"], marker["order_number"]
+            query["$or"] = [
+                {"created_at": {"$gt": last_at}},
+                {"created_at": last_at, "order_number": {"$gt": last_number}},
+            ]
+
+        cursor = collection.find(
+            query,
+            {"_id": 0, "order_number": 1, "created_at": 1, "items.product_id": 1},
+        ).sort([("created_at", 1), ("order_number", 1)])
+
+        pairs: PairCounts = defaultdict(lambda: defaultdict(int))
+        in_chunk = 0
+        last: Optional[Tuple[datetime, str]] = None
+        async for order in cursor:
+            product_ids = sorted(
+                {item["product_id"] for item in order.get("items", [])}
+            )[:MAX_ITEMS_PER_ORDER]
+            for i, a in enumerate(product_ids):
+                for b in product_ids[i + 1:]:
+                    pairs[a][b] += 1
+                    pairs[b][a] += 1
+            last = (order["created_at"], order["order_number"])
+            in_chunk += 1
+            if in_chunk >= self.chunk_orders:
+                totals["products_updated"] += await self._flush(
+                    pairs, last, marker_id
+                )
+                totals["orders_scanned"] += in_chunk
+                pairs, in_chunk = defaultdict(lambda: defaultdict(int)), 0
+
+        if in_chunk and last is not None:
+            totals["products_updated"] += await self._flush(pairs, last, marker_id)
+            totals["orders_scanned"] += in_chunk
+        return totals
+
+    async def _flush(
+        self, pairs: PairCounts, last: Tuple[datetime, str], marker_id: str
+    ) -> int:
+        """Junta os pares do lote aos documentos existentes e avança o marcador."""
+        # renova o lease; se expirou e outro processo ficou com ele, pára
+        # antes de somar pares que esse processo também vai contar
+        if not await self._acquire_lease():
+            raise RuntimeError("Recommendations lease lost")
+        now = datetime.utcnow()
+        if pairs:
+            existing = {
+                doc["product_id"]: doc.get("candidates", [])
+                async for doc in product_recommendations_collection.find(
+                    {"product_id": {"$in": list(pairs)}},
+                    {"_id": 0, "product_id": 1, "candidates": 1},
+                )
+            }
+            operations = []
+            for product_id, delta in pairs.items():
+                candidates = merge_candidates(
+                    existing.get(product_id, []), delta, self.max_candidates
+                )
+                operations.append(
+                    UpdateOne(
+                        {"product_id": product_id},
+                        {
+                            "$set": {
+                                "candidates": candidates,
+                                "related": [c["id"] for c in candidates[: self.top_k]],
+                                "updated_at": now,
+                            }
+                        },
+                        upsert=True,
+                    )
+                )
+            await product_recommendations_collection.bulk_write(
+                operations, ordered=False
+            )
+
+        await meta_collection.update_one(
+            {"_id": marker_id},
+            {
+                "$set": {
+                    "created_at": last[0],
+                    "order_number": last[1],
+                    "updated_at": now,
+                }
+            },
+            upsert=True,
+        )
+        return len(pairs)
+
+
+# =====================================================================
+# LEITURA
+# =====================================================================
+related_cache: TTLCache[str, List[Dict[str, Any]]] = TTLCache(
+    float(os.environ.get("RECOMMENDATIONS_CACHE_TTL", 600))
+)
+on_catalog_change(related_cache.clear)
+
+
+async def related_products(product_id: str) -> List[Dict[str, Any]]:
+    """Cartões dos produtos relacionados, pela ordem de força do par."""
+    cached = related_cache.get(product_id)
+    if cached is not None:
+        return cached
+
+    doc = await product_recommendations_collection.find_one(
+        {"product_id": product_id}, {"_id": 0, "related": 1}
+    )
+    related_ids = doc.get("related", []) if doc else []
+    products: List[Dict[str, Any]] = []
+    if related_ids:
+        by_id = {
+            p["id"]: p
+            for p in await repos.products.get_many(related_ids, CARD_PROJECTION)
+        }
+        # produtos apagados ou esgotados ficam de fora
+        products = [
+            by_id[i] for i in related_ids if i in by_id and by_id[i].get("stock", 0) > 0
+        ]
+    related_cache.put(product_id, products)
+    return products
+
+
+recommendations_job = RecommendationsJob.from_env()
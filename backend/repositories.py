@@ -0,0 +1,784 @@
+"""
+Camada de repositórios por agregado (produtos, pedidos, carrinhos,
+utilizadores, pagamentos).
+
+Cada repositório fala com um "store" que implementa o subconjunto de
+operações de coleção que a API usa:
+
+- MotorStore:    delega numa coleção Motor (produção)
+- InMemoryStore: documentos num dict em memória, com os filtros
+                 ($in, $gt/$gte/$lt/$lte, $ne, $exists, $regex, $not, $or,
+                 $and, $text), ordenações, projeções e updates ($set,
+                 $setOnInsert, $unset, $inc, $push com $each/$slice) usados
+                 nas rotas; serve para testes e para medir o custo de Python
+                 (validação, serialização) sem I/O
+
+O backend escolhe-se com REPOSITORY_BACKEND=motor|memory, ou em código com
+`repos.configure("memory")`.
+
+As rotas de produtos, pedidos, pagamentos, carrinhos e utilizadores passam
+todas por aqui. Ficam só no Motor, e portanto fora do backend "memory":
+moradas, favoritos, notificações, logs, as agregações do dashboard, os
+workers (reconciliação, arquivo, recomendações) e o ramo com transação do
+payment_service, que precisa de uma sessão do driver.
+"""
+from copy import deepcopy
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+from datetime import datetime
+import os
+import re
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from models import Cart
+
+Filter = Dict[str, Any]
+Sort = Union[str, Sequence[Tuple[str, int]], None]
+
+_MISSING = object()
+
+
+# =====================================================================
+# MOTOR
+# =====================================================================
+class MotorStore:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def find_one(self, filters: Filter, projection: Optional[Dict] = None):
+        return await self.collection.find_one(filters, projection)
+
+    async def find(
+        self,
+        filters: Filter,
+        projection: Optional[Dict] = None,
+        sort: Sort = None,
+        skip: int = 0,
+        limit: int = 0,
+    ) -> List[Dict[str, Any]]:
+        cursor = self.collection.find(filters, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        if skip:
+            cursor = cursor.skip(skip)
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(limit or None)
+
+    def iterate(
+        self,
+        filters: Filter,
+        projection: Optional[Dict] = None,
+        sort: Sort = None,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Cursor para percorrer resultados grandes sem os ter todos em memória."""
+        cursor = self.collection.find(filters, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        return cursor.batch_size(batch_size)
+
+    async def count(self, filters: Filter) -> int:
+        return await self.collection.count_documents(filters)
+
+    async def insert_one(self, doc: Dict[str, Any]) -> None:
+        await self.collection.insert_one(doc)
+
+    async def insert_many(self, docs: List[Dict[str, Any]]) -> None:
+        await self.collection.insert_many(docs, ordered=False)
+
+    async def update_one(self, filters: Filter, update: Dict, upsert=False) -> int:
+        result = await self.collection.update_one(filters, update, upsert=upsert)
+        return result.matched_count
+
+    async def update_many(self, filters: Filter, update: Dict) -> int:
+        result = await self.collection.update_many(filters, update)
+        return result.modified_count
+
+    async def find_one_and_update(
+        self,
+        filters: Filter,
+        update: Dict,
+        projection: Optional[Dict] = None,
+        after: bool = True,
+        upsert: bool = False,
+    ):
+        return await self.collection.find_one_and_update(
+            filters,
+            update,
+            projection=projection,
+            upsert=upsert,
+            return_document=ReturnDocument.AFTER if after else ReturnDocument.BEFORE,
+        )
+
+    async def delete_one(self, filters: Filter) -> int:
+        result = await self.collection.delete_one(filters)
+        return result.deleted_count
+
+
+# =====================================================================
+# MEMÓRIA
+# =====================================================================
+def _values(doc: Any, path: str) -> List[Any]:
+    """Valores em `path` (com pontos), expandindo arrays como o Mongo."""
+    current = [doc]
+    for part in path.split("."):
+        found = []
+        for value in current:
+            if isinstance(value, dict) and part in value:
+                found.append(value[part])
+            elif isinstance(value, list):
+                found += [v[part] for v in value if isinstance(v, dict) and part in v]
+        current = found
+    expanded = []
+    for value in current:
+        expanded.append(value)
+        if isinstance(value, list):
+            expanded += value
+    return expanded
+
+
+def _compare(values: List[Any], op: str, arg: Any) -> bool:
+    candidates = [v for v in values if v is not None and not isinstance(v, list)]
+    try:
+        if op == "$gt":
+            return any(v > arg for v in candidates)
+        if op == "$gte":
+            return any(v >= arg for v in candidates)
+        if op == "$lt":
+            return any(v < arg for v in candidates)
+        return any(v <= arg for v in candidates)
+    except TypeError:
+        return False
+
+
+def _match_condition(values: List[Any], cond: Any) -> bool:
+    if isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+        for op, arg in cond.items():
+            if op == "$in":
+                ok = any(v in arg for v in values) or (None in arg and not values)
+            elif op == "$nin":
+                ok = not any(v in arg for v in values)
+            elif op == "$ne":
+                ok = not _match_condition(values, arg)
+            elif op == "$eq":
+                ok = _match_condition(values, arg)
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                ok = _compare(values, op, arg)
+            elif op == "$exists":
+                ok = bool(values) == bool(arg)
+            elif op == "$regex":
+                flags = re.IGNORECASE if "i" in cond.get("$options", "") else 0
+                ok = any(
+                    isinstance(v, str) and re.search(arg, v, flags) for v in values
+                )
+            elif op == "$options":
+                continue
+            elif op == "$not":
+                ok = not _match_condition(values, arg)
+            else:
+                raise NotImplementedError(f"InMemoryStore: operator {op}")
+            if not ok:
+                return False
+        return True
+
+    if cond is None:
+        return not values or None in values
+    return cond in values
+
+
+def matches(doc: Dict[str, Any], filters: Filter) -> bool:
+    for key, cond in filters.items():
+        if key == "$or":
+            if not any(matches(doc, sub) for sub in cond):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, sub) for sub in cond):
+                return False
+        elif key == "$text":
+            terms = cond["$search"].lower().split()
+            text = f"{doc.get('name', '')} {doc.get('description', '')}".lower()
+            if not any(term in text for term in terms):
+                return False
+        elif not _match_condition(_values(doc, key), cond):
+            return False
+    return True
+
+
+def _set_path(doc: Dict[str, Any], path: str, value: Any) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def _unset_path(doc: Dict[str, Any], path: str) -> None:
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.get(part, {})
+    doc.pop(last, None)
+
+
+def _get_path(doc: Dict[str, Any], path: str, default: Any = None) -> Any:
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return default
+        doc = doc[part]
+    return doc
+
+
+def apply_update(doc: Dict[str, Any], update: Dict[str, Any], inserting=False) -> None:
+    if isinstance(update, list):
+        raise NotImplementedError("InMemoryStore: pipeline updates")
+    for op, fields in update.items():
+        if op == "$set" or (op == "$setOnInsert" and inserting):
+            for path, value in fields.items():
+                _set_path(doc, path, deepcopy(value))
+        elif op == "$setOnInsert":
+            continue
+        elif op == "$unset":
+            for path in fields:
+                _unset_path(doc, path)
+        elif op == "$inc":
+            for path, amount in fields.items():
+                _set_path(doc, path, _get_path(doc, path, 0) + amount)
+        elif op == "$push":
+            for path, value in fields.items():
+                items = list(_get_path(doc, path, None) or [])
+                if isinstance(value, dict) and "$each" in value:
+                    items += deepcopy(value["$each"])
+                    if "$slice" in value:
+                        limit = value["$slice"]
+                        items = items[limit:] if limit < 0 else items[:limit]
+                else:
+                    items.append(deepcopy(value))
+                _set_path(doc, path, items)
+        else:
+            raise NotImplementedError(f"InMemoryStore: update operator {op}")
+
+
+def _project(doc: Dict[str, Any], projection: Optional[Dict]) -> Dict[str, Any]:
+    doc = deepcopy(doc)
+    if not projection:
+        return doc
+    fields = {k.split(".")[0]: v for k, v in projection.items() if k != "_id"}
+    if any(fields.values()):
+        return {k: v for k, v in doc.items() if fields.get(k)}
+    return {k: v for k, v in doc.items() if k not in fields}
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    # nulos/ausentes primeiro, como no Mongo
+    return (0, 0) if value is None else (1, value)
+
+
+class InMemoryStore:
+    """
+    `key` é o campo usado como chave primária; `unique` lista campos com
+    índice único. Lookups por igualdade nesses campos não percorrem a coleção.
+    """
+
+    def __init__(self, key: str = "id", unique: Iterable[str] = ()):
+        self.key = key
+        self.unique = tuple(field for field in unique if field != key)
+        self.docs: Dict[Any, Dict[str, Any]] = {}
+        self._indexes: Dict[str, Dict[Any, Any]] = {f: {} for f in self.unique}
+
+    def _candidates(self, filters: Filter) -> Iterable[Dict[str, Any]]:
+        for field in (self.key, *self.unique):
+            value = filters.get(field)
+            if value is not None and not isinstance(value, dict):
+                if field != self.key:
+                    value = self._indexes[field].get(value)
+                doc = self.docs.get(value)
+                return [doc] if doc is not None else []
+        return list(self.docs.values())
+
+    def _matching(self, filters: Filter) -> List[Dict[str, Any]]:
+        return [doc for doc in self._candidates(filters) if matches(doc, filters)]
+
+    def _store(self, doc: Dict[str, Any], replaces: Optional[Dict] = None) -> None:
+        if self.key not in doc:
+            raise ValueError(f"InMemoryStore: document without '{self.key}'")
+        old_key = replaces[self.key] if replaces is not None else _MISSING
+        if doc[self.key] != old_key and doc[self.key] in self.docs:
+            raise DuplicateKeyError(f"E11000 duplicate key: {self.key}")
+        for field in self.unique:
+            owner = self._indexes[field].get(doc.get(field), _MISSING)
+            if doc.get(field) is not None and owner not in (_MISSING, old_key):
+                raise DuplicateKeyError(f"E11000 duplicate key: {field}")
+
+        if replaces is not None:
+            self._remove(replaces)
+        self.docs[doc[self.key]] = doc
+        for field in self.unique:
+            if doc.get(field) is not None:
+                self._indexes[field][doc[field]] = doc[self.key]
+
+    def _remove(self, doc: Dict[str, Any]) -> None:
+        del self.docs[doc[self.key]]
+        for field in self.unique:
+            self._indexes[field].pop(doc.get(field), None)
+
+    async def find_one(self, filters: Filter, projection: Optional[Dict] = None):
+        for doc in self._candidates(filters):
+            if matches(doc, filters):
+                return _project(doc, projection)
+        return None
+
+    async def find(
+        self,
+        filters: Filter,
+        projection: Optional[Dict] = None,
+        sort: Sort = None,
+        skip: int = 0,
+        limit: int = 0,
+    ) -> List[Dict[str, Any]]:
+        docs = self._matching(filters)
+        if sort:
+            keys = [(sort, 1)] if isinstance(sort, str) else list(sort)
+            for field, direction in reversed(keys):
+                docs.sort(
+                    key=lambda d: _sort_key(_get_path(d, field)),
+                    reverse=direction < 0,
+                )
+        docs = docs[skip:]
+        if limit:
+            docs = docs[:limit]
+        return [_project(doc, projection) for doc in docs]
+
+    async def iterate(
+        self,
+        filters: Filter,
+        projection: Optional[Dict] = None,
+        sort: Sort = None,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        for doc in await self.find(filters, projection, sort=sort):
+            yield doc
+
+    async def count(self, filters: Filter) -> int:
+        return len(self._matching(filters))
+
+    async def insert_one(self, doc: Dict[str, Any]) -> None:
+        self._store(deepcopy(doc))
+
+    async def insert_many(self, docs: List[Dict[str, Any]]) -> None:
+        for doc in docs:
+            self._store(deepcopy(doc))
+
+    async def _update(self, doc: Dict[str, Any], update: Dict) -> Dict[str, Any]:
+        updated = deepcopy(doc)
+        apply_update(updated, update)
+        self._store(updated, replaces=doc)
+        return updated
+
+    async def _upsert(self, filters: Filter, update: Dict) -> Dict[str, Any]:
+        doc = {
+            k: v
+            for k, v in filters.items()
+            if not k.startswith("$") and not isinstance(v, dict)
+        }
+        apply_update(doc, update, inserting=True)
+        self._store(doc)
+        return doc
+
+    async def update_one(self, filters: Filter, update: Dict, upsert=False) -> int:
+        for doc in self._candidates(filters):
+            if matches(doc, filters):
+                await self._update(doc, update)
+                return 1
+        if upsert:
+            await self._upsert(filters, update)
+        return 0
+
+    async def update_many(self, filters: Filter, update: Dict) -> int:
+        matched = self._matching(filters)
+        for doc in matched:
+            await self._update(doc, update)
+        return len(matched)
+
+    async def find_one_and_update(
+        self,
+        filters: Filter,
+        update: Dict,
+        projection: Optional[Dict] = None,
+        after: bool = True,
+        upsert: bool = False,
+    ):
+        for doc in self._candidates(filters):
+            if matches(doc, filters):
+                updated = await self._update(doc, update)
+                return _project(updated if after else doc, projection)
+        if upsert:
+            created = await self._upsert(filters, update)
+            return _project(created, projection) if after else None
+        return None
+
+    async def delete_one(self, filters: Filter) -> int:
+        for doc in self._candidates(filters):
+            if matches(doc, filters):
+                self._remove(doc)
+                return 1
+        return 0
+
+
+# =====================================================================
+# REPOSITÓRIOS POR AGREGADO
+# =====================================================================
+class ProductRepository:
+    def __init__(self, store):
+        self.store = store
+
+    async def get(self, product_id: str) -> Optional[Dict[str, Any]]:
+        return await self.store.find_one({"id": product_id})
+
+    async def page(
+        self, filters: Filter, page: int, limit: int
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Página (mais recentes primeiro) e total para as listagens do admin."""
+        total = await self.store.count(filters)
+        docs = await self.store.find(
+            filters, sort=[("created_at", -1)], skip=(page - 1) * limit, limit=limit
+        )
+        return docs, total
+
+    async def insert(self, product_doc: Dict[str, Any]) -> None:
+        await self.store.insert_one(product_doc)
+
+    async def update_fields(
+        self, product_id: str, fields: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        return await self.store.find_one_and_update(
+            {"id": product_id}, {"$set": fields}
+        )
+
+    async def delete(self, product_id: str) -> bool:
+        return await self.store.delete_one({"id": product_id}) > 0
+
+    async def get_many(
+        self, product_ids: List[str], projection: Optional[Dict] = None
+    ) -> List[Dict[str, Any]]:
+        return await self.store.find({"id": {"$in": product_ids}}, projection)
+
+    async def search(
+        self,
+        category: Optional[str] = None,
+        featured: Optional[bool] = None,
+        is_new: Optional[bool] = None,
+        is_promo: Optional[bool] = None,
+        text: Optional[str] = None,
+        limit: int = 1000,
+    ) -> List[Dict[str, Any]]:
+        query: Filter = {}
+        if category:
+            query["category"] = category
+        if featured is not None:
+            query["featured"] = featured
+        if is_new is not None:
+            query["is_new"] = is_new
+        if is_promo is not None:
+            query["is_promo"] = is_promo
+        if text:
+            query["$text"] = {"$search": text}
+        return await self.store.find(query, limit=limit)
+
+    async def flagged(
+        self,
+        flag: str,
+        projection: Optional[Dict] = None,
+        limit: int = 0,
+        sort: Sort = None,
+    ) -> List[Dict[str, Any]]:
+        """Produtos com `featured`/`is_new`/`is_promo` a True (índices próprios)."""
+        return await self.store.find({flag: True}, projection, sort=sort, limit=limit)
+
+
+class OrderRepository:
+    """Pedidos; as leituras caem para o arquivo (`archive`) quando existe."""
+
+    def __init__(self, store, archive=None):
+        self.store = store
+        self.archive = archive
+
+    async def get(self, order_number: str) -> Optional[Dict[str, Any]]:
+        return await self._find_one({"order_number": order_number})
+
+    async def page(
+        self, filters: Filter, page: int, limit: int
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Página da coleção quente (mais recentes primeiro) e total."""
+        total = await self.store.count(filters)
+        docs = await self.store.find(
+            filters, sort=[("created_at", -1)], skip=(page - 1) * limit, limit=limit
+        )
+        return docs, total
+
+    def iterate_with_archive(
+        self, filters: Filter, projection: Optional[Dict] = None, batch_size=1000
+    ) -> List[AsyncIterator[Dict[str, Any]]]:
+        """Cursores (quente e arquivo) ordenados por created_at desc."""
+        stores = [self.store] + ([self.archive] if self.archive is not None else [])
+        return [
+            store.iterate(
+                filters, projection, sort=[("created_at", -1)], batch_size=batch_size
+            )
+            for store in stores
+        ]
+
+    async def get_many(
+        self, order_numbers: List[str], projection: Optional[Dict] = None
+    ) -> List[Dict[str, Any]]:
+        return await self.store.find(
+            {"order_number": {"$in": order_numbers}}, projection
+        )
+
+    async def update_many(
+        self, order_numbers: List[str], update: Dict[str, Any], guard: Filter
+    ) -> int:
+        return await self.store.update_many(
+            {"order_number": {"$in": order_numbers}, **guard}, update
+        )
+
+    async def _find_one(self, filters: Filter) -> Optional[Dict[str, Any]]:
+        doc = await self.store.find_one(filters)
+        if doc is None and self.archive is not None:
+            doc = await self.archive.find_one(filters)
+        return doc
+
+    async def insert(self, order_doc: Dict[str, Any]) -> None:
+        """
+        Grava um pedido novo; um número repetido dá DuplicateKeyError no
+        índice único de `order_number` (o checkout sorteia outro). Não há
+        leitura ao arquivo: o espaço de números do checkout é largo o
+        suficiente para não repetir números arquivados.
+        """
+        await self.store.insert_one(order_doc)
+
+    @staticmethod
+    def _owner_filter(keys: List[str], legacy: bool) -> Filter:
+        """
+        `owner_keys` em `$in`; com `legacy`, também os campos antigos, para
+        pedidos a que o backfill ainda não chegou (ver order_owners.py).
+        """
+        query: Filter = {"owner_keys": {"$in": keys}}
+        if not legacy:
+            return query
+        branches = [query]
+        for key in keys:
+            kind, _, value = key.partition(":")
+            if kind == "user":
+                branches.append({"user_id": value})
+            elif kind == "email":
+                branches.append({"customer.email": value})
+        return {"$or": branches}
+
+    async def list_for_owner(
+        self,
+        keys: List[str],
+        limit: int,
+        before: Optional[Tuple[datetime, str]] = None,
+        projection: Optional[Dict] = None,
+        legacy: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Pedidos com alguma das `owner_keys`, do mais recente para o mais antigo.
+
+        `before` é o (created_at, order_number) do último pedido da página
+        anterior.
+        """
+        owner = self._owner_filter(keys, legacy)
+        query: Filter = dict(owner)
+        if before is not None:
+            created_at, order_number = before
+            page = {
+                "$or": [
+                    {"created_at": {"$lt": created_at}},
+                    {"created_at": created_at, "order_number": {"$lt": order_number}},
+                ]
+            }
+            query = {"$and": [owner, page]} if "$or" in owner else {**owner, **page}
+        sort = [("created_at", -1), ("order_number", -1)]
+        docs = await self.store.find(query, projection, sort=sort, limit=limit)
+        if self.archive is None:
+            return docs
+        # a mesma página nas duas coleções, junta e corta (pedidos repetidos
+        # a meio de um lote de arquivo contam uma vez). O arquivo grava sempre
+        # owner_keys (archiving.py), por isso não precisa dos campos antigos.
+        if legacy:
+            query = {"owner_keys": {"$in": keys}}
+            if before is not None:
+                query.update(page)
+        docs += await self.archive.find(query, projection, sort=sort, limit=limit)
+        merged = {doc["order_number"]: doc for doc in reversed(docs)}
+        return sorted(
+            merged.values(),
+            key=lambda doc: (doc["created_at"], doc["order_number"]),
+            reverse=True,
+        )[:limit]
+
+    async def get_for_owner(
+        self, order_number: str, keys: List[str], legacy: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        return await self._find_one(
+            {"order_number": order_number, **self._owner_filter(keys, legacy)}
+        )
+
+    async def update_fields(
+        self,
+        order_number: str,
+        update: Dict[str, Any],
+        projection: Optional[Dict] = None,
+        guard: Optional[Filter] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Aplica `update` e devolve o pedido atualizado, ou None se não existir
+        ou não cumprir `guard` (ex.: `transition_guard`).
+        """
+        return await self.store.find_one_and_update(
+            {"order_number": order_number, **(guard or {})},
+            update,
+            projection=projection,
+        )
+
+
+class CartRepository:
+    def __init__(self, store):
+        self.store = store
+
+    async def get_or_create(self, user_id: str) -> Cart:
+        cart_doc = await self.store.find_one({"user_id": user_id}, {"_id": 0})
+        if cart_doc:
+            return Cart(**cart_doc)
+        cart = Cart(user_id=user_id, items=[])
+        await self.store.insert_one(cart.dict())
+        return cart
+
+    async def save(self, cart: Cart) -> None:
+        cart.updated_at = datetime.utcnow()
+        await self.store.update_one({"id": cart.id}, {"$set": cart.dict()}, upsert=True)
+
+
+class UserRepository:
+    def __init__(self, store):
+        self.store = store
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return await self.store.find_one({"id": user_id})
+
+    async def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        return await self.store.find_one({"email": email.lower()})
+
+    async def insert(self, user_doc: Dict[str, Any]) -> None:
+        await self.store.insert_one(user_doc)
+
+    async def update_fields(
+        self, user_id: str, fields: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        return await self.store.find_one_and_update({"id": user_id}, {"$set": fields})
+
+
+class PaymentRepository:
+    def __init__(self, store):
+        self.store = store
+
+    async def get(self, transaction_id: str) -> Optional[Dict[str, Any]]:
+        return await self.store.find_one({"transaction_id": transaction_id})
+
+    async def insert(self, payment_doc: Dict[str, Any]) -> None:
+        await self.store.insert_one(payment_doc)
+
+    async def delete(self, transaction_id: str) -> None:
+        await self.store.delete_one({"transaction_id": transaction_id})
+
+    async def set_status(
+        self,
+        transaction_id: str,
+        status: str,
+        now: datetime,
+        expected: Union[str, List[str], None] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Muda o estado e devolve o documento ANTES da mudança (None se não
+        existir ou se o estado atual não for `expected`).
+        """
+        filters: Filter = {"transaction_id": transaction_id}
+        if isinstance(expected, list):
+            filters["status"] = {"$in": expected}
+        elif expected is not None:
+            filters["status"] = expected
+        return await self.store.find_one_and_update(
+            filters, {"$set": {"status": status, "updated_at": now}}, after=False
+        )
+
+
+# =====================================================================
+# REGISTO
+# =====================================================================
+class Repositories:
+    """Conjunto de repositórios da API; `configure` troca o backend no lugar."""
+
+    BACKENDS = ("motor", "memory")
+
+    def __init__(self, backend: str = "motor"):
+        self.configure(backend)
+
+    @classmethod
+    def from_env(cls) -> "Repositories":
+        return cls(os.environ.get("REPOSITORY_BACKEND", "motor"))
+
+    @property
+    def in_memory(self) -> bool:
+        return self.backend == "memory"
+
+    def configure(self, backend: str) -> None:
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown repository backend: {backend}")
+        self.backend = backend
+
+        if backend == "memory":
+            stores = {
+                "products": InMemoryStore("id"),
+                "orders": InMemoryStore("order_number", unique=("id",)),
+                "orders_archive": InMemoryStore("order_number"),
+                "carts": InMemoryStore("id", unique=("user_id",)),
+                "users": InMemoryStore("id", unique=("email",)),
+                "payments": InMemoryStore("transaction_id"),
+            }
+        else:
+            from database import (
+                carts_collection,
+                orders_archive_collection,
+                orders_collection,
+                payments_collection,
+                products_collection,
+                users_collection,
+            )
+
+            stores = {
+                "products": MotorStore(products_collection),
+                "orders": MotorStore(orders_collection),
+                "orders_archive": MotorStore(orders_archive_collection),
+                "carts": MotorStore(carts_collection),
+                "users": MotorStore(users_collection),
+                "payments": MotorStore(payments_collection),
+            }
+
+        self.products = ProductRepository(stores["products"])
+        self.orders = OrderRepository(stores["orders"], stores["orders_archive"])
+        self.carts = CartRepository(stores["carts"])
+        self.users = UserRepository(stores["users"])
+        self.payments = PaymentRepository(stores["payments"])
+
+
+repos = Repositories.from_env()
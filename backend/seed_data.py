@@ -1,5 +1,9 @@
 # Seed data for LR Store
 
+# Incrementar sempre que categories_data/products_data mudarem: o startup só
+# volta a semear quando o marcador na DB (meta.seed) for mais antigo.
+SEED_VERSION = 1
+
 categories_data = [
     {
         'id': '1',
@@ -11,6 +11,12 @@ from fastapi import (
 )
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from fastapi.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 from typing import Optional, List, Dict, Any
@@ -21,11 +27,20 @@ import logging
 import random
 import uuid
 import math
+import asyncio
+import time
+import csv
+import io
+import json
+import base64
+
+from pymongo import UpdateOne
 
 from models import (
     # categorias / produtos
     Category,
     CategoryResponse,
+    CategoryWithStatsResponse,
     Product,
     ProductResponse,
     SingleProductResponse,
@@ -33,6 +48,8 @@ from models import (
     Order,
     OrderCreate,
     OrderResponse,
+    OrderSummary,
+    OrderSummaryPage,
     PaymentReferenceRequest,
     PaymentReferenceResponse,
     PaymentExpressRequest,
@@ -54,8 +71,13 @@ from models import (
     CartItem,
     Favorite,
     Notification,
+    NotificationsResponse,
+    NotificationsMarkRead,
+    UnreadCountResponse,
     ActivityLog,
+    ActivityLogsResponse,
     AdminOrderUpdate,
+    AdminOrderBulkStatus,
     AdminUserUpdate,
     SupportMessageCreate,
     SupportMessage,
@@ -66,17 +88,63 @@ from database import (
     categories_collection,
     products_collection,
     orders_collection,
+    orders_archive_collection,
     payments_collection,
     users_collection,
     addresses_collection,
-    carts_collection,
     favorites_collection,
     notifications_collection,
     activity_logs_collection,
     support_messages_collection,
+    meta_collection,
     init_indexes,
+    check_query_plans,
+    drop_legacy_owner_indexes,
+    index_state,
+    get_seed_version,
+    set_seed_version,
+    client_options,
+)
+from db_monitoring import db_metrics
+from metrics import (
+    MetricsMiddleware,
+    http_metrics,
+    monitor_event_loop_lag,
+    render_prometheus,
+)
+from tracing import TracingMiddleware
+from logging_config import setup_logging
+from payment_service import register_payment, set_payment_status
+from checkout import place_order
+from order_owners import OwnerKeysBackfill, owner_keys
+from repositories import repos
+from order_states import (
+    ORDER_STATUSES,
+    ORDER_STATUS_ALIASES,
+    can_transition,
+    can_transition_payment,
+    history_entry,
+    history_push,
+    normalize_legacy_statuses,
+    transition_guard,
+)
+from seed_data import categories_data, products_data, SEED_VERSION
+from workers import reconciliation_worker
+from activity import activity_logger
+from catalog_cache import invalidate_catalog, on_catalog_change
+from cache_sync import admin_principals, change_watcher
+from single_flight import SingleFlight
+from storefront import home_bundle
+from category_stats import category_stats
+from recommendations import recommendations_job, related_products
+from archiving import collection_sizes, merge_by_created_at, order_archiver
+from product_import import import_products
+from notifications import (
+    notification_fanout,
+    list_notifications,
+    mark_read,
+    unread_count,
 )
-from seed_data import categories_data, products_data
 
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 
@@ -127,6 +195,33 @@ def build_pagination(total: int, page: int, limit: int) -> Dict[str, Any]:
     }
 
 
+def build_order_filters(
+    status_filter: Optional[str],
+    payment_status: Optional[str],
+    date_from: Optional[str],
+    date_to: Optional[str],
+) -> Dict[str, Any]:
+    """Filtros comuns à listagem e à exportação de pedidos do admin."""
+    filters: Dict[str, Any] = {}
+    if status_filter:
+        filters["status"] = ORDER_STATUS_ALIASES.get(status_filter, status_filter)
+    if payment_status:
+        filters["payment_status"] = payment_status
+
+    date_filter: Dict[str, Any] = {}
+    start_date = parse_iso_date(date_from)
+    end_date = parse_iso_date(date_to)
+    if start_date:
+        date_filter["$gte"] = start_date
+    if end_date:
+        # Include the entire day by adding one day and subtracting a microsecond
+        end_range = end_date + timedelta(days=1)
+        date_filter["$lt"] = end_range
+    if date_filter:
+        filters["created_at"] = date_filter
+    return filters
+
+
 def parse_iso_date(value: Optional[str]) -> Optional[datetime]:
     if not value:
         return None
@@ -169,7 +264,12 @@ async def get_current_admin_user(
             detail="Admin access required.",
         )
 
-    user_doc = await users_collection.find_one({"id": x_user_id})
+    # cache curta; o change watcher esvazia-a quando `users` muda
+    user_doc = admin_principals.get(x_user_id)
+    if user_doc is None:
+        user_doc = await repos.users.get(x_user_id)
+        if user_doc:
+            admin_principals.put(x_user_id, user_doc)
     if not user_doc:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -184,35 +284,119 @@ async def get_current_admin_user(
 
     return UserOut(**user_doc)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
+# Configure logging (fila + JSON, ver logging_config.py)
+setup_logging()
 logger = logging.getLogger(__name__)
 
+# lookups quentes: pedidos concorrentes pela mesma chave partilham uma query
+product_lookups = SingleFlight("product")
+category_lookups = SingleFlight("category")
+order_lookups = SingleFlight("order")
+# produto/categoria criado ou alterado: esquece os 404 em cache
+on_catalog_change(product_lookups.clear)
+on_catalog_change(category_lookups.clear)
+
+# owner_keys em falta (pedidos antigos ou de pods antigos), ver order_owners.py
+owner_keys_backfills = [
+    OwnerKeysBackfill.from_env(
+        orders_collection, meta_collection, on_done=drop_legacy_owner_indexes
+    ),
+    OwnerKeysBackfill.from_env(
+        orders_archive_collection,
+        meta_collection,
+        marker_id="owner_keys_backfill:orders_archive",
+    ),
+]
+
 
 # =====================================================================
 # STARTUP
 # =====================================================================
+startup_state: Dict[str, Any] = {"startup_ms": None, "seeded": False}
+
+
+async def seed_catalog() -> bool:
+    """
+    Semeia categorias/produtos se o marcador de versão estiver desatualizado.
+    Num arranque normal custa um único find_one.
+    """
+    if await get_seed_version() >= SEED_VERSION:
+        return False
+
+    # bases de dados anteriores ao marcador: já têm catálogo, só marca
+    if await products_collection.find_one({}, {"_id": 1}):
+        await set_seed_version(SEED_VERSION)
+        return False
+
+    logger.info("Seeding catalog...")
+    await asyncio.gather(
+        categories_collection.bulk_write(
+            [
+                UpdateOne({"id": cat["id"]}, {"$setOnInsert": cat}, upsert=True)
+                for cat in categories_data
+            ],
+            ordered=False,
+        ),
+        products_collection.bulk_write(
+            [
+                UpdateOne({"id": prod["id"]}, {"$setOnInsert": prod}, upsert=True)
+                for prod in products_data
+            ],
+            ordered=False,
+        ),
+    )
+    await set_seed_version(SEED_VERSION)
+    logger.info(
+        "✓ Seeded %d categories and %d products",
+        len(categories_data),
+        len(products_data),
+    )
+    return True
+
+
 @app.on_event("startup")
 async def startup_event():
+    started = time.perf_counter()
     logger.info("Starting LR Store API...")
     UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
-    await init_indexes()
-
-    # Seed data if collections are empty
-    if await categories_collection.count_documents({}) == 0:
-        logger.info("Seeding categories...")
-        await categories_collection.insert_many(categories_data)
-        logger.info(f"✓ Inserted {len(categories_data)} categories")
 
-    if await products_collection.count_documents({}) == 0:
-        logger.info("Seeding products...")
-        await products_collection.insert_many(products_data)
-        logger.info(f"✓ Inserted {len(products_data)} products")
+    # índices em background: o readiness só passa quando os críticos existem
+    app.state.index_task = asyncio.create_task(init_indexes())
 
-    logger.info("✓ LR Store API ready!")
+    startup_state["seeded"] = await seed_catalog()
+    # migrações de dados em background: não atrasam o arranque
+    app.state.legacy_status_task = asyncio.create_task(
+        normalize_legacy_statuses(orders_collection)
+    )
+    for backfill in owner_keys_backfills:
+        backfill.start()
+
+    # expira referências Multicaixa vencidas e pedidos abandonados
+    reconciliation_worker.start()
+    activity_logger.start()
+    notification_fanout.start()
+    # invalidação dos caches locais entre workers (change streams ou polling)
+    change_watcher.start()
+    recommendations_job.start()
+    order_archiver.start()
+    app.state.loop_lag_task = asyncio.create_task(monitor_event_loop_lag())
+
+    startup_state["startup_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    logger.info("✓ LR Store API ready in %sms", startup_state["startup_ms"])
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.loop_lag_task.cancel()
+    await change_watcher.stop()
+    await recommendations_job.stop()
+    await order_archiver.stop()
+    for backfill in owner_keys_backfills:
+        await backfill.stop()
+    await reconciliation_worker.stop()
+    # grava os eventos de auditoria que ainda estão em memória
+    await activity_logger.stop()
+    await notification_fanout.stop()
 
 
 # =====================================================================
@@ -227,15 +411,36 @@ async def root():
     }
 
 
+@api_router.get("/health/live")
+async def health_live():
+    return {"status": "ok"}
+
+
+@api_router.get("/health/ready")
+async def health_ready():
+    """Só responde 200 depois de os índices críticos (unicidade) existirem."""
+    payload = {
+        "status": "ready" if index_state["ready"] else "starting",
+        "startup_ms": startup_state["startup_ms"],
+        "indexes": {
+            "ready": index_state["ready"],
+            "done": index_state["done"],
+            "duration_ms": index_state["duration_ms"],
+            "error": index_state["error"],
+        },
+    }
+    if not index_state["ready"]:
+        return JSONResponse(status_code=503, content=payload)
+    return payload
+
+
 # =====================================================================
 # AUTH / USERS
 # =====================================================================
 @api_router.post("/auth/register", response_model=UserOut)
 async def register_user(user_data: UserCreate):
     """Registar novo utilizador"""
-    existing = await users_collection.find_one(
-        {"email": user_data.email.lower()}
-    )
+    existing = await repos.users.get_by_email(user_data.email)
     if existing:
         raise HTTPException(status_code=400, detail="Email já registado.")
 
@@ -252,25 +457,27 @@ async def register_user(user_data: UserCreate):
         "updated_at": datetime.utcnow(),
     }
 
-    await users_collection.insert_one(user_doc)
+    await repos.users.insert(user_doc)
+    activity_logger.log("auth.register", user_id=user_doc["id"])
     return UserOut(**user_doc)
 
 
 @api_router.post("/auth/login", response_model=LoginResponse)
 async def login_user(credentials: UserLogin):
     """Login simples de utilizador"""
-    user_doc = await users_collection.find_one(
-        {"email": credentials.email.lower()}
-    )
+    user_doc = await repos.users.get_by_email(credentials.email)
     if not user_doc:
+        activity_logger.log("auth.login_failed", details=credentials.email.lower())
         raise HTTPException(status_code=401, detail="Credenciais inválidas.")
 
     if not verify_password(
         credentials.password, user_doc.get("hashed_password", "")
     ):
+        activity_logger.log("auth.login_failed", user_id=user_doc.get("id"))
         raise HTTPException(status_code=401, detail="Credenciais inválidas.")
 
     user = UserOut(**user_doc)
+    activity_logger.log("auth.login", user_id=user.id)
     token = "dummy-token"  # placeholder enquanto não há JWT
 
     return LoginResponse(
@@ -286,9 +493,7 @@ async def change_password(data: PasswordChange):
     Alterar a senha do utilizador.
     Usa o email para identificar o utilizador.
     """
-    user_doc = await users_collection.find_one(
-        {"email": data.email.lower()}
-    )
+    user_doc = await repos.users.get_by_email(data.email)
     if not user_doc:
         raise HTTPException(status_code=404, detail="Utilizador não encontrado.")
 
@@ -300,10 +505,11 @@ async def change_password(data: PasswordChange):
 
     new_hashed = get_password_hash(data.new_password)
 
-    await users_collection.update_one(
-        {"email": data.email.lower()},
-        {"$set": {"hashed_password": new_hashed, "updated_at": datetime.utcnow()}},
+    await repos.users.update_fields(
+        user_doc["id"],
+        {"hashed_password": new_hashed, "updated_at": datetime.utcnow()},
     )
+    activity_logger.log("auth.change_password", user_id=user_doc.get("id"))
 
     return {"detail": "Senha atualizada com sucesso."}
 
@@ -311,7 +517,7 @@ async def change_password(data: PasswordChange):
 @api_router.get("/users/{user_id}", response_model=UserOut)
 async def get_user_by_id(user_id: str):
     """Obter dados de um utilizador pelo ID."""
-    user_doc = await users_collection.find_one({"id": user_id})
+    user_doc = await repos.users.get(user_id)
     if not user_doc:
         raise HTTPException(status_code=404, detail="Utilizador não encontrado.")
     return UserOut(**user_doc)
@@ -322,62 +528,111 @@ async def update_user(user_id: str, data: UserUpdate):
     """
     Atualizar dados básicos do utilizador (nome, telefone).
     """
-    user_doc = await users_collection.find_one({"id": user_id})
-    if not user_doc:
-        raise HTTPException(status_code=404, detail="Utilizador não encontrado.")
-
     update_data = {k: v for k, v in data.dict().items() if v is not None}
     if not update_data:
-        return UserOut(**user_doc)
-
-    update_data["updated_at"] = datetime.utcnow()
-
-    await users_collection.update_one(
-        {"id": user_id},
-        {"$set": update_data},
-    )
+        user_doc = await repos.users.get(user_id)
+    else:
+        update_data["updated_at"] = datetime.utcnow()
+        user_doc = await repos.users.update_fields(user_id, update_data)
 
-    user_doc.update(update_data)
+    if not user_doc:
+        raise HTTPException(status_code=404, detail="Utilizador não encontrado.")
     return UserOut(**user_doc)
 
 
 # =====================================================================
-# ORDERS (MEUS PEDIDOS - STUB)
+# ORDERS (MEUS PEDIDOS)
 # =====================================================================
-@api_router.get("/orders/my")
+# só o que a lista precisa; o resto vem de /orders/my/{order_number}
+ORDER_SUMMARY_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "order_number": 1,
+    "created_at": 1,
+    "total": 1,
+    "status": 1,
+    "payment_status": 1,
+    "items.quantity": 1,
+    "items.image": 1,
+}
+
+
+def _shopper_keys(user_id: Optional[str], email: Optional[str]) -> List[str]:
+    if not user_id and not email:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="user_id or email is required to fetch orders.",
+        )
+    return owner_keys(user_id, email)
+
+
+def _owner_keys_pending() -> bool:
+    """Até o backfill acabar, procura também por user_id/customer.email."""
+    return not repos.in_memory and not owner_keys_backfills[0].done
+
+
+def encode_order_cursor(doc: Dict[str, Any]) -> str:
+    raw = json.dumps([doc["created_at"].isoformat(), doc["order_number"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_order_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, order_number = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), str(order_number)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def order_summary(doc: Dict[str, Any]) -> OrderSummary:
+    items = doc.get("items", [])
+    return OrderSummary(
+        **{key: doc[key] for key in ORDER_SUMMARY_PROJECTION if key in doc},
+        item_count=sum(item.get("quantity", 1) for item in items),
+        first_image=items[0].get("image") if items else None,
+    )
+
+
+@api_router.get("/orders/my", response_model=OrderSummaryPage)
 async def get_my_orders(
     user_id: Optional[str] = Query(None),
     email: Optional[str] = Query(None),
     limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor da página anterior"),
 ):
     """
-    List orders for the current shopper.
-    Accepts either user_id (preferred) or email as a fallback.
+    List orders for the current shopper (resumo, paginado por cursor).
+    Accepts user_id and/or email; guest orders are matched by email.
     """
-    filters: List[Dict[str, Any]] = []
-    if user_id:
-        filters.append({"user_id": user_id})
-    if email:
-        filters.append({"customer.email": email.lower()})
-
-    if not filters:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="user_id or email is required to fetch orders.",
-        )
+    keys = _shopper_keys(user_id, email)
+    before = decode_order_cursor(cursor) if cursor else None
+    # um a mais para saber se há página seguinte
+    docs = await repos.orders.list_for_owner(
+        keys,
+        limit + 1,
+        before=before,
+        projection=ORDER_SUMMARY_PROJECTION,
+        legacy=_owner_keys_pending(),
+    )
+    page = docs[:limit]
+    next_cursor = encode_order_cursor(page[-1]) if len(docs) > limit else None
+    return {"orders": [order_summary(doc) for doc in page], "next_cursor": next_cursor}
 
-    if len(filters) == 1:
-        query = filters[0]
-    else:
-        query = {"$or": filters}
 
-    cursor = (
-        orders_collection.find(query)
-        .sort("created_at", -1)
-        .limit(limit)
+@api_router.get("/orders/my/{order_number}", response_model=OrderResponse)
+async def get_my_order(
+    order_number: str,
+    user_id: Optional[str] = Query(None),
+    email: Optional[str] = Query(None),
+):
+    """Detalhe completo de um pedido do próprio cliente."""
+    doc = await repos.orders.get_for_owner(
+        order_number, _shopper_keys(user_id, email), legacy=_owner_keys_pending()
     )
-    orders = [Order(**doc) async for doc in cursor]
-    return {"orders": orders}
+    if not doc:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return {"order": Order(**doc)}
 
 
 # =====================================================================
@@ -389,7 +644,7 @@ async def create_address(address: AddressCreate):
     Criar um novo endereço para um utilizador.
     O frontend deve enviar user_id e os campos base.
     """
-    user = await users_collection.find_one({"id": address.user_id})
+    user = await repos.users.get(address.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="Utilizador não encontrado.")
 
@@ -537,7 +792,7 @@ async def add_favorite(user_id: str, product_id: str = Query(...)):
     Se já existir, devolve o existente.
     """
     # garantir que o produto existe
-    product = await products_collection.find_one({"id": product_id})
+    product = await repos.products.get(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Produto não encontrado.")
 
@@ -574,23 +829,43 @@ async def remove_favorite(user_id: str, product_id: str):
     return {"detail": "Favorito removido."}
 
 
+# =====================================================================
+# NOTIFICATIONS
+# =====================================================================
+@api_router.get(
+    "/users/{user_id}/notifications", response_model=NotificationsResponse
+)
+async def get_notifications(
+    user_id: str,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """Notificações do utilizador, mais recentes primeiro (paginação por cursor)."""
+    notifications, next_cursor = await list_notifications(user_id, cursor, limit)
+    return {"notifications": notifications, "next_cursor": next_cursor}
+
+
+@api_router.post("/users/{user_id}/notifications/read")
+async def mark_notifications_read(user_id: str, payload: NotificationsMarkRead):
+    """Marca como lidas as notificações indicadas (ou todas, com all=true)."""
+    updated = await mark_read(user_id, payload.ids, all_unread=payload.all)
+    return {"updated": updated}
+
+
+@api_router.get(
+    "/users/{user_id}/notifications/unread-count",
+    response_model=UnreadCountResponse,
+)
+async def get_unread_notifications_count(user_id: str):
+    return {"unread": await unread_count(user_id)}
+
+
 # =====================================================================
 # CART (APENAS BACKEND, PARA LIGAR AO FRONT MAIS TARDE)
 # =====================================================================
 async def _get_or_create_cart(user_id: str) -> Cart:
-    """
-    Devolve o carrinho do user. Se não existir, cria.
-    Remove o campo _id (ObjectId) para não quebrar o Pydantic/FastAPI.
-    """
-    cart_doc = await carts_collection.find_one({"user_id": user_id})
-    if not cart_doc:
-        cart = Cart(id=str(uuid.uuid4()), user_id=user_id, items=[])
-        await carts_collection.insert_one(cart.dict())
-        return cart
-
-    # remover o _id do Mongo
-    cart_doc.pop("_id", None)
-    return Cart(**cart_doc)
+    """Devolve o carrinho do user. Se não existir, cria."""
+    return await repos.carts.get_or_create(user_id)
 
 
 
@@ -616,12 +891,7 @@ async def add_cart_item(
     if not updated:
         cart.items.append(item)
 
-    cart.updated_at = datetime.utcnow()
-    await carts_collection.update_one(
-        {"id": cart.id},
-        {"$set": cart.dict()},
-        upsert=True,
-    )
+    await repos.carts.save(cart)
     return cart
 
 
@@ -639,12 +909,7 @@ async def update_cart_item(
             it.quantity = quantity
             break
 
-    cart.updated_at = datetime.utcnow()
-    await carts_collection.update_one(
-        {"id": cart.id},
-        {"$set": cart.dict()},
-        upsert=True,
-    )
+    await repos.carts.save(cart)
     return cart
 
 
@@ -660,12 +925,7 @@ async def remove_cart_item(
         for it in cart.items
         if not (it.product_id == product_id and it.selected_color == selected_color)
     ]
-    cart.updated_at = datetime.utcnow()
-    await carts_collection.update_one(
-        {"id": cart.id},
-        {"$set": cart.dict()},
-        upsert=True,
-    )
+    await repos.carts.save(cart)
     return cart
 
 
@@ -673,38 +933,49 @@ async def remove_cart_item(
 async def clear_cart(user_id: str):
     cart = await _get_or_create_cart(user_id)
     cart.items = []
-    cart.updated_at = datetime.utcnow()
-    await carts_collection.update_one(
-        {"id": cart.id},
-        {"$set": cart.dict()},
-        upsert=True,
-    )
+    await repos.carts.save(cart)
     return None
 
 
 # =====================================================================
 # CATEGORIES
 # =====================================================================
-@api_router.get("/categories", response_model=CategoryResponse)
+@api_router.get("/categories", response_model=CategoryWithStatsResponse)
 async def get_categories():
-    """Get all categories"""
+    """Get all categories (com contagens e preços em cache, ver category_stats.py)"""
     try:
-        categories = await categories_collection.find().to_list(100)
-        return {"categories": [Category(**cat) for cat in categories]}
+        return {"categories": await category_stats.get()}
     except Exception as e:
-        logger.error(f"Error fetching categories: {e}")
+        logger.error("Error fetching categories: %s", e)
         raise HTTPException(status_code=500, detail="Error fetching categories")
 
 
 @api_router.get("/categories/{slug}")
 async def get_category_by_slug(slug: str):
     """Get category by slug"""
-    category = await categories_collection.find_one({"slug": slug})
+    category = await category_lookups.do(
+        slug, lambda: categories_collection.find_one({"slug": slug})
+    )
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     return Category(**category)
 
 
+# =====================================================================
+# STOREFRONT
+# =====================================================================
+@api_router.get("/storefront/home")
+async def get_storefront_home(
+    if_none_match: Optional[str] = Header(default=None, alias="If-None-Match"),
+):
+    """Categorias + destaques/novidades/promoções numa resposta (storefront.py)"""
+    body, etag = await home_bundle.get()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
 # =====================================================================
 # PRODUCTS
 # =====================================================================
@@ -718,76 +989,55 @@ async def get_products(
 ):
     """Get all products with optional filters"""
     try:
-        query = {}
-
-        if category:
-            query["category"] = category
-
-        if featured is not None:
-            query["featured"] = featured
-        if is_new is not None:
-            query["is_new"] = is_new
-        if is_promo is not None:
-            query["is_promo"] = is_promo
-
-        if search:
-            query["$text"] = {"$search": search}
-
-        products = await products_collection.find(query).to_list(1000)
+        products = await repos.products.search(
+            category, featured, is_new, is_promo, search, limit=1000
+        )
         return {"products": [Product(**prod) for prod in products]}
     except Exception as e:
-        logger.error(f"Error fetching products: {e}")
+        logger.error("Error fetching products: %s", e)
         raise HTTPException(status_code=500, detail="Error fetching products")
 
 
 @api_router.get("/products/{product_id}", response_model=SingleProductResponse)
 async def get_product_by_id(product_id: str):
     """Get single product by ID"""
-    product = await products_collection.find_one({"id": product_id})
+    product = await product_lookups.do(
+        product_id, lambda: repos.products.get(product_id)
+    )
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return {"product": Product(**product)}
 
 
+@api_router.get("/products/{product_id}/related")
+async def get_related_products(product_id: str):
+    """Comprados frequentemente juntos (pré-calculado em recommendations.py)"""
+    return {"product_id": product_id, "products": await related_products(product_id)}
+
+
 # =====================================================================
 # ORDERS
 # =====================================================================
 @api_router.post("/orders", response_model=OrderResponse)
 async def create_order(order_data: OrderCreate):
-    """Create a new order"""
+    """Create a new order (etapas do checkout em checkout.py)"""
     try:
-        order_number = str(random.randint(100000, 999999))
-
-        while await orders_collection.find_one({"order_number": order_number}):
-            order_number = str(random.randint(100000, 999999))
-
-        customer_payload = order_data.customer.copy()
-        if customer_payload.email:
-            customer_payload.email = customer_payload.email.lower()
-
-        order = Order(
-            order_number=order_number,
-            user_id=order_data.user_id,
-            customer=customer_payload,
-            items=order_data.items,
-            payment_method=order_data.payment_method,
-            total=order_data.total,
-        )
-
-        order_dict = order.dict()
-        await orders_collection.insert_one(order_dict)
-
-        logger.info(f"Order created: {order_number}")
+        order = await place_order(order_data)
+        order_lookups.forget(order.order_number)
         return {"order": order}
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error creating order: {e}")
+        logger.error("Error creating order: %s", e)
         raise HTTPException(status_code=500, detail="Error creating order")
 
 
 @api_router.get("/orders/{order_number}", response_model=OrderResponse)
 async def get_order(order_number: str):
     """Get order by order number"""
-    order = await orders_collection.find_one({"order_number": order_number})
+    order = await order_lookups.do(
+        order_number, lambda: repos.orders.get(order_number)
+    )
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     return {"order": Order(**order)}
@@ -819,7 +1069,8 @@ async def generate_payment_reference(request: PaymentReferenceRequest):
     try:
         reference = str(random.randint(100000000, 999999999))
         entity = "11111"
-        expiry_date = (datetime.utcnow() + timedelta(days=3)).isoformat()
+        expires_at = datetime.utcnow() + timedelta(days=3)
+        expiry_date = expires_at.isoformat()
 
         payment = Payment(
             transaction_id=f"REF-{reference}",
@@ -828,25 +1079,25 @@ async def generate_payment_reference(request: PaymentReferenceRequest):
             amount=request.amount,
             status="pending",
             reference=reference,
+            expires_at=expires_at,
         )
 
-        await payments_collection.insert_one(payment.dict())
-
-        # marca o pedido como pendente de pagamento
-        await orders_collection.update_one(
-            {"order_number": request.order_number},
+        # grava o pagamento e marca o pedido como pendente de pagamento
+        await register_payment(
+            payment,
             {
-                "$set": {
-                    "payment_reference": reference,
-                    "payment_method": "multicaixa-reference",
-                    "payment_status": "pending",
-                    "updated_at": datetime.utcnow(),
-                }
+                "payment_reference": reference,
+                "payment_method": "multicaixa-reference",
+                "payment_status": "pending",
+                "payment_expires_at": expires_at,
             },
         )
 
         logger.info(
-            f"Payment reference generated: {reference} for order {request.order_number}"
+            "Payment reference generated: %s for order %s",
+            reference,
+            request.order_number,
+            extra={"order_number": request.order_number},
         )
 
         return PaymentReferenceResponse(
@@ -854,8 +1105,10 @@ async def generate_payment_reference(request: PaymentReferenceRequest):
             entity=entity,
             expiry_date=expiry_date,
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error generating payment reference: {e}")
+        logger.error("Error generating payment reference: %s", e)
         raise HTTPException(
             status_code=500, detail="Error generating payment reference"
         )
@@ -878,30 +1131,30 @@ async def process_express_payment(request: PaymentExpressRequest):
             phone=request.phone,
         )
 
-        await payments_collection.insert_one(payment.dict())
-
-        # marca o pedido como pendente de pagamento
-        await orders_collection.update_one(
-            {"order_number": request.order_number},
+        # grava o pagamento e marca o pedido como pendente de pagamento
+        await register_payment(
+            payment,
             {
-                "$set": {
-                    "payment_method": "multicaixa-express",
-                    "payment_status": "pending",
-                    "updated_at": datetime.utcnow(),
-                }
+                "payment_method": "multicaixa-express",
+                "payment_status": "pending",
             },
         )
 
         logger.info(
-            f"Express payment initiated: {transaction_id} for order {request.order_number}"
+            "Express payment initiated: %s for order %s",
+            transaction_id,
+            request.order_number,
+            extra={"order_number": request.order_number},
         )
 
         return PaymentExpressResponse(
             transaction_id=transaction_id,
             status="pending",
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error processing express payment: {e}")
+        logger.error("Error processing express payment: %s", e)
         raise HTTPException(
             status_code=500, detail="Error processing express payment"
         )
@@ -914,39 +1167,17 @@ async def mock_pay_transaction(transaction_id: str):
     Endpoint de desenvolvimento para SIMULAR que o pagamento foi concluído com sucesso.
     Usa pelo Swagger clicando neste endpoint.
     """
-    payment = await payments_collection.find_one(
-        {"transaction_id": transaction_id}
-    )
-    if not payment:
-        raise HTTPException(status_code=404, detail="Payment not found")
-
-    # marca o pagamento como pago
-    await payments_collection.update_one(
-        {"transaction_id": transaction_id},
-        {
-            "$set": {
-                "status": "paid",
-                "updated_at": datetime.utcnow(),
-            }
-        },
-    )
-
-    pay_doc = await payments_collection.find_one(
-        {"transaction_id": transaction_id}
-    )
-    payment_obj = Payment(**pay_doc)
-
-    # atualiza o pedido associado
-    await orders_collection.update_one(
-        {"order_number": payment_obj.order_number},
-        {
-            "$set": {
-                "payment_status": "paid",
-                "status": "confirmed",
-                "updated_at": datetime.utcnow(),
-            }
-        },
+    # pagamento -> "paid" e pedido -> "confirmed" no mesmo caminho de escrita
+    payment_obj, order_doc = await set_payment_status(
+        transaction_id, payment_status="paid", order_status="confirmed"
     )
+    if order_doc:
+        notification_fanout.notify(
+            order_doc.get("user_id"),
+            title=f"Pagamento confirmado #{payment_obj.order_number}",
+            message="Recebemos o seu pagamento. O pedido foi confirmado.",
+            link=f"/pedido/{payment_obj.order_number}",
+        )
 
     return PaymentStatusResponse(
         transaction_id=payment_obj.transaction_id,
@@ -955,45 +1186,6 @@ async def mock_pay_transaction(transaction_id: str):
     )
 
 
-# =====================================================================
-# ORDERS
-# =====================================================================
-@api_router.post("/orders", response_model=OrderResponse)
-async def create_order(order_data: OrderCreate):
-    """Create a new order"""
-    try:
-        # Gera número de pedido de 6 dígitos (garantindo unicidade)
-        order_number = str(random.randint(100000, 999999))
-        while await orders_collection.find_one({"order_number": order_number}):
-            order_number = str(random.randint(100000, 999999))
-
-        now = datetime.utcnow()
-
-        # Preenche o modelo Order.
-        # Assumindo que o modelo Order tem campos opcionais como:
-        # status, payment_status, created_at, updated_at
-        order = Order(
-            order_number=order_number,
-            customer=order_data.customer,
-            items=order_data.items,
-            payment_method=order_data.payment_method,
-            total=order_data.total,
-            status="new",
-            payment_status="pending",
-            created_at=now,
-            updated_at=now,
-        )
-
-        order_dict = order.dict()
-        await orders_collection.insert_one(order_dict)
-
-        logger.info(f"Order created: {order_number}")
-        return {"order": order}
-    except Exception as e:
-        logger.error(f"Error creating order: {e}")
-        raise HTTPException(status_code=500, detail="Error creating order")
-
-
 # =====================================================================
 # ADMIN ROUTES
 # =====================================================================
@@ -1021,6 +1213,10 @@ async def admin_create_category(
     category_data = category.dict()
     category_data["slug"] = slug
     await categories_collection.insert_one(category_data)
+    await invalidate_catalog("category.create")
+    activity_logger.log(
+        "admin.category.create", user_id=current_admin.id, details=category_data["id"]
+    )
     return Category(**category_data)
 
 
@@ -1055,6 +1251,10 @@ async def admin_update_category(
         {"$set": update_fields},
     )
 
+    await invalidate_catalog("category.update")
+    activity_logger.log(
+        "admin.category.update", user_id=current_admin.id, details=category_id
+    )
     updated = await categories_collection.find_one({"id": category_id})
     return Category(**updated)
 
@@ -1066,6 +1266,10 @@ async def admin_delete_category(
     result = await categories_collection.delete_one({"id": category_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Category not found.")
+    await invalidate_catalog("category.delete")
+    activity_logger.log(
+        "admin.category.delete", user_id=current_admin.id, details=category_id
+    )
     return {"status": "deleted"}
 
 
@@ -1083,14 +1287,8 @@ async def admin_list_products(
             {"description": {"$regex": search, "$options": "i"}},
         ]
 
-    total = await products_collection.count_documents(filters)
-    cursor = (
-        products_collection.find(filters)
-        .sort("created_at", -1)
-        .skip((page - 1) * limit)
-        .limit(limit)
-    )
-    products = [Product(**doc) async for doc in cursor]
+    docs, total = await repos.products.page(filters, page, limit)
+    products = [Product(**doc) for doc in docs]
 
     return {
         "products": products,
@@ -1102,7 +1300,7 @@ async def admin_list_products(
 async def admin_get_product(
     product_id: str, current_admin: UserOut = Depends(get_current_admin_user)
 ):
-    product = await products_collection.find_one({"id": product_id})
+    product = await repos.products.get(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found.")
     return {"product": Product(**product)}
@@ -1115,31 +1313,62 @@ async def admin_create_product(
     product_data = product.dict()
     product_data["created_at"] = datetime.utcnow()
     product_data["updated_at"] = datetime.utcnow()
-    await products_collection.insert_one(product_data)
+    await repos.products.insert(product_data)
+    await invalidate_catalog("product.create")
+    activity_logger.log(
+        "admin.product.create", user_id=current_admin.id, details=product_data["id"]
+    )
     return {"product": Product(**product_data)}
 
 
+@admin_router.post("/products/import")
+async def admin_import_products(
+    file: UploadFile = File(...),
+    import_format: Optional[str] = Query(None, alias="format", pattern="^(csv|ndjson)$"),
+    current_admin: UserOut = Depends(get_current_admin_user),
+):
+    """
+    Cria/atualiza produtos em massa a partir de CSV ou NDJSON (formato
+    deduzido da extensão se não for indicado). Devolve um relatório por linha.
+    """
+    fmt = import_format
+    if fmt is None:
+        suffix = Path(file.filename or "").suffix.lower()
+        fmt = "ndjson" if suffix in {".ndjson", ".jsonl"} else "csv"
+
+    report = await import_products(file.file, fmt)
+
+    # uma única invalidação para o lote inteiro
+    if report.inserted or report.updated:
+        await invalidate_catalog("product.import")
+    activity_logger.log(
+        "admin.product.import",
+        user_id=current_admin.id,
+        details=f"{file.filename}: {report.inserted} inserted, "
+        f"{report.updated} updated, {report.error_count} failed",
+    )
+    return report.dict()
+
+
 @admin_router.put("/products/{product_id}", response_model=SingleProductResponse)
 async def admin_update_product(
     product_id: str,
     product: Product,
     current_admin: UserOut = Depends(get_current_admin_user),
 ):
-    existing = await products_collection.find_one({"id": product_id})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Product not found.")
-
-    updated_data = product.dict()
+    updated_data = product.dict(exclude={"created_at"})
     updated_data["id"] = product_id
-    updated_data["created_at"] = existing.get("created_at", datetime.utcnow())
     updated_data["updated_at"] = datetime.utcnow()
 
-    await products_collection.update_one(
-        {"id": product_id},
-        {"$set": updated_data},
-    )
+    # um só round trip: update + documento atualizado
+    refreshed = await repos.products.update_fields(product_id, updated_data)
+    if not refreshed:
+        raise HTTPException(status_code=404, detail="Product not found.")
 
-    refreshed = await products_collection.find_one({"id": product_id})
+    await invalidate_catalog("product.update")
+    activity_logger.log(
+        "admin.product.update", user_id=current_admin.id, details=product_id
+    )
     return {"product": Product(**refreshed)}
 
 
@@ -1147,9 +1376,12 @@ async def admin_update_product(
 async def admin_delete_product(
     product_id: str, current_admin: UserOut = Depends(get_current_admin_user)
 ):
-    result = await products_collection.delete_one({"id": product_id})
-    if result.deleted_count == 0:
+    if not await repos.products.delete(product_id):
         raise HTTPException(status_code=404, detail="Product not found.")
+    await invalidate_catalog("product.delete")
+    activity_logger.log(
+        "admin.product.delete", user_id=current_admin.id, details=product_id
+    )
     return {"status": "deleted"}
 
 
@@ -1163,32 +1395,10 @@ async def admin_list_orders(
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
 ):
-    filters: Dict[str, Any] = {}
-    if status_filter:
-        filters["status"] = status_filter
-    if payment_status:
-        filters["payment_status"] = payment_status
+    filters = build_order_filters(status_filter, payment_status, date_from, date_to)
 
-    date_filter: Dict[str, Any] = {}
-    start_date = parse_iso_date(date_from)
-    end_date = parse_iso_date(date_to)
-    if start_date:
-        date_filter["$gte"] = start_date
-    if end_date:
-        # Include the entire day by adding one day and subtracting a microsecond
-        end_range = end_date + timedelta(days=1)
-        date_filter["$lt"] = end_range
-    if date_filter:
-        filters["created_at"] = date_filter
-
-    total = await orders_collection.count_documents(filters)
-    cursor = (
-        orders_collection.find(filters)
-        .sort("created_at", -1)
-        .skip((page - 1) * limit)
-        .limit(limit)
-    )
-    orders = [Order(**doc) async for doc in cursor]
+    docs, total = await repos.orders.page(filters, page, limit)
+    orders = [Order(**doc) for doc in docs]
 
     return {
         "orders": orders,
@@ -1196,11 +1406,241 @@ async def admin_list_orders(
     }
 
 
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+# nº de linhas CSV juntas em cada chunk enviado
+EXPORT_CHUNK_ROWS = 500
+
+EXPORT_CSV_COLUMNS = [
+    "order_number",
+    "created_at",
+    "status",
+    "payment_status",
+    "payment_method",
+    "payment_reference",
+    "total",
+    "user_id",
+    "customer_name",
+    "customer_email",
+    "customer_phone",
+    "customer_address",
+    "customer_city",
+    "item_count",
+    "items",
+]
+
+
+def flatten_order(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Uma linha por pedido: customer.* em colunas, itens resumidos."""
+    customer = doc.get("customer") or {}
+    items = doc.get("items") or []
+    created_at = doc.get("created_at")
+    return {
+        "order_number": doc.get("order_number"),
+        "created_at": created_at.isoformat() if created_at else None,
+        "status": doc.get("status"),
+        "payment_status": doc.get("payment_status"),
+        "payment_method": doc.get("payment_method"),
+        "payment_reference": doc.get("payment_reference"),
+        "total": doc.get("total"),
+        "user_id": doc.get("user_id"),
+        "customer_name": customer.get("name"),
+        "customer_email": customer.get("email"),
+        "customer_phone": customer.get("phone"),
+        "customer_address": customer.get("address"),
+        "customer_city": customer.get("city"),
+        "item_count": sum(int(item.get("quantity", 0)) for item in items),
+        "items": [
+            {
+                "product_id": item.get("product_id"),
+                "name": item.get("name"),
+                "quantity": item.get("quantity"),
+                "price": item.get("price"),
+                "selected_color": item.get("selected_color"),
+            }
+            for item in items
+        ],
+    }
+
+
+def _items_to_text(items: List[Dict[str, Any]]) -> str:
+    return " | ".join(
+        f"{item['quantity']}x {item['name']} @ {item['price']}" for item in items
+    )
+
+
+async def _export_orders_csv(cursor):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_CSV_COLUMNS)
+    rows = 0
+    async for doc in cursor:
+        row = flatten_order(doc)
+        row["items"] = _items_to_text(row["items"])
+        writer.writerow([row[column] for column in EXPORT_CSV_COLUMNS])
+        rows += 1
+        if rows % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+async def _export_orders_ndjson(cursor):
+    lines: List[str] = []
+    async for doc in cursor:
+        lines.append(json.dumps(flatten_order(doc), ensure_ascii=False, default=str))
+        if len(lines) >= EXPORT_CHUNK_ROWS:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+@admin_router.get("/orders/export")
+async def admin_export_orders(
+    current_admin: UserOut = Depends(get_current_admin_user),
+    export_format: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    status_filter: Optional[str] = Query(None, alias="status"),
+    payment_status: Optional[str] = Query(None),
+    date_from: Optional[str] = Query(None),
+    date_to: Optional[str] = Query(None),
+):
+    """
+    Exporta pedidos (CSV ou NDJSON) em streaming direto do cursor Motor:
+    memória constante, sem skip/count, com os mesmos filtros da listagem.
+    """
+    filters = build_order_filters(status_filter, payment_status, date_from, date_to)
+    # pedidos ativos + arquivados, intercalados por data
+    cursor = merge_by_created_at(
+        *repos.orders.iterate_with_archive(
+            filters, {"_id": 0, "archived_at": 0}, batch_size=EXPORT_BATCH_SIZE
+        )
+    )
+    activity_logger.log(
+        "admin.order.export", user_id=current_admin.id, details=str(filters)
+    )
+
+    filename = f"orders-{datetime.utcnow():%Y%m%d-%H%M%S}.{export_format}"
+    if export_format == "ndjson":
+        body, media_type = _export_orders_ndjson(cursor), "application/x-ndjson"
+    else:
+        body, media_type = _export_orders_csv(cursor), "text/csv; charset=utf-8"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@admin_router.post("/orders/bulk-status")
+async def admin_bulk_update_order_status(
+    payload: AdminOrderBulkStatus,
+    current_admin: UserOut = Depends(get_current_admin_user),
+):
+    """
+    Muda o estado (e, opcionalmente, o estado do pagamento) de vários pedidos
+    de uma vez: uma query para validar as transições e um único update_many
+    para as aplicar, com a mesma guarda do PATCH de um pedido.
+    """
+    target = payload.status
+    payment_target = payload.payment_status
+    order_numbers = list(dict.fromkeys(payload.order_numbers))
+    current = {
+        doc["order_number"]: doc
+        for doc in await repos.orders.get_many(
+            order_numbers,
+            {
+                "_id": 0,
+                "order_number": 1,
+                "status": 1,
+                "payment_status": 1,
+                "user_id": 1,
+            },
+        )
+    }
+
+    def reached(doc: Dict[str, Any]) -> bool:
+        return doc.get("status") == target and (
+            payment_target is None or doc.get("payment_status") == payment_target
+        )
+
+    outcomes: Dict[str, Dict[str, Any]] = {}
+    eligible: List[str] = []
+    for number in order_numbers:
+        doc = current.get(number)
+        if doc is None:
+            outcomes[number] = {"outcome": "not_found"}
+            continue
+        origin = {"from": doc.get("status")}
+        if payment_target is not None:
+            origin["payment_from"] = doc.get("payment_status")
+        status_ok = doc.get("status") == target or can_transition(
+            doc.get("status"), target
+        )
+        payment_ok = payment_target is None or (
+            doc.get("payment_status") == payment_target
+            or can_transition_payment(doc.get("payment_status"), payment_target)
+        )
+        if reached(doc):
+            outcomes[number] = {"outcome": "unchanged", **origin}
+        elif status_ok and payment_ok:
+            eligible.append(number)
+            outcomes[number] = {"outcome": "updated", **origin}
+        else:
+            outcomes[number] = {"outcome": "invalid_transition", **origin}
+
+    updated = eligible
+    if eligible:
+        entry = history_entry(target, payment_target, by=current_admin.id)
+        changes = {"status": target, "updated_at": entry["at"]}
+        if payment_target is not None:
+            changes["payment_status"] = payment_target
+        # a guarda no filtro protege contra pedidos alterados entretanto
+        modified = await repos.orders.update_many(
+            eligible,
+            {"$set": changes, "$push": history_push(entry)},
+            guard=transition_guard(target, payment_target),
+        )
+        if modified < len(eligible):
+            updated = [
+                doc["order_number"]
+                for doc in await repos.orders.get_many(
+                    eligible,
+                    {"_id": 0, "order_number": 1, "status": 1, "payment_status": 1},
+                )
+                if reached(doc)
+            ]
+            for number in set(eligible) - set(updated):
+                outcomes[number]["outcome"] = "conflict"
+
+        for number in updated:
+            notification_fanout.notify(
+                current[number].get("user_id"),
+                title=f"Pedido #{number} atualizado",
+                message=f"O estado do seu pedido passou para: {target}.",
+                link=f"/pedido/{number}",
+            )
+        activity_logger.log(
+            "admin.order.bulk_status",
+            user_id=current_admin.id,
+            details=f"{target}: {', '.join(updated)}",
+        )
+
+    return {
+        "status": target,
+        "updated": len(updated),
+        "results": [
+            {"order_number": number, **outcomes[number]} for number in order_numbers
+        ],
+    }
+
+
 @admin_router.get("/orders/{order_number}", response_model=OrderResponse)
 async def admin_get_order(
     order_number: str, current_admin: UserOut = Depends(get_current_admin_user)
 ):
-    order = await orders_collection.find_one({"order_number": order_number})
+    # coleção quente e, se não estiver lá, o arquivo
+    order = await repos.orders.get(order_number)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found.")
     return {"order": Order(**order)}
@@ -1219,16 +1659,45 @@ async def admin_update_order(
             detail="No fields provided for update.",
         )
 
-    update_data["updated_at"] = datetime.utcnow()
-
-    result = await orders_collection.update_one(
-        {"order_number": order_number},
-        {"$set": update_data},
+    entry = history_entry(
+        update_data.get("status"),
+        update_data.get("payment_status"),
+        by=current_admin.id,
+    )
+    update_data["updated_at"] = entry["at"]
+
+    # a transição só é aplicada se o estado atual a permitir (guarda no filtro)
+    refreshed = await repos.orders.update_fields(
+        order_number,
+        {"$set": update_data, "$push": history_push(entry)},
+        guard=transition_guard(
+            update_data.get("status"), update_data.get("payment_status")
+        ),
+    )
+    if not refreshed:
+        current = await repos.orders.get(order_number)
+        if not current:
+            raise HTTPException(status_code=404, detail="Order not found.")
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=(
+                f"Invalid transition from {current.get('status')}/"
+                f"{current.get('payment_status')}."
+            ),
+        )
+    activity_logger.log(
+        "admin.order.update",
+        user_id=current_admin.id,
+        details=f"{order_number} {payload.dict(exclude_unset=True)}",
     )
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Order not found.")
 
-    refreshed = await orders_collection.find_one({"order_number": order_number})
+    if "status" in update_data:
+        notification_fanout.notify(
+            refreshed.get("user_id"),
+            title=f"Pedido #{order_number} atualizado",
+            message=f"O estado do seu pedido passou para: {update_data['status']}.",
+            link=f"/pedido/{order_number}",
+        )
     return {"order": Order(**refreshed)}
 
 
@@ -1292,6 +1761,13 @@ async def admin_update_user(
     updated = await users_collection.find_one({"id": user_id})
     if not updated:
         raise HTTPException(status_code=404, detail="User not found.")
+    # sem esperar pelo change stream neste worker
+    admin_principals.pop(user_id)
+    activity_logger.log(
+        "admin.user.update",
+        user_id=current_admin.id,
+        details=f"{user_id} {update_data}",
+    )
     return UserOut(**updated)
 
 
@@ -1340,24 +1816,88 @@ async def admin_update_support_message(
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Message not found.")
+    activity_logger.log(
+        "admin.support_message.update", user_id=current_admin.id, details=message_id
+    )
 
     updated = await support_messages_collection.find_one({"id": message_id})
     return SupportMessage(**updated)
 
 
+@admin_router.get("/activity-logs", response_model=ActivityLogsResponse)
+async def admin_list_activity_logs(
+    current_admin: UserOut = Depends(get_current_admin_user),
+    user_id: Optional[str] = Query(None),
+    action: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+):
+    filters: Dict[str, Any] = {}
+    if user_id:
+        filters["user_id"] = user_id
+    if action:
+        filters["action"] = action
+
+    cursor = (
+        activity_logs_collection.find(filters)
+        .sort("created_at", -1)
+        .limit(limit)
+    )
+    return {"logs": [ActivityLog(**doc) async for doc in cursor]}
+
+
+ORDER_COLLECTIONS = (orders_collection, orders_archive_collection)
+
+
+async def _count_orders(filters: Dict[str, Any]) -> int:
+    """Contagem somada dos pedidos ativos e arquivados."""
+    counts = await asyncio.gather(
+        *(collection.count_documents(filters) for collection in ORDER_COLLECTIONS)
+    )
+    return sum(counts)
+
+
+async def _product_sales(collection) -> List[Dict[str, Any]]:
+    return await collection.aggregate(
+        [
+            {"$unwind": "$items"},
+            {
+                "$group": {
+                    "_id": "$items.product_id",
+                    "count": {"$sum": "$items.quantity"},
+                    "revenue": {
+                        "$sum": {
+                            "$multiply": ["$items.quantity", "$items.price"]
+                        }
+                    },
+                }
+            },
+        ]
+    ).to_list(None)
+
+
 @admin_router.get("/dashboard/summary")
 async def admin_dashboard_summary(
     current_admin: UserOut = Depends(get_current_admin_user),
 ):
+    """Totais sobre os pedidos ativos e os arquivados (archiving.py)."""
     total_users = await users_collection.count_documents({})
-    total_orders = await orders_collection.count_documents({})
+    total_orders = await _count_orders({})
     total_products = await products_collection.count_documents({})
 
+    # estados fixos: cada contagem é um COUNT_SCAN no prefixo do índice
+    # (status, ...) de cada coleção
+    statuses = sorted(ORDER_STATUSES)
+    status_counts = await asyncio.gather(
+        *(_count_orders({"status": s}) for s in statuses)
+    )
+
     total_revenue = 0.0
-    async for paid_order in orders_collection.find(
-        {"payment_status": "paid"}, {"total": 1}
-    ):
-        total_revenue += paid_order.get("total", 0.0)
+    # query coberta pelo índice parcial payment_status_paid_total
+    for collection in ORDER_COLLECTIONS:
+        async for paid_order in collection.find(
+            {"payment_status": "paid"}, {"_id": 0, "total": 1}
+        ):
+            total_revenue += paid_order.get("total", 0.0)
 
     today = datetime.utcnow().date()
     last_7_days_orders: List[Dict[str, Any]] = []
@@ -1365,9 +1905,7 @@ async def admin_dashboard_summary(
         day = today - timedelta(days=offset)
         start = datetime.combine(day, datetime.min.time())
         end = start + timedelta(days=1)
-        count = await orders_collection.count_documents(
-            {"created_at": {"$gte": start, "$lt": end}}
-        )
+        count = await _count_orders({"created_at": {"$gte": start, "$lt": end}})
         last_7_days_orders.append(
             {
                 "date": day.isoformat(),
@@ -1375,35 +1913,27 @@ async def admin_dashboard_summary(
             }
         )
 
-    top_products_cursor = orders_collection.aggregate(
-        [
-            {"$unwind": "$items"},
-            {
-                "$group": {
-                    "_id": "$items.product_id",
-                    "count": {"$sum": "$items.quantity"},
-                    "revenue": {
-                        "$sum": {
-                            "$multiply": ["$items.quantity", "$items.price"]
-                        }
-                    },
-                }
-            },
-            {"$sort": {"count": -1}},
-            {"$limit": 5},
-        ]
-    )
+    # um grupo por produto em cada coleção, somados aqui (no máximo um
+    # registo por produto do catálogo)
+    sales: Dict[str, Dict[str, Any]] = {}
+    for collection in ORDER_COLLECTIONS:
+        for entry in await _product_sales(collection):
+            total = sales.setdefault(entry["_id"], {"count": 0, "revenue": 0.0})
+            total["count"] += entry.get("count", 0)
+            total["revenue"] += entry.get("revenue", 0.0)
+    raw_top_products = sorted(
+        sales.items(), key=lambda item: item[1]["count"], reverse=True
+    )[:5]
 
-    raw_top_products = await top_products_cursor.to_list(length=5)
     top_products = []
-    for entry in raw_top_products:
-        product = await products_collection.find_one({"id": entry["_id"]})
+    for product_id, entry in raw_top_products:
+        product = await products_collection.find_one({"id": product_id})
         top_products.append(
             {
-                "product_id": entry["_id"],
+                "product_id": product_id,
                 "name": product["name"] if product else "Produto",
-                "count": entry.get("count", 0),
-                "revenue": entry.get("revenue", 0.0),
+                "count": entry["count"],
+                "revenue": entry["revenue"],
             }
         )
 
@@ -1412,11 +1942,122 @@ async def admin_dashboard_summary(
         "total_orders": total_orders,
         "total_products": total_products,
         "total_revenue": round(total_revenue, 2),
+        "orders_by_status": dict(zip(statuses, status_counts)),
         "last_7_days_orders": last_7_days_orders,
         "top_products": top_products,
     }
 
 
+@admin_router.get("/workers/reconciliation")
+async def admin_reconciliation_stats(
+    current_admin: UserOut = Depends(get_current_admin_user),
+):
+    """Estado e tempos de execução do worker de reconciliação."""
+    return {
+        "running": reconciliation_worker.running,
+        "interval_seconds": reconciliation_worker.interval_seconds,
+        "batch_size": reconciliation_worker.batch_size,
+        "stats": reconciliation_worker.stats,
+    }
+
+
+@admin_router.get("/workers/recommendations")
+async def admin_recommendations_stats(
+    current_admin: UserOut = Depends(get_current_admin_user),
+):
+    """Estado do job de "comprados juntos"."""
+    return {
+        "running": recommendations_job.running,
+        "interval_seconds": recommendations_job.interval_seconds,
+        "top_k": recommendations_job.top_k,
+        "stats": recommendations_job.stats,
+    }
+
+
+@admin_router.post("/workers/recommendations/run")
+async def admin_run_recommendations(
+    full: bool = Query(False, description="Recalcular a partir de todos os pedidos"),
+    current_admin: UserOut = Depends(get_current_admin_user),
+):
+    """Corre o job já (incremental, ou completo com `full=true`)."""
+    totals = await recommendations_job.run_once(full=full)
+    activity_logger.log(
+        "admin.recommendations.run",
+        user_id=current_admin.id,
+        details=f"full={full} {totals}",
+    )
+    return totals
+
+
+@admin_router.get("/workers/owner-keys-backfill")
+async def admin_owner_keys_backfill_stats(
+    current_admin: UserOut = Depends(get_current_admin_user),
+):
+    """Progresso do preenchimento de owner_keys (pedidos ativos e arquivo)."""
+    return {
+        backfill.marker_id: {
+            "running": backfill.running,
+            "interval_seconds": backfill.interval_seconds,
+            "stats": backfill.stats,
+        }
+        for backfill in owner_keys_backfills
+    }
+
+
+@admin_router.get("/workers/archiver")
+async def admin_archiver_stats(
+    current_admin: UserOut = Depends(get_current_admin_user),
+):
+    """Estado do arquivo de pedidos e tamanho atual das coleções/índices."""
+    return {
+        "running": order_archiver.running,
+        "archive_after_days": order_archiver.archive_after.days,
+        "batch_size": order_archiver.batch_size,
+        "stats": order_archiver.stats,
+        "sizes": await collection_sizes(),
+    }
+
+
+@admin_router.post("/workers/archiver/run")
+async def admin_run_archiver(
+    current_admin: UserOut = Depends(get_current_admin_user),
+):
+    """Arquiva já; devolve os tamanhos antes e depois."""
+    totals = await order_archiver.run_once()
+    activity_logger.log(
+        "admin.orders.archive",
+        user_id=current_admin.id,
+        details=(
+            f"orders={totals['archived_orders']} "
+            f"payments={totals['archived_payments']}"
+        ),
+    )
+    return totals
+
+
+@admin_router.get("/cache/watcher")
+async def admin_cache_watcher_stats(
+    current_admin: UserOut = Depends(get_current_admin_user),
+):
+    """Modo (change_stream/polling) e contadores do watcher de invalidação."""
+    return {
+        "running": change_watcher.running,
+        "mode": change_watcher.mode,
+        "watcher_id": change_watcher.watcher_id,
+        "admin_principals_cached": len(admin_principals),
+        "stats": change_watcher.stats,
+    }
+
+
+@admin_router.get("/indexes/check")
+async def admin_check_indexes(
+    current_admin: UserOut = Depends(get_current_admin_user),
+):
+    """Compara o explain() das queries quentes com o índice esperado."""
+    results = await check_query_plans()
+    return {"ok": all(r["ok"] for r in results), "checks": results}
+
+
 @admin_router.post("/uploads")
 async def admin_upload_file(
     file: UploadFile = File(...),
@@ -1430,9 +2071,28 @@ async def admin_upload_file(
         )
 
     relative_path = await save_uploaded_file(file)
+    activity_logger.log("admin.upload", user_id=current_admin.id, details=relative_path)
     return {"url": relative_path}
 
 
+# =====================================================================
+# INTERNAL (fora de /api: não é exposto pelo ingress)
+# =====================================================================
+@app.get("/internal/db-metrics", include_in_schema=False)
+async def internal_db_metrics():
+    """Latência por coleção/comando e estado do pool do cliente Motor."""
+    return {"client_options": client_options(), **db_metrics.snapshot()}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Métricas HTTP + Mongo no formato de exposição texto do Prometheus."""
+    return PlainTextResponse(
+        render_prometheus(http_metrics, db_metrics),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
 # =====================================================================
 # INCLUDE ROUTER / CORS
 # =====================================================================
@@ -1447,3 +2107,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+
+# ficam por fora do CORS para medir o tempo total de cada request
+app.add_middleware(TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
@@ -0,0 +1,65 @@
+"""
+Coalescência de lookups idênticos (single-flight).
+
+Pedidos concorrentes pela mesma chave partilham uma única query: o primeiro
+lança-a numa task própria e os restantes esperam pelo mesmo resultado. Como
+a query corre numa task à parte, um cliente que desliga a meio não cancela a
+resposta dos outros. Resultados vazios (404) ficam em cache durante
+`negative_ttl` segundos; os documentos devolvidos são partilhados entre
+requests, por isso os chamadores não os devem alterar.
+
+Contadores por resultado em `http_metrics.lookups` (executed, coalesced,
+negative_hit), expostos em /metrics como `lookup_requests_total`.
+"""
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import asyncio
+import os
+
+from cache_sync import TTLCache
+from metrics import HttpMetrics, http_metrics
+
+NEGATIVE_TTL_SECONDS = float(os.environ.get("LOOKUP_NEGATIVE_TTL", 2.0))
+
+
+class SingleFlight:
+    def __init__(
+        self,
+        name: str,
+        negative_ttl: float = NEGATIVE_TTL_SECONDS,
+        metrics: HttpMetrics = http_metrics,
+    ):
+        self.name = name
+        self.metrics = metrics
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._missing: TTLCache[Hashable, bool] = TTLCache(negative_ttl)
+
+    async def do(
+        self, key: Hashable, fetch: Callable[[], Awaitable[Optional[Any]]]
+    ) -> Optional[Any]:
+        """Devolve `await fetch()`, partilhado com lookups concorrentes."""
+        if self._missing.get(key):
+            self.metrics.count_lookup(self.name, "negative_hit")
+            return None
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.metrics.count_lookup(self.name, "coalesced")
+        else:
+            self.metrics.count_lookup(self.name, "executed")
+            task = asyncio.ensure_future(fetch())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._settle(key, done))
+        return await asyncio.shield(task)
+
+    def _settle(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is None and task.result() is None:
+            self._missing.put(key, True)
+
+    def forget(self, key: Hashable) -> None:
+        """Esquece um 404 em cache (ex.: o documento acabou de ser criado)."""
+        self._missing.pop(key)
+
+    def clear(self, *_: Any) -> None:
+        self._missing.clear()
@@ -0,0 +1,110 @@
+"""
+Payload da página inicial da loja (GET /api/storefront/home).
+
+Categorias (com contagens e preços, ver category_stats.py) + produtos em
+destaque, novidades e promoções numa só resposta, serializada uma vez para
+bytes e servida da memória até o catálogo mudar (`on_catalog_change`,
+incluindo invalidações vindas de outros workers pelo change watcher). As
+três listas usam os índices `featured_1`, `is_new_true` e `is_promo_true`,
+trazem só os campos dos cartões de produto e vêm ordenadas (mais recentes
+primeiro, `id` a desempatar): com o limite por secção, sem ordem explícita os
+produtos escolhidos dependeriam da ordem natural da coleção.
+"""
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from catalog_cache import catalog_state, on_catalog_change
+from category_stats import category_stats
+from repositories import repos
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+HOME_SECTION_LIMIT = int(os.environ.get("STOREFRONT_SECTION_LIMIT", 12))
+
+# campos usados nos cartões de produto do frontend
+CARD_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "name": 1,
+    "category": 1,
+    "description": 1,
+    "price": 1,
+    "original_price": 1,
+    "image": 1,
+    "stock": 1,
+    "rating": 1,
+    "featured": 1,
+    "is_new": 1,
+    "is_promo": 1,
+    "colors": 1,
+}
+
+SECTIONS = {"featured": "featured", "new": "is_new", "promo": "is_promo"}
+SECTION_SORT = [("created_at", -1), ("id", 1)]
+
+
+class HomeBundle:
+    def __init__(self):
+        # (corpo JSON, ETag)
+        self.cached: Optional[Tuple[bytes, str]] = None
+        self.stats: Dict[str, Any] = {"builds": 0, "last_build_ms": None}
+        # incrementa a cada invalidação; um build em curso que comece antes
+        # não grava o resultado (ficaria desatualizado)
+        self._generation = 0
+        self._builds = SingleFlight("storefront_home")
+
+    def invalidate(self, *_: Any) -> None:
+        self._generation += 1
+        self.cached = None
+
+    async def get(self) -> Tuple[bytes, str]:
+        cached = self.cached
+        if cached is not None:
+            return cached
+        return await self._builds.do(self._generation, self._build)
+
+    async def _build(self) -> Tuple[bytes, str]:
+        generation = self._generation
+        started = time.perf_counter()
+
+        categories, *sections = await asyncio.gather(
+            category_stats.get(),
+            *[
+                repos.products.flagged(
+                    flag, CARD_PROJECTION, HOME_SECTION_LIMIT, sort=SECTION_SORT
+                )
+                for flag in SECTIONS.values()
+            ],
+        )
+        payload = {
+            "catalog_version": catalog_state["version"],
+            "categories": categories,
+            **dict(zip(SECTIONS, sections)),
+        }
+        body = json.dumps(
+            jsonable_encoder(payload), separators=(",", ":"), ensure_ascii=False
+        ).encode("utf-8")
+
+        built = (body, '"%s"' % hashlib.sha1(body).hexdigest()[:16])
+        if generation == self._generation:
+            self.cached = built
+        self.stats["builds"] += 1
+        self.stats["last_build_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        logger.info(
+            "Storefront home rebuilt in %sms (%s bytes)",
+            self.stats["last_build_ms"],
+            len(body),
+        )
+        return built
+
+
+home_bundle = HomeBundle()
+on_catalog_change(home_bundle.invalidate)
@@ -0,0 +1,174 @@
+"""
+Tracing por request: conta e cronometra cada comando Mongo feito durante o
+tratamento de um request.
+
+O trace vive numa ContextVar. O Motor copia o contexto para as threads do
+executor, por isso o TraceCommandListener (que corre nessas threads) vê o
+mesmo objeto RequestTrace do request que originou o comando.
+"""
+from contextvars import ContextVar
+from typing import Optional, Dict, Any, List
+import logging
+import os
+import threading
+import time
+
+from pymongo import monitoring
+
+from metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+# limiares para o aviso de request "pesado" (N+1, queries lentas)
+TRACE_MAX_DB_CALLS = int(os.environ.get("TRACE_MAX_DB_CALLS", 15))
+TRACE_MAX_DB_MS = float(os.environ.get("TRACE_MAX_DB_MS", 250))
+# nº máximo de formas de query guardadas por request
+TRACE_MAX_SHAPES = 50
+
+
+class RequestTrace:
+    __slots__ = ("lock", "db_calls", "db_ms", "shapes", "_started")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.db_calls = 0
+        self.db_ms = 0.0
+        self.shapes: List[str] = []
+        self._started: Dict[int, str] = {}
+
+    def command_started(self, request_id: int, shape: str) -> None:
+        with self.lock:
+            self._started[request_id] = shape
+
+    def command_finished(self, request_id: int, duration_ms: float) -> None:
+        with self.lock:
+            shape = self._started.pop(request_id, None)
+            if shape is None:
+                return
+            self.db_calls += 1
+            self.db_ms += duration_ms
+            if len(self.shapes) < TRACE_MAX_SHAPES:
+                self.shapes.append(f"{shape} {duration_ms:.1f}ms")
+
+
+current_trace: ContextVar[Optional[RequestTrace]] = ContextVar(
+    "current_trace", default=None
+)
+
+
+def _filter_shape(value: Any) -> Any:
+    """Mantém só a estrutura (chaves/operadores), sem os valores."""
+    if isinstance(value, dict):
+        return {key: _filter_shape(v) for key, v in value.items()}
+    if isinstance(value, list) and value and isinstance(value[0], dict):
+        return [_filter_shape(v) for v in value]
+    return "?"
+
+
+def query_shape(command_name: str, command: Dict[str, Any]) -> str:
+    collection = command.get(command_name)
+    if not isinstance(collection, str):
+        collection = command.get("collection", "")
+    if command_name == "find":
+        spec = command.get("filter", {})
+    elif command_name in ("update", "delete"):
+        ops = command.get("updates") or command.get("deletes") or [{}]
+        spec = ops[0].get("q", {})
+    elif command_name == "findAndModify":
+        spec = command.get("query", {})
+    elif command_name in ("count", "distinct"):
+        spec = command.get("query", {})
+    elif command_name == "aggregate":
+        spec = [next(iter(stage)) for stage in command.get("pipeline", [])]
+    else:
+        spec = {}
+    if isinstance(spec, dict):
+        spec = _filter_shape(spec)
+    return f"{command_name} {collection} {spec}"
+
+
+class TraceCommandListener(monitoring.CommandListener):
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        trace = current_trace.get()
+        if trace is not None:
+            trace.command_started(
+                event.request_id, query_shape(event.command_name, event.command)
+            )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        trace = current_trace.get()
+        if trace is not None:
+            trace.command_finished(event.request_id, event.duration_micros / 1000)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        trace = current_trace.get()
+        if trace is not None:
+            trace.command_finished(event.request_id, event.duration_micros / 1000)
+
+
+class TracingMiddleware:
+    """
+    Abre um RequestTrace por request, devolve os totais no header
+    `Server-Timing` e regista-os como campos estruturados no log.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace()
+        token = current_trace.set(trace)
+        started = time.perf_counter()
+        status_holder = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+                total_ms = (time.perf_counter() - started) * 1000
+                timing = (
+                    f'db;dur={trace.db_ms:.1f};desc="{trace.db_calls} calls", '
+                    f"total;dur={total_ms:.1f}"
+                )
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (b"server-timing", timing.encode("latin-1")),
+                    ],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_trace.reset(token)
+            self._report(scope, status_holder[0], trace, started)
+
+    @staticmethod
+    def _report(scope, status_code: int, trace: RequestTrace, started: float) -> None:
+        duration_ms = (time.perf_counter() - started) * 1000
+        route = route_template(scope)
+        fields = {
+            "method": scope["method"],
+            "route": route,
+            "status": status_code,
+            "duration_ms": round(duration_ms, 2),
+            "db_calls": trace.db_calls,
+            "db_ms": round(trace.db_ms, 2),
+        }
+
+        if trace.db_calls > TRACE_MAX_DB_CALLS or trace.db_ms > TRACE_MAX_DB_MS:
+            logger.warning(
+                "Heavy request %s %s: %d DB calls, %.1fms in DB",
+                scope["method"],
+                route,
+                trace.db_calls,
+                trace.db_ms,
+                extra={**fields, "query_shapes": trace.shapes},
+            )
+        else:
+            logger.info("%s %s %s", scope["method"], route, status_code, extra=fields)
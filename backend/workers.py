@@ -0,0 +1,308 @@
+"""
+Workers em background (asyncio) arrancados no startup da API.
+
+ReconciliationWorker: expira referências Multicaixa vencidas e pedidos
+abandonados, em lotes limitados por tick para não competir com o tráfego.
+Com vários processos da API só um varre de cada vez: o tick corre sob o
+lease `meta.reconciliation_lease` (o mesmo esquema do RecommendationsJob).
+"""
+from typing import Optional, Dict, Any, List
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import os
+import socket
+import time
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from database import (
+    meta_collection,
+    orders_collection,
+    payments_collection,
+    products_collection,
+)
+from order_states import allowed_sources, history_entry, history_push
+
+logger = logging.getLogger(__name__)
+
+EXPIRED_STATUS = "expired"
+LEASE_ID = "reconciliation_lease"
+
+
+class ReconciliationWorker:
+    """
+    Varre periodicamente pagamentos pendentes com `expires_at` no passado e
+    pedidos pendentes há demasiado tempo, marcando-os como expirados um a um
+    (find_one_and_update) e devolvendo ao stock só os itens dos pedidos que
+    este tick efetivamente expirou.
+    """
+
+    def __init__(
+        self,
+        interval_seconds: float = 60.0,
+        batch_size: int = 200,
+        max_batches_per_tick: int = 5,
+        abandon_after: timedelta = timedelta(days=3),
+        lease_seconds: float = 300.0,
+        owner: Optional[str] = None,
+    ):
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.max_batches_per_tick = max_batches_per_tick
+        self.abandon_after = abandon_after
+        self.lease_seconds = lease_seconds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self._task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, Any] = {
+            "runs": 0,
+            "skipped_runs": 0,
+            "last_run_at": None,
+            "last_duration_ms": None,
+            "max_duration_ms": 0.0,
+            "expired_payments": 0,
+            "expired_orders": 0,
+            "released_items": 0,
+            "last_error": None,
+        }
+
+    @classmethod
+    def from_env(cls) -> "ReconciliationWorker":
+        return cls(
+            interval_seconds=float(os.environ.get("RECONCILE_INTERVAL_SECONDS", 60)),
+            batch_size=int(os.environ.get("RECONCILE_BATCH_SIZE", 200)),
+            max_batches_per_tick=int(os.environ.get("RECONCILE_MAX_BATCHES", 5)),
+            abandon_after=timedelta(
+                hours=float(os.environ.get("ORDER_ABANDON_AFTER_HOURS", 72))
+            ),
+            lease_seconds=float(os.environ.get("RECONCILE_LEASE_SECONDS", 300)),
+        )
+
+    # -----------------------------------------------------------------
+    # ciclo de vida
+    # -----------------------------------------------------------------
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="reconciliation-worker")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["last_error"] = str(e)
+                logger.error("Reconciliation tick failed: %s", e)
+            await asyncio.sleep(self.interval_seconds)
+
+    # -----------------------------------------------------------------
+    # lease
+    # -----------------------------------------------------------------
+    async def _acquire_lease(self) -> bool:
+        """Fica com o lease se estiver livre, expirado ou já for deste processo."""
+        now = datetime.utcnow()
+        try:
+            lease = await meta_collection.find_one_and_update(
+                {
+                    "_id": LEASE_ID,
+                    "$or": [{"expires_at": {"$lt": now}}, {"owner": self.owner}],
+                },
+                {
+                    "$set": {
+                        "owner": self.owner,
+                        "expires_at": now + timedelta(seconds=self.lease_seconds),
+                    }
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # o lease existe e é de outro processo: o upsert colide no _id
+            return False
+        return lease is not None
+
+    async def _release_lease(self) -> None:
+        await meta_collection.update_one(
+            {"_id": LEASE_ID, "owner": self.owner},
+            {"$set": {"expires_at": datetime.utcnow()}},
+        )
+
+    # -----------------------------------------------------------------
+    # sweep
+    # -----------------------------------------------------------------
+    async def run_once(self) -> Dict[str, int]:
+        """
+        Executa um tick completo (limitado a `max_batches_per_tick` lotes).
+        Sem o lease não faz nada: outro processo está a varrer.
+        """
+        totals = {"expired_payments": 0, "expired_orders": 0, "released_items": 0}
+        if not await self._acquire_lease():
+            self.stats["skipped_runs"] += 1
+            return totals
+
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        try:
+            for _ in range(self.max_batches_per_tick):
+                done = await self._expire_payments_batch(now, totals)
+                if done < self.batch_size:
+                    break
+                await asyncio.sleep(0)
+
+            for _ in range(self.max_batches_per_tick):
+                done = await self._expire_abandoned_orders_batch(now, totals)
+                if done < self.batch_size:
+                    break
+                await asyncio.sleep(0)
+        finally:
+            await self._release_lease()
+
+        duration_ms = (time.perf_counter() - started) * 1000
+        self.stats["runs"] += 1
+        self.stats["last_run_at"] = now.isoformat()
+        self.stats["last_duration_ms"] = round(duration_ms, 2)
+        self.stats["max_duration_ms"] = max(
+            self.stats["max_duration_ms"], round(duration_ms, 2)
+        )
+        self.stats["last_error"] = None
+        for key, value in totals.items():
+            self.stats[key] += value
+
+        if any(totals.values()):
+            logger.info(
+                "Reconciliation: %d payments, %d orders expired in %.1fms",
+                totals["expired_payments"],
+                totals["expired_orders"],
+                duration_ms,
+                extra=totals,
+            )
+        return totals
+
+    async def _expire_payments_batch(self, now: datetime, totals: Dict[str, int]) -> int:
+        cursor = payments_collection.find(
+            {"status": "pending", "expires_at": {"$lt": now}},
+            {"_id": 0, "transaction_id": 1, "order_number": 1},
+        ).limit(self.batch_size)
+        expired = await cursor.to_list(self.batch_size)
+        if not expired:
+            return 0
+
+        result = await payments_collection.update_many(
+            {
+                "transaction_id": {"$in": [p["transaction_id"] for p in expired]},
+                "status": "pending",
+            },
+            {"$set": {"status": EXPIRED_STATUS, "updated_at": now}},
+        )
+        totals["expired_payments"] += result.modified_count
+
+        order_numbers = list({p["order_number"] for p in expired})
+        await self._expire_orders(order_numbers, now, totals)
+        return len(expired)
+
+    async def _expire_abandoned_orders_batch(
+        self, now: datetime, totals: Dict[str, int]
+    ) -> int:
+        # mesmo filtro de estado que _expire_orders: sem ele, pedidos já
+        # confirmados e por pagar enchem o lote e nunca saem dele
+        cursor = orders_collection.find(
+            {
+                "status": {"$in": allowed_sources(EXPIRED_STATUS)},
+                "payment_status": "pending",
+                "created_at": {"$lt": now - self.abandon_after},
+                "payment_expires_at": {"$not": {"$gt": now}},
+            },
+            {"_id": 0, "order_number": 1},
+        ).limit(self.batch_size)
+        abandoned = await cursor.to_list(self.batch_size)
+        if not abandoned:
+            return 0
+
+        await self._expire_orders(
+            [o["order_number"] for o in abandoned], now, totals
+        )
+        return len(abandoned)
+
+    async def _expire_orders(
+        self, order_numbers: List[str], now: datetime, totals: Dict[str, int]
+    ) -> None:
+        guard = {
+            # pedidos já confirmados/enviados pelo admin não expiram
+            "status": {"$in": allowed_sources(EXPIRED_STATUS)},
+            "payment_status": "pending",
+            # o pedido pode já ter uma referência nova ainda válida
+            "payment_expires_at": {"$not": {"$gt": now}},
+        }
+        update = {
+            "$set": {
+                "status": EXPIRED_STATUS,
+                "payment_status": EXPIRED_STATUS,
+                "stock_reserved": False,
+                "updated_at": now,
+            },
+            "$push": history_push(
+                history_entry(
+                    EXPIRED_STATUS, EXPIRED_STATUS, by="reconciliation", at=now
+                )
+            ),
+        }
+
+        # um pedido de cada vez: o documento devolvido (antes da alteração) diz
+        # se fomos nós a expirá-lo e se ainda tinha stock reservado, por isso o
+        # stock devolvido corresponde exatamente aos pedidos expirados aqui
+        reserved: List[Dict[str, Any]] = []
+        for order_number in order_numbers:
+            before = await orders_collection.find_one_and_update(
+                {"order_number": order_number, **guard},
+                update,
+                projection={"_id": 0, "stock_reserved": 1, "items": 1},
+                return_document=ReturnDocument.BEFORE,
+            )
+            if before is None:
+                continue
+            totals["expired_orders"] += 1
+            if before.get("stock_reserved"):
+                reserved.append(before)
+
+        if reserved:
+            totals["released_items"] += await self._release_stock(reserved)
+
+    async def _release_stock(self, orders: List[Dict[str, Any]]) -> int:
+        quantities: Dict[str, int] = {}
+        for order in orders:
+            for item in order.get("items", []):
+                product_id = item.get("product_id")
+                if product_id:
+                    quantities[product_id] = quantities.get(product_id, 0) + int(
+                        item.get("quantity", 0)
+                    )
+        if not quantities:
+            return 0
+
+        await products_collection.bulk_write(
+            [
+                UpdateOne({"id": product_id}, {"$inc": {"stock": qty}})
+                for product_id, qty in quantities.items()
+            ],
+            ordered=False,
+        )
+        return sum(quantities.values())
+
+
+reconciliation_worker = ReconciliationWorker.from_env()
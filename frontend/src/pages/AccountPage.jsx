@@ -162,6 +162,8 @@ const AccountPage = () => {
   const [orders, setOrders] = useState([]);
   const [ordersLoading, setOrdersLoading] = useState(false);
   const [ordersError, setOrdersError] = useState("");
+  const [ordersCursor, setOrdersCursor] = useState(null);
+  const [loadingMoreOrders, setLoadingMoreOrders] = useState(false);
 
   const [personalForm, setPersonalForm] = useState({
     name: "",
@@ -233,17 +235,13 @@ const AccountPage = () => {
       setOrdersError("");
 
       try {
-        const data = await getMyOrders({
+        // só a primeira página; as seguintes vêm com "Carregar mais"
+        const page = await getMyOrders({
           user_id: user?.id,
           email: user?.email,
         });
-        const normalized = Array.isArray(data) ? data : [];
-        normalized.sort((a, b) => {
-          const dateA = new Date(a.created_at || a.createdAt || a.date || 0);
-          const dateB = new Date(b.created_at || b.createdAt || b.date || 0);
-          return dateB - dateA;
-        });
-        setOrders(normalized);
+        setOrders(page.orders);
+        setOrdersCursor(page.next_cursor);
       } catch (err) {
         console.error("[AccountPage] Erro ao carregar pedidos:", err);
         setOrdersError(
@@ -261,6 +259,26 @@ const AccountPage = () => {
     fetchOrders();
   }, [isAuthenticated, user]);
 
+  const loadMoreOrders = async () => {
+    if (!ordersCursor || loadingMoreOrders) return;
+    setLoadingMoreOrders(true);
+    try {
+      const page = await getMyOrders({
+        user_id: user?.id,
+        email: user?.email,
+        cursor: ordersCursor,
+      });
+      // a API já devolve do mais recente para o mais antigo
+      setOrders((current) => [...current, ...page.orders]);
+      setOrdersCursor(page.next_cursor);
+    } catch (err) {
+      console.error("[AccountPage] Erro ao carregar mais pedidos:", err);
+      setOrdersError("Não foi possível carregar mais pedidos.");
+    } finally {
+      setLoadingMoreOrders(false);
+    }
+  };
+
   const recentOrders = useMemo(() => orders.slice(0, 3), [orders]);
   const oldOrders = useMemo(() => orders.slice(3), [orders]);
 
@@ -1096,6 +1114,18 @@ const AccountPage = () => {
                   oldOrders,
                   "Ainda não há pedidos antigos. Assim que fizeres mais compras eles aparecerão aqui."
                 )}
+                {ordersCursor && !ordersLoading && (
+                  <div className="mt-4 flex justify-center">
+                    <Button
+                      variant="outline"
+                      onClick={loadMoreOrders}
+                      disabled={loadingMoreOrders}
+                      className="text-xs"
+                    >
+                      {loadingMoreOrders ? "A carregar..." : "Carregar mais pedidos"}
+                    </Button>
+                  </div>
+                )}
               </div>
             )}
 
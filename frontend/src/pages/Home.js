@@ -19,7 +19,7 @@ import { Button } from "../components/ui/button";
 import { Card, CardContent } from "../components/ui/card";
 import { useCart } from "../context/CartContext";
 import useScrollReveal from "../hooks/useScrollReveal";
-import { getCategories, getProducts } from "../services/api";
+import { getStorefrontHome } from "../services/api";
 
 const heroBackgrounds = [
   "https://images.unsplash.com/photo-1504704911898-68304a7d2807?auto=format&fit=crop&w=1600&q=80",
@@ -112,19 +112,19 @@ const Home = () => {
   const [activeGalleryIndex, setActiveGalleryIndex] = useState(0);
 
   useEffect(() => {
-    const normalizeArray = (value) => (Array.isArray(value) ? value : []);
-
     (async () => {
       try {
-        const [c, f, p] = await Promise.all([
-          getCategories(),
-          getProducts({ featured: true }),
-          getProducts(),
-        ]);
-
-        setCats(normalizeArray(c));
-        setFeatured(normalizeArray(f));
-        setAllProducts(normalizeArray(p));
+        const home = await getStorefrontHome();
+
+        // novidades primeiro, depois promoções e destaques, sem repetidos
+        const seen = new Set();
+        const products = [...home.new, ...home.promo, ...home.featured].filter(
+          (product) => !seen.has(product.id) && seen.add(product.id)
+        );
+
+        setCats(home.categories);
+        setFeatured(home.featured);
+        setAllProducts(products);
       } catch (err) {
         console.error(err);
         setError("Falha ao carregar dados.");
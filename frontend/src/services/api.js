@@ -155,6 +155,23 @@ export const getProductById = async (id) => {
   }
 };
 
+// página inicial numa só chamada: categorias + secções featured/new/promo
+// (o browser revalida com o ETag e recebe 304 se o catálogo não mudou)
+export const getStorefrontHome = async () => {
+  try {
+    const res = await api.get("/storefront/home");
+    return {
+      categories: res.data?.categories || [],
+      featured: res.data?.featured || [],
+      new: res.data?.new || [],
+      promo: res.data?.promo || [],
+    };
+  } catch (err) {
+    logApiError("getStorefrontHome", err);
+    throw err;
+  }
+};
+
 // -------------------------------- PEDIDOS --------------------------------- //
 
 export const createOrder = async (orderData) => {
@@ -182,18 +199,27 @@ export const getOrderByNumber = async (orderNumber) => {
   }
 };
 
+// uma página de cada vez: { orders, next_cursor } (next_cursor null no fim)
 export const getMyOrders = async (options = {}) => {
   try {
     const auth = getStoredAuth();
     const params = {
       user_id: options.user_id || auth?.user?.id,
       email: options.email || auth?.user?.email,
+      limit: options.limit,
+      cursor: options.cursor,
     };
     const sanitizedParams = Object.fromEntries(
       Object.entries(params).filter(([, value]) => !!value)
     );
     const res = await api.get("/orders/my", { params: sanitizedParams });
-    return Array.isArray(res.data) ? res.data : res.data?.orders || [];
+    if (Array.isArray(res.data)) {
+      return { orders: res.data, next_cursor: null };
+    }
+    return {
+      orders: res.data?.orders || [],
+      next_cursor: res.data?.next_cursor || null,
+    };
   } catch (err) {
     logApiError("getMyOrders", err);
     throw err;
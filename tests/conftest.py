@@ -0,0 +1,95 @@
+"""
+Fixtures partilhadas.
+
+Os testes correm sem MongoDB: o cliente Motor é trocado pelo
+mongomock-motor antes de importar `database`, e as rotas que usam os
+repositórios correm com o backend em memória (REPOSITORY_BACKEND=memory).
+"""
+from pathlib import Path
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "lrstore_tests")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import mongomock_motor  # noqa: E402
+import motor.motor_asyncio  # noqa: E402
+
+motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db():
+    """Base de dados (mongomock) vazia no início de cada teste."""
+    from database import db as database
+
+    for name in await database.list_collection_names():
+        await database.drop_collection(name)
+    yield database
+
+
+@pytest.fixture
+async def repos(db):
+    """Repositórios em memória + caches locais limpos."""
+    from cache_sync import invalidate_all
+    from repositories import repos as registry
+
+    registry.configure("memory")
+    invalidate_all("tests")
+    yield registry
+    registry.configure("motor")
+
+
+@pytest.fixture
+async def client(repos):
+    import httpx
+
+    from server import app, order_lookups
+
+    order_lookups.clear()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as c:
+        yield c
+
+
+@pytest.fixture
+def product_doc():
+    from models import Product
+    from seed_data import products_data
+
+    return Product(**products_data[0]).dict()
+
+
+def order_payload(product, user_id="u1", email="cliente@example.com", quantity=1):
+    return {
+        "user_id": user_id,
+        "customer": {
+            "name": "Cliente",
+            "email": email,
+            "phone": "923000000",
+            "address": "Rua 1",
+            "city": "Luanda",
+        },
+        "items": [
+            {
+                "product_id": product["id"],
+                "name": product["name"],
+                "quantity": quantity,
+                "price": product["price"],
+                "image": product["image"],
+            }
+        ],
+        "payment_method": "multicaixa-reference",
+        "total": product["price"] * quantity,
+    }
@@ -0,0 +1,97 @@
+"""Arquivo de pedidos (archiving.py) e números de pedido já arquivados."""
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+import checkout
+from archiving import OrderArchiver
+from repositories import repos as registry
+from tests.conftest import order_payload
+
+pytestmark = pytest.mark.anyio
+
+OLD = datetime.utcnow() - timedelta(days=400)
+
+
+def _order(number, status, payment_status="paid", total=10.0, updated_at=OLD):
+    return {
+        "order_number": number,
+        "status": status,
+        "payment_status": payment_status,
+        "total": total,
+        "items": [{"product_id": "p1", "quantity": 2, "price": total / 2}],
+        "owner_keys": ["user:u1"],
+        "created_at": updated_at,
+        "updated_at": updated_at,
+    }
+
+
+async def test_archiver_moves_only_old_terminal_orders(db):
+    await db.orders.insert_many(
+        [
+            _order("100001", "delivered"),
+            _order("100002", "confirmed"),
+            _order("100003", "cancelled", updated_at=datetime.utcnow()),
+        ]
+    )
+    await db.payments.insert_one({"transaction_id": "T1", "order_number": "100001"})
+
+    totals = await OrderArchiver(batch_size=1).run_once(report=False)
+
+    assert (totals["archived_orders"], totals["archived_payments"]) == (1, 1)
+    assert await db.orders_archive.count_documents({"order_number": "100001"}) == 1
+    assert await db.payments_archive.count_documents({"transaction_id": "T1"}) == 1
+    assert sorted(await db.orders.distinct("order_number")) == ["100002", "100003"]
+    # as leituras por número caem para o arquivo
+    assert (await registry.orders.get("100001"))["status"] == "delivered"
+
+
+async def test_checkout_retries_on_order_number_collision(
+    client, repos, product_doc, monkeypatch
+):
+    await repos.products.store.insert_one(product_doc)
+    await repos.orders.store.insert_one(_order("1111111111", "pending"))
+    numbers = iter(["1111111111", "2222222222"])
+    monkeypatch.setattr(checkout, "_allocate_number", lambda: next(numbers))
+
+    response = await client.post("/api/orders", json=order_payload(product_doc))
+
+    assert response.json()["order"]["order_number"] == "2222222222"
+
+
+def test_order_numbers_have_ten_digits():
+    assert all(len(checkout._allocate_number()) == 10 for _ in range(100))
+
+
+async def test_checkout_gives_up_after_repeated_collisions(
+    client, repos, product_doc, monkeypatch
+):
+    await repos.products.store.insert_one(product_doc)
+    await repos.orders.store.insert_one(_order("333333", "pending"))
+    monkeypatch.setattr(checkout, "_allocate_number", lambda: "333333")
+
+    response = await client.post("/api/orders", json=order_payload(product_doc))
+    assert response.status_code == 500
+
+
+async def test_dashboard_counts_archived_orders(db):
+    from server import app
+
+    await db.users.insert_one({"id": "admin", "name": "Admin", "email": "admin@x.ao", "is_admin": True})
+    await db.products.insert_one({"id": "p1", "name": "Copo"})
+    await db.orders.insert_one(_order("1", "confirmed", total=10.0))
+    await db.orders_archive.insert_one(_order("2", "delivered", total=30.0))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+        response = await c.get(
+            "/api/admin/dashboard/summary",
+            headers={"X-User-Id": "admin", "X-Is-Admin": "true"},
+        )
+
+    summary = response.json()
+    assert summary["total_orders"] == 2
+    assert summary["total_revenue"] == 40.0
+    assert summary["orders_by_status"]["delivered"] == 1
+    assert summary["top_products"][0]["count"] == 4
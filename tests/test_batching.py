@@ -0,0 +1,70 @@
+"""BufferedWriter (batching.py)."""
+import pytest
+
+from batching import BufferedWriter
+
+pytestmark = pytest.mark.anyio
+
+
+class ListWriter(BufferedWriter):
+    def __init__(self, fail_times=0, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+        self.fail_times = fail_times
+
+    async def write_batch(self, batch):
+        if self.fail_times:
+            self.fail_times -= 1
+            raise RuntimeError("db down")
+        self.batches.append([doc["n"] for doc in batch])
+        return len(batch)
+
+
+def test_write_batch_is_abstract():
+    with pytest.raises(TypeError):
+        BufferedWriter()
+
+
+async def test_flush_writes_in_batches():
+    writer = ListWriter(batch_size=2)
+    for n in range(5):
+        writer.submit({"n": n})
+
+    assert await writer.flush() == 5
+    assert writer.batches == [[0, 1], [2, 3], [4]]
+    assert writer.stats["flushed"] == 5
+
+
+@pytest.mark.parametrize(
+    "policy, kept", [("drop_oldest", [1, 2]), ("drop_newest", [0, 1])]
+)
+async def test_overflow_policy(policy, kept):
+    writer = ListWriter(batch_size=10, max_buffer=2, overflow_policy=policy)
+    for n in range(3):
+        writer.submit({"n": n})
+
+    await writer.flush()
+    assert writer.batches == [kept]
+    assert writer.stats["dropped"] == 1
+
+
+async def test_failed_batch_is_requeued_in_order():
+    writer = ListWriter(fail_times=1, batch_size=2)
+    for n in range(3):
+        writer.submit({"n": n})
+
+    assert await writer.flush() == 0
+    assert writer.buffered == 3
+    assert writer.stats["flush_errors"] == 1
+
+    assert await writer.flush() == 3
+    assert writer.batches == [[0, 1], [2]]
+
+
+async def test_stop_flushes_remaining_documents():
+    writer = ListWriter(batch_size=10, flush_interval=60)
+    writer.start()
+    writer.submit({"n": 1})
+
+    await writer.stop()
+    assert writer.batches == [[1]]
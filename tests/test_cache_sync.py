@@ -0,0 +1,106 @@
+"""ChangeWatcher (cache_sync.py): resume token e fallback para polling."""
+import asyncio
+
+import pytest
+from pymongo.errors import OperationFailure
+
+import cache_sync
+import catalog_cache
+from cache_sync import ChangeWatcher
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeStream:
+    """Change stream que entrega `events` e depois fecha."""
+
+    def __init__(self, events):
+        self.events = list(events)
+        self.resume_token = None
+        self.alive = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def try_next(self):
+        if not self.events:
+            self.alive = False
+            return None
+        event = self.events.pop(0)
+        self.resume_token = event["_id"]
+        return event
+
+
+class FakeDatabase:
+    def __init__(self, stream=None, error=None):
+        self.stream = stream
+        self.error = error
+        self.resumed_from = []
+
+    def watch(self, pipeline, resume_after=None):
+        self.resumed_from.append(resume_after)
+        if self.error is not None:
+            raise self.error
+        return self.stream
+
+
+def _event(token, collection):
+    return {"_id": token, "operationType": "update", "ns": {"coll": collection}}
+
+
+async def test_watch_resumes_from_saved_token_and_saves_the_new_one(
+    db, monkeypatch
+):
+    received = []
+    monkeypatch.setattr(cache_sync, "_listeners", {"users": [received.append]})
+    fake = FakeDatabase(FakeStream([_event({"_data": "2"}, "users")]))
+    monkeypatch.setattr(cache_sync, "db", fake)
+    await db.meta.insert_one(
+        {"_id": "change_stream:pod-1", "token": {"_data": "1"}}
+    )
+    watcher = ChangeWatcher("pod-1", token_save_interval=0)
+
+    await watcher._watch()
+
+    assert fake.resumed_from == [{"_data": "1"}]
+    assert watcher.stats["resumed"] and watcher.stats["events"] == 1
+    assert [event["_id"] for event in received] == [{"_data": "2"}]
+    marker = await db.meta.find_one({"_id": "change_stream:pod-1"})
+    assert marker["token"] == {"_data": "2"}
+
+
+async def test_falls_back_to_polling_without_replica_set(db, monkeypatch):
+    reasons = []
+    monkeypatch.setattr(catalog_cache, "_listeners", [reasons.append])
+    monkeypatch.setitem(catalog_cache.catalog_state, "version", 0)
+    monkeypatch.setattr(
+        cache_sync,
+        "db",
+        FakeDatabase(error=OperationFailure("not a replica set", code=40573)),
+    )
+    await db.meta.insert_one({"_id": "catalog", "version": 3})
+    watcher = ChangeWatcher("pod-1", poll_interval=0.01)
+
+    watcher.start()
+    try:
+        for _ in range(100):
+            if watcher.stats["polls"]:
+                break
+            await asyncio.sleep(0.01)
+        assert watcher.mode == "polling"
+        assert catalog_cache.catalog_state["version"] == 3
+        assert reasons == ["catalog.poll"]
+
+        # outro worker mudou o catálogo: o próximo poll invalida outra vez
+        await db.meta.update_one({"_id": "catalog"}, {"$set": {"version": 4}})
+        for _ in range(100):
+            if catalog_cache.catalog_state["version"] == 4:
+                break
+            await asyncio.sleep(0.01)
+        assert reasons == ["catalog.poll", "catalog.poll"]
+    finally:
+        await watcher.stop()
+    assert watcher.mode == "stopped"
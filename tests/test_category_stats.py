@@ -0,0 +1,60 @@
+"""Estatísticas por categoria (category_stats.py) sobre o mongomock."""
+import pytest
+
+from category_stats import CategoryStatsCache
+
+pytestmark = pytest.mark.anyio
+
+
+def _category(category_id, slug):
+    return {
+        "id": category_id,
+        "name": slug.title(),
+        "slug": slug,
+        "image": "https://example.com/c.jpg",
+        "description": "",
+    }
+
+
+def _product(product_id, category, price, stock):
+    return {"id": product_id, "category": category, "price": price, "stock": stock}
+
+
+async def test_stats_merge_products_stored_by_slug_and_by_id(db):
+    await db.categories.insert_many(
+        [
+            _category("cat-1", "baloes"),
+            _category("cat-2", "velas"),
+            {"id": "cat-3", "name": "Sem slug"},
+        ]
+    )
+    await db.products.insert_many(
+        [
+            _product("p1", "baloes", 5.0, 10),
+            _product("p2", "cat-1", 12.5, 0),
+            _product("p3", "cat-1", 2.0, 1),
+            _product("p4", "outra", 99.0, 1),
+        ]
+    )
+
+    stats = {c.slug: c for c in await CategoryStatsCache().get()}
+
+    # a categoria inválida (sem slug) é ignorada, as outras aparecem todas
+    assert sorted(stats) == ["baloes", "velas"]
+    baloes = stats["baloes"]
+    assert (baloes.product_count, baloes.in_stock_count) == (3, 2)
+    assert (baloes.min_price, baloes.max_price) == (2.0, 12.5)
+    velas = stats["velas"]
+    assert (velas.product_count, velas.min_price, velas.max_price) == (0, None, None)
+
+
+async def test_stats_are_cached_until_invalidated(db):
+    await db.categories.insert_one(_category("cat-1", "baloes"))
+    cache = CategoryStatsCache()
+    assert (await cache.get())[0].product_count == 0
+
+    await db.products.insert_one(_product("p1", "baloes", 5.0, 1))
+    assert (await cache.get())[0].product_count == 0
+
+    cache.invalidate("product.create")
+    assert (await cache.get())[0].product_count == 1
@@ -0,0 +1,67 @@
+"""Pipeline de checkout (checkout.place_order) sobre os repositórios em memória."""
+import pytest
+from fastapi import HTTPException
+
+from checkout import place_order
+from models import OrderCreate
+from tests.conftest import order_payload
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def product(repos, product_doc):
+    await repos.products.store.insert_one({**product_doc, "stock": 3})
+    return product_doc
+
+
+def _order(product, lines=(1,), **overrides):
+    payload = order_payload(product, email="Cliente@Example.com ")
+    item = payload["items"][0]
+    payload["items"] = [{**item, "quantity": qty} for qty in lines]
+    for field, value in overrides.items():
+        for line in payload["items"]:
+            line[field] = value
+    return OrderCreate(**payload)
+
+
+async def test_items_are_repriced_from_the_catalog(repos, product):
+    order_data = _order(
+        product, lines=(1, 2), price=0.01, name="Outro nome", image="x.jpg"
+    )
+
+    order = await place_order(order_data)
+
+    assert order.total == round(product["price"] * 3, 2)
+    assert {(i.name, i.price, i.image) for i in order.items} == {
+        (product["name"], product["price"], product["image"])
+    }
+    assert order.customer.email == "cliente@example.com"
+    stored = await repos.orders.get(order.order_number)
+    assert stored["owner_keys"] == ["user:u1", "email:cliente@example.com"]
+
+
+async def test_stock_is_checked_against_the_sum_of_lines(repos, product):
+    # cada linha cabe no stock (3), a soma não
+    with pytest.raises(HTTPException) as error:
+        await place_order(_order(product, lines=(2, 2)))
+
+    assert error.value.status_code == 409
+    assert product["id"] in error.value.detail
+    assert await repos.orders.store.count({}) == 0
+
+
+async def test_unknown_product_is_a_bad_request(repos, product):
+    with pytest.raises(HTTPException) as error:
+        await place_order(_order({**product, "id": "nao-existe"}))
+
+    assert error.value.status_code == 400
+    assert error.value.detail == "Unknown products: nao-existe"
+    assert await repos.orders.store.count({}) == 0
+
+
+async def test_quantity_must_be_positive(repos, product):
+    with pytest.raises(HTTPException) as error:
+        await place_order(_order(product, lines=(0,)))
+
+    assert error.value.status_code == 400
@@ -0,0 +1,97 @@
+"""Reconciliação de índices (database.init_indexes)."""
+import pytest
+from pymongo import IndexModel
+
+import database
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def calls(db, monkeypatch):
+    """Regista, por ordem, os índices criados e removidos."""
+    recorded = []
+    cls = type(db["products"])
+    create_index = cls.create_index
+    create_indexes, drop_index = cls.create_indexes, cls.drop_index
+
+    async def spy_create_one(self, keys, *args, **kwargs):
+        recorded.append(("create", kwargs.get("name")))
+        return await create_index(self, keys, *args, **kwargs)
+
+    async def spy_create(self, models, *args, **kwargs):
+        recorded.extend(("create", m.document["name"]) for m in models)
+        return await create_indexes(self, models, *args, **kwargs)
+
+    async def spy_drop(self, name, *args, **kwargs):
+        recorded.append(("drop", name))
+        return await drop_index(self, name, *args, **kwargs)
+
+    monkeypatch.setattr(cls, "create_index", spy_create_one)
+    monkeypatch.setattr(cls, "create_indexes", spy_create)
+    monkeypatch.setattr(cls, "drop_index", spy_drop)
+    return recorded
+
+
+async def test_creates_replacements_before_dropping_redundant(db, calls):
+    await db.products.create_index("category")
+    calls.clear()
+    plan = [IndexModel([("category", 1), ("featured", 1)])]
+
+    await database._reconcile_collection("products", plan)
+
+    assert calls == [("create", "category_1_featured_1"), ("drop", "category_1")]
+    names = set(await db.products.index_information())
+    assert "category_1_featured_1" in names and "category_1" not in names
+
+
+async def test_changed_spec_keeps_a_copy_while_rebuilding(db, calls):
+    await db.orders.create_index("status", name="by_status")
+    calls.clear()
+
+    await database._reconcile_collection(
+        "orders", [IndexModel([("status", 1), ("created_at", -1)], name="by_status")]
+    )
+
+    assert calls == [
+        ("create", "by_status__rebuild"),
+        ("drop", "by_status"),
+        ("create", "by_status"),
+        ("drop", "by_status__rebuild"),
+    ]
+    info = await db.orders.index_information()
+    assert list(info["by_status"]["key"]) == [("status", 1), ("created_at", -1)]
+    assert "by_status__rebuild" not in info
+
+
+async def test_init_indexes_reports_through_the_logger(db, caplog):
+    caplog.set_level("INFO", logger="database")
+    await database.init_indexes()
+
+    assert database.index_state["done"] and database.index_state["error"] is None
+    assert "Database indexes reconciled" in caplog.text
+
+
+async def test_ttl_only_change_uses_coll_mod(db, calls, monkeypatch):
+    await db.activity_logs.create_index("created_at")
+    calls.clear()
+    commands = []
+
+    async def fake_command(self, name, value=1, **kwargs):
+        commands.append((name, value, kwargs))
+        return {"ok": 1.0}
+
+    monkeypatch.setattr(type(db), "command", fake_command)
+
+    await database._reconcile_collection(
+        "activity_logs", [IndexModel("created_at", expireAfterSeconds=3600)]
+    )
+
+    assert calls == []
+    assert commands == [
+        (
+            "collMod",
+            "activity_logs",
+            {"index": {"name": "created_at_1", "expireAfterSeconds": 3600}},
+        )
+    ]
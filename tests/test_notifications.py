@@ -0,0 +1,73 @@
+"""NotificationFanout: notificações em lote e contadores de não lidas."""
+import pytest
+from pymongo.errors import AutoReconnect
+
+import notifications
+from notifications import NotificationFanout, unread_count
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_batch_inserts_and_counts(db):
+    fanout = NotificationFanout(batch_size=10)
+    for n in range(3):
+        fanout.notify("u1", f"t{n}", "m")
+    fanout.notify(None, "convidado", "m")
+
+    assert await fanout.flush() == 3
+    assert await db.notifications.count_documents({"user_id": "u1"}) == 3
+    assert await unread_count("u1") == 3
+
+
+async def test_counter_failure_is_retried_without_requeueing(db, monkeypatch):
+    fanout = NotificationFanout(batch_size=10)
+    counters = notifications.notification_counters_collection
+    real_bulk_write = counters.bulk_write
+    down = {"value": True}
+
+    async def flaky_bulk_write(*args, **kwargs):
+        if down["value"]:
+            raise AutoReconnect("primary stepped down")
+        return await real_bulk_write(*args, **kwargs)
+
+    monkeypatch.setattr(counters, "bulk_write", flaky_bulk_write)
+    fanout.notify("u1", "t", "m")
+    fanout.notify("u2", "t", "m")
+
+    assert await fanout.flush() == 2
+    assert fanout.buffered == 0
+    assert await unread_count("u1") == 0
+
+    # o flush seguinte (sem notificações novas) grava os incrementos
+    down["value"] = False
+    await fanout.flush()
+    assert await unread_count("u1") == 1
+    assert await unread_count("u2") == 1
+    assert await db.notifications.count_documents({}) == 2
+
+
+async def test_batch_retried_after_failure_is_not_duplicated(db, monkeypatch):
+    await db.notifications.create_index("id", unique=True)
+    fanout = NotificationFanout(batch_size=10)
+    collection = notifications.notifications_collection
+    real_insert_many = collection.insert_many
+    calls = {"n": 0}
+
+    async def insert_then_fail(*args, **kwargs):
+        # a primeira tentativa grava mas a resposta perde-se
+        calls["n"] += 1
+        result = await real_insert_many(*args, **kwargs)
+        if calls["n"] == 1:
+            raise AutoReconnect("connection reset")
+        return result
+
+    monkeypatch.setattr(collection, "insert_many", insert_then_fail)
+    fanout.notify("u1", "t1", "m")
+    fanout.notify("u1", "t2", "m")
+
+    assert await fanout.flush() == 0
+    assert fanout.buffered == 2
+
+    assert await fanout.flush() == 2
+    assert await db.notifications.count_documents({}) == 2
+    assert await unread_count("u1") == 2
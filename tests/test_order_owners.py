@@ -0,0 +1,105 @@
+"""owner_keys e o backfill em background (order_owners.py)."""
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from order_owners import OwnerKeysBackfill, owner_keys
+
+pytestmark = pytest.mark.anyio
+
+OLD = datetime.utcnow() - timedelta(hours=1)
+
+
+def test_owner_keys_normalizes_email():
+    assert owner_keys("u1", " Ana@X.ao ") == ["user:u1", "email:ana@x.ao"]
+    assert owner_keys(None, None) == []
+
+
+def _legacy_order(n, user_id=None, email="ana@x.ao", at=OLD):
+    return {
+        "_id": ObjectId.from_datetime(at + timedelta(seconds=n)),
+        "order_number": str(n),
+        "user_id": user_id,
+        "customer": {"email": email},
+    }
+
+
+async def test_backfill_resumes_and_picks_up_later_orders(db):
+    await db.orders.insert_many(
+        [_legacy_order(n, user_id="u1") for n in range(5)]
+        + [{**_legacy_order(5), "owner_keys": ["email:ana@x.ao"]}]
+    )
+    backfill = OwnerKeysBackfill(db.orders, db.meta, batch_size=2)
+
+    totals = await backfill.run_once()
+    assert totals == {"scanned": 6, "updated": 5}
+    assert await db.orders.count_documents({"owner_keys": "user:u1"}) == 5
+
+    # um pod antigo grava um pedido sem owner_keys depois da passagem
+    await db.orders.insert_one(_legacy_order(10))
+    totals = await backfill.run_once()
+    assert totals == {"scanned": 1, "updated": 1}
+    order = await db.orders.find_one({"order_number": "10"})
+    assert order["owner_keys"] == ["email:ana@x.ao"]
+
+
+async def test_backfill_leaves_unsettled_ids_for_the_next_run(db):
+    await db.orders.insert_one(_legacy_order(0, at=datetime.utcnow()))
+
+    totals = await OwnerKeysBackfill(db.orders, db.meta).run_once()
+    assert totals["scanned"] == 0
+
+
+async def test_backfill_marks_done_once_and_calls_on_done(db):
+    calls = []
+
+    async def on_done():
+        calls.append(True)
+
+    await db.orders.insert_one(_legacy_order(0, user_id="u1"))
+    backfill = OwnerKeysBackfill(db.orders, db.meta, on_done=on_done)
+    assert not backfill.done
+
+    await backfill.run_once()
+    await backfill.run_once()
+    assert backfill.done and calls == [True]
+    assert (await db.meta.find_one({"_id": "owner_keys_backfill"}))["done_at"]
+    # outro processo lê o estado do marcador
+    other = OwnerKeysBackfill(db.orders, db.meta)
+    await other.run_once()
+    assert other.done
+
+
+async def test_my_orders_falls_back_to_legacy_fields(repos):
+    legacy = {
+        "order_number": "1",
+        "user_id": "u1",
+        "customer": {"email": "ana@x.ao"},
+        "created_at": OLD,
+    }
+    guest = {**legacy, "order_number": "2", "user_id": None}
+    await repos.orders.store.insert_many([legacy, guest])
+    keys = owner_keys("u1", "ana@x.ao")
+
+    assert await repos.orders.list_for_owner(keys, 10) == []
+    docs = await repos.orders.list_for_owner(keys, 10, legacy=True)
+    assert [d["order_number"] for d in docs] == ["2", "1"]
+    page = await repos.orders.list_for_owner(
+        keys, 10, before=(OLD, "2"), legacy=True
+    )
+    assert [d["order_number"] for d in page] == ["1"]
+    assert await repos.orders.get_for_owner("1", keys, legacy=True)
+
+
+async def test_legacy_owner_indexes_kept_until_backfill_done(db):
+    import database
+
+    await database.init_indexes()
+    assert "user_id_1_created_at_-1" in await db.orders.index_information()
+
+    await db.meta.insert_one({"_id": "owner_keys_backfill", "done_at": OLD})
+    await database.init_indexes()
+    info = await db.orders.index_information()
+    assert "user_id_1_created_at_-1" not in info
+    assert "customer.email_1_created_at_-1" not in info
@@ -0,0 +1,142 @@
+"""Máquina de estados (order_states.py) e a sua aplicação nos pagamentos."""
+import pytest
+
+from order_states import (
+    allowed_payment_sources,
+    allowed_sources,
+    can_transition,
+    transition_guard,
+)
+from tests.conftest import order_payload
+
+
+def test_transitions():
+    assert can_transition("new", "confirmed")
+    assert not can_transition("cancelled", "confirmed")
+    assert allowed_sources("expired") == ["pending"]
+    assert "expired" not in allowed_payment_sources("paid")
+
+
+def test_transition_guard_accepts_target_itself():
+    guard = transition_guard("confirmed", "paid")
+    assert guard["status"] == {"$in": ["pending", "confirmed"]}
+    assert guard["payment_status"] == {"$in": ["failed", "pending", "paid"]}
+
+
+@pytest.fixture
+async def reference(client, repos, product_doc):
+    await repos.products.store.insert_one(product_doc)
+    order = (
+        await client.post("/api/orders", json=order_payload(product_doc))
+    ).json()["order"]
+    response = await client.post(
+        "/api/payments/multicaixa/reference",
+        json={"order_number": order["order_number"], "amount": order["total"]},
+    )
+    assert response.status_code == 200
+    return order["order_number"], f"REF-{response.json()['reference']}"
+
+
+@pytest.mark.anyio
+async def test_pay_confirms_order_once(client, repos, reference):
+    order_number, transaction_id = reference
+
+    response = await client.post(f"/api/payments/mock/pay/{transaction_id}")
+    assert response.status_code == 200
+    order = await repos.orders.get(order_number)
+    assert (order["status"], order["payment_status"]) == ("confirmed", "paid")
+
+    again = await client.post(f"/api/payments/mock/pay/{transaction_id}")
+    assert again.status_code == 409
+    missing = await client.post("/api/payments/mock/pay/REF-000")
+    assert missing.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_pay_rejected_for_cancelled_order(client, repos, reference):
+    order_number, transaction_id = reference
+    await repos.orders.update_fields(order_number, {"$set": {"status": "cancelled"}})
+
+    response = await client.post(f"/api/payments/mock/pay/{transaction_id}")
+    assert response.status_code == 409
+    # compensação: o pagamento volta ao estado anterior
+    assert (await repos.payments.get(transaction_id))["status"] == "pending"
+    assert (await repos.orders.get(order_number))["status"] == "cancelled"
+
+
+@pytest.mark.anyio
+async def test_pay_rejected_for_expired_payment(client, repos, reference):
+    order_number, transaction_id = reference
+    await repos.payments.store.update_one(
+        {"transaction_id": transaction_id}, {"$set": {"status": "expired"}}
+    )
+
+    response = await client.post(f"/api/payments/mock/pay/{transaction_id}")
+    assert response.status_code == 409
+    assert (await repos.orders.get(order_number))["payment_status"] == "pending"
+
+
+@pytest.mark.anyio
+async def test_reference_on_paid_order_is_rejected(client, repos, reference):
+    order_number, transaction_id = reference
+    await client.post(f"/api/payments/mock/pay/{transaction_id}")
+
+    for path, body in (
+        ("/api/payments/multicaixa/reference", {"amount": 10}),
+        ("/api/payments/multicaixa/express", {"amount": 10, "phone": "923000000"}),
+    ):
+        response = await client.post(path, json={"order_number": order_number, **body})
+        assert response.status_code == 409
+
+    order = await repos.orders.get(order_number)
+    assert order["payment_status"] == "paid"
+    # a compensação remove os pagamentos recusados
+    assert await repos.payments.store.count({"order_number": order_number}) == 1
+
+
+@pytest.mark.anyio
+async def test_reference_for_unknown_order_is_404(client, repos):
+    response = await client.post(
+        "/api/payments/multicaixa/reference",
+        json={"order_number": "000000", "amount": 10},
+    )
+    assert response.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_bulk_status_applies_payment_guard(client, repos, product_doc):
+    await repos.products.store.insert_one(product_doc)
+    await repos.users.insert(
+        {"id": "admin", "name": "Admin", "email": "admin@x.ao", "is_admin": True}
+    )
+    numbers = [
+        (await client.post("/api/orders", json=order_payload(product_doc))).json()[
+            "order"
+        ]["order_number"]
+        for _ in range(2)
+    ]
+    await repos.orders.update_fields(
+        numbers[0], {"$set": {"status": "confirmed", "payment_status": "paid"}}
+    )
+
+    response = await client.post(
+        "/api/admin/orders/bulk-status",
+        json={
+            "order_numbers": numbers,
+            "status": "cancelled",
+            "payment_status": "refunded",
+        },
+        headers={"X-User-Id": "admin", "X-Is-Admin": "true"},
+    )
+
+    results = {r["order_number"]: r for r in response.json()["results"]}
+    assert results[numbers[0]]["outcome"] == "updated"
+    # pagamento ainda pendente: não pode passar a reembolsado
+    assert results[numbers[1]] == {
+        "order_number": numbers[1],
+        "outcome": "invalid_transition",
+        "from": "pending",
+        "payment_from": "pending",
+    }
+    assert (await repos.orders.get(numbers[0]))["payment_status"] == "refunded"
+    assert (await repos.orders.get(numbers[1]))["status"] == "pending"
@@ -0,0 +1,78 @@
+"""Importação de produtos em massa (product_import.py) sobre o mongomock."""
+import io
+import json
+
+import pytest
+
+from product_import import import_products
+
+pytestmark = pytest.mark.anyio
+
+
+def _row(product_id, **fields):
+    return {
+        "id": product_id,
+        "name": f"Produto {product_id}",
+        "category": "festa",
+        "price": 10.0,
+        "image": "https://example.com/p.jpg",
+        "description": "Descrição",
+        "stock": 5,
+        "colors": ["rosa"],
+        **fields,
+    }
+
+
+def _ndjson(*lines):
+    return io.BytesIO(
+        "\n".join(
+            line if isinstance(line, str) else json.dumps(line) for line in lines
+        ).encode("utf-8")
+    )
+
+
+async def test_csv_row_with_existing_id_is_a_partial_update(db):
+    await db.products.insert_one(_row("p1", stock=7))
+
+    report = await import_products(io.BytesIO(b"id,price\np1,12.5\n"), "csv")
+
+    assert (report.inserted, report.updated, report.error_count) == (0, 1, 0)
+    product = await db.products.find_one({"id": "p1"})
+    # só o preço muda; as outras colunas ficam como estavam
+    assert product["price"] == 12.5
+    assert product["stock"] == 7 and product["name"] == "Produto p1"
+
+
+async def test_duplicate_id_in_the_same_file_is_reported(db):
+    report = await import_products(
+        _ndjson(_row("p1"), _row("p1", price=99.0)), "ndjson"
+    )
+
+    assert (report.inserted, report.error_count) == (1, 1)
+    assert report.errors == [
+        {"row": 2, "id": "p1", "error": "Duplicate id in import."}
+    ]
+    assert (await db.products.find_one({"id": "p1"}))["price"] == 10.0
+
+
+async def test_invalid_rows_are_reported_without_stopping_the_import(db):
+    report = await import_products(
+        _ndjson(
+            _row("ok"),
+            "{nao é json",
+            _row("extra", colour="azul"),
+            _row("bad", price="caro"),
+            "[1, 2]",
+        ),
+        "ndjson",
+    )
+
+    assert report.dict()["processed"] == 5
+    assert report.inserted == 1
+    errors = {error["row"]: error for error in report.errors}
+    assert sorted(errors) == [2, 3, 4, 5]
+    assert errors[2]["error"].startswith("Invalid JSON")
+    assert errors[3] == {"row": 3, "id": "extra", "error": "Unknown columns: colour"}
+    assert errors[4]["id"] == "bad" and errors[4]["error"].startswith("price")
+    assert errors[5]["error"] == "Each line must be a JSON object."
+    assert await db.products.count_documents({}) == 1
@@ -0,0 +1,87 @@
+"""RecommendationsJob: contagens de pares e lease partilhado entre processos."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from recommendations import LEASE_ID, RecommendationsJob, merge_candidates
+
+pytestmark = pytest.mark.anyio
+
+OLD = datetime.utcnow() - timedelta(hours=1)
+
+
+def test_merge_candidates_keeps_strongest():
+    current = [{"id": "b", "n": 3}, {"id": "c", "n": 1}]
+    merged = merge_candidates(current, {"c": 5, "d": 1}, limit=2)
+    assert merged == [{"id": "c", "n": 6}, {"id": "b", "n": 3}]
+
+
+async def _seed_orders(db):
+    await db.orders.insert_many(
+        [
+            {
+                "order_number": str(n),
+                "status": "delivered",
+                "created_at": OLD + timedelta(seconds=n),
+                "items": [{"product_id": "a"}, {"product_id": "b"}],
+            }
+            for n in range(3)
+        ]
+    )
+
+
+async def _pair_count(db, product_id="a"):
+    doc = await db.product_recommendations.find_one({"product_id": product_id})
+    return {c["id"]: c["n"] for c in doc["candidates"]} if doc else {}
+
+
+async def test_counts_each_order_once_across_processes(db):
+    await _seed_orders(db)
+    first = RecommendationsJob(owner="pod-1")
+    second = RecommendationsJob(owner="pod-2")
+
+    assert (await first.run_once())["orders_scanned"] == 3
+    # o marcador é partilhado: o segundo processo não volta a somar
+    assert (await second.run_once())["orders_scanned"] == 0
+    assert await _pair_count(db) == {"b": 3}
+
+
+async def test_skips_run_while_another_process_holds_the_lease(db):
+    await _seed_orders(db)
+    await db.meta.insert_one(
+        {
+            "_id": LEASE_ID,
+            "owner": "pod-1",
+            "expires_at": datetime.utcnow() + timedelta(minutes=5),
+        }
+    )
+    job = RecommendationsJob(owner="pod-2")
+
+    assert (await job.run_once())["orders_scanned"] == 0
+    assert job.stats["skipped_runs"] == 1
+    assert await _pair_count(db) == {}
+
+    # lease expirado: o job volta a correr
+    await db.meta.update_one(
+        {"_id": LEASE_ID},
+        {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}},
+    )
+    assert (await job.run_once())["orders_scanned"] == 3
+    assert (await db.meta.find_one({"_id": LEASE_ID}))["owner"] == "pod-2"
+
+
+async def test_full_rebuild_also_counts_archived_orders(db):
+    await _seed_orders(db)
+    archived = await db.orders.find_one({"order_number": "0"})
+    await db.orders_archive.insert_one(archived)
+    await db.orders.delete_one({"order_number": "0"})
+    job = RecommendationsJob(owner="pod-1")
+    await job.run_once()
+
+    totals = await job.run_once(full=True)
+
+    assert totals["orders_scanned"] == 3
+    assert await _pair_count(db) == {"b": 3}
+    # incremental a seguir: o arquivo não volta a ser somado
+    assert (await job.run_once())["orders_scanned"] == 0
+    assert await _pair_count(db) == {"b": 3}
@@ -0,0 +1,189 @@
+"""
+InMemoryStore tem de se comportar como o MotorStore nos operadores que as
+rotas usam: os mesmos casos correm contra os dois stores (o MotorStore sobre
+uma coleção mongomock).
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from repositories import InMemoryStore, MotorStore
+
+pytestmark = pytest.mark.anyio
+
+T0 = datetime(2026, 1, 1)
+
+DOCS = [
+    {
+        "id": "a",
+        "name": "Copo",
+        "price": 10.0,
+        "stock": 0,
+        "tags": ["festa", "vidro"],
+        "customer": {"email": "a@x.ao"},
+        "created_at": T0,
+    },
+    {
+        "id": "b",
+        "name": "Tiara",
+        "price": 25.5,
+        "stock": 3,
+        "tags": ["festa"],
+        "customer": {"email": "b@x.ao"},
+        "created_at": T0 + timedelta(days=1),
+    },
+    {
+        "id": "c",
+        "name": "Óculos",
+        "price": 25.5,
+        "stock": 7,
+        "tags": [],
+        "created_at": T0 + timedelta(days=2),
+        "note": None,
+    },
+]
+
+
+@pytest.fixture(params=["memory", "motor"])
+async def store(request, db):
+    if request.param == "memory":
+        store = InMemoryStore("id")
+    else:
+        await db["repo_parity"].create_index("id", unique=True)
+        store = MotorStore(db["repo_parity"])
+    await store.insert_many([dict(doc) for doc in DOCS])
+    return store
+
+
+def _ids(docs):
+    return [doc["id"] for doc in docs]
+
+
+def _clean(doc):
+    return {k: v for k, v in doc.items() if k != "_id"} if doc else doc
+
+
+@pytest.mark.parametrize(
+    "filters, expected",
+    [
+        ({"id": "b"}, ["b"]),
+        ({"id": {"$in": ["a", "c", "zz"]}}, ["a", "c"]),
+        ({"id": {"$nin": ["a"]}}, ["b", "c"]),
+        ({"price": {"$gt": 10}}, ["b", "c"]),
+        ({"price": {"$gte": 10, "$lt": 25.5}}, ["a"]),
+        ({"price": {"$lte": 25.5}, "stock": {"$ne": 3}}, ["a", "c"]),
+        ({"tags": "festa"}, ["a", "b"]),
+        ({"tags": {"$in": ["vidro"]}}, ["a"]),
+        ({"customer.email": "b@x.ao"}, ["b"]),
+        ({"customer.email": {"$exists": False}}, ["c"]),
+        ({"note": None}, ["a", "b", "c"]),
+        ({"name": {"$regex": "^ti", "$options": "i"}}, ["b"]),
+        ({"stock": {"$not": {"$gt": 0}}}, ["a"]),
+        ({"$or": [{"id": "a"}, {"stock": {"$gt": 5}}]}, ["a", "c"]),
+        ({"$and": [{"price": 25.5}, {"stock": {"$lt": 5}}]}, ["b"]),
+        ({"created_at": {"$gt": T0}}, ["b", "c"]),
+    ],
+)
+async def test_find_filters(store, filters, expected):
+    assert sorted(_ids(await store.find(filters))) == expected
+    assert await store.count(filters) == len(expected)
+
+
+async def test_sort_skip_limit(store):
+    docs = await store.find({}, sort=[("price", -1), ("id", 1)], skip=1, limit=1)
+    assert _ids(docs) == ["c"]
+    assert _ids(await store.find({}, sort="created_at")) == ["a", "b", "c"]
+
+
+async def test_projection(store):
+    doc = await store.find_one({"id": "b"}, {"_id": 0, "id": 1, "price": 1})
+    assert doc == {"id": "b", "price": 25.5}
+    doc = await store.find_one({"id": "b"}, {"_id": 0, "tags": 0, "customer": 0})
+    assert "tags" not in doc and "customer" not in doc and doc["name"] == "Tiara"
+
+
+async def test_update_operators(store):
+    matched = await store.update_one(
+        {"id": "a"},
+        {
+            "$set": {"customer.email": "novo@x.ao"},
+            "$inc": {"stock": 2},
+            "$unset": {"tags": ""},
+            "$push": {"history": {"$each": [1, 2, 3], "$slice": -2}},
+        },
+    )
+    assert matched == 1
+    doc = _clean(await store.find_one({"id": "a"}))
+    assert doc["customer"] == {"email": "novo@x.ao"}
+    assert doc["stock"] == 2
+    assert "tags" not in doc
+    assert doc["history"] == [2, 3]
+
+    await store.update_one({"id": "a"}, {"$push": {"history": 4}})
+    assert (await store.find_one({"id": "a"}))["history"] == [2, 3, 4]
+
+
+async def test_update_many_and_guarded_update(store):
+    assert await store.update_many({"price": 25.5}, {"$set": {"stock": 1}}) == 2
+    assert await store.update_one({"id": "b", "stock": {"$gt": 5}}, {"$inc": {"stock": 1}}) == 0
+
+
+async def test_find_one_and_update_before_after_upsert(store):
+    before = await store.find_one_and_update(
+        {"id": "b"}, {"$inc": {"stock": 1}}, after=False
+    )
+    assert before["stock"] == 3
+    after = await store.find_one_and_update({"id": "b"}, {"$inc": {"stock": 1}})
+    assert after["stock"] == 5
+
+    assert await store.find_one_and_update({"id": "zz"}, {"$set": {"x": 1}}) is None
+    created = await store.find_one_and_update(
+        {"id": "new"},
+        {"$set": {"name": "Novo"}, "$setOnInsert": {"stock": 0}},
+        upsert=True,
+    )
+    assert _clean(created) == {"id": "new", "name": "Novo", "stock": 0}
+    # $setOnInsert não se aplica a documentos existentes
+    updated = await store.find_one_and_update(
+        {"id": "new"}, {"$setOnInsert": {"stock": 9}}, upsert=True
+    )
+    assert updated["stock"] == 0
+
+
+async def test_unique_key_and_delete(store):
+    with pytest.raises(DuplicateKeyError):
+        await store.insert_one({"id": "a", "name": "dup"})
+    assert await store.delete_one({"id": "a"}) == 1
+    assert await store.delete_one({"id": "a"}) == 0
+    assert await store.find_one({"id": "a"}) is None
+
+
+async def test_returned_documents_are_copies(store):
+    doc = await store.find_one({"id": "b"})
+    doc["tags"].append("mutado")
+    assert (await store.find_one({"id": "b"}))["tags"] == ["festa"]
+
+
+async def test_in_memory_secondary_unique_index():
+    store = InMemoryStore("id", unique=("email",))
+    await store.insert_one({"id": "1", "email": "a@x.ao"})
+    with pytest.raises(DuplicateKeyError):
+        await store.insert_one({"id": "2", "email": "a@x.ao"})
+    with pytest.raises(DuplicateKeyError):
+        await store.insert_one({"id": "1", "email": "b@x.ao"})
+    # o índice segue o valor atualizado
+    await store.update_one({"id": "1"}, {"$set": {"email": "c@x.ao"}})
+    await store.insert_one({"id": "2", "email": "a@x.ao"})
+    assert (await store.find_one({"email": "c@x.ao"}))["id"] == "1"
+
+
+async def test_in_memory_text_search():
+    store = InMemoryStore("id")
+    await store.insert_many(
+        [
+            {"id": "1", "name": "Copo neon", "description": ""},
+            {"id": "2", "name": "Tiara", "description": "Brilha no escuro"},
+        ]
+    )
+    assert _ids(await store.find({"$text": {"$search": "escuro"}})) == ["2"]
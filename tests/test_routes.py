@@ -0,0 +1,168 @@
+"""Rotas da API sobre os repositórios em memória (REPOSITORY_BACKEND=memory)."""
+import pytest
+
+from tests.conftest import order_payload
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def product(repos, product_doc):
+    await repos.products.store.insert_one(product_doc)
+    return product_doc
+
+
+async def test_list_and_get_product(client, product):
+    response = await client.get("/api/products")
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()["products"]] == [product["id"]]
+
+    response = await client.get(f"/api/products/{product['id']}")
+    assert response.json()["product"]["name"] == product["name"]
+    assert (await client.get("/api/products/nao-existe")).status_code == 404
+
+
+async def test_cart_add_update_remove(client, product):
+    item = {
+        "product_id": product["id"],
+        "name": product["name"],
+        "price": product["price"],
+        "image": product["image"],
+        "quantity": 1,
+    }
+    await client.post("/api/users/u1/cart/items", json=item)
+    cart = (await client.post("/api/users/u1/cart/items", json=item)).json()
+    assert [i["quantity"] for i in cart["items"]] == [2]
+
+    cart = (
+        await client.put(f"/api/users/u1/cart/items/{product['id']}?quantity=5")
+    ).json()
+    assert cart["items"][0]["quantity"] == 5
+
+    await client.delete(f"/api/users/u1/cart/items/{product['id']}")
+    assert (await client.get("/api/users/u1/cart")).json()["items"] == []
+
+
+async def test_create_order_reprices_from_catalog(client, product):
+    payload = order_payload(product, quantity=2)
+    payload["items"][0]["price"] = 0.01
+    payload["total"] = 0.02
+
+    response = await client.post("/api/orders", json=payload)
+    assert response.status_code == 200
+    order = response.json()["order"]
+    assert order["total"] == round(product["price"] * 2, 2)
+    assert order["status"] == "pending"
+
+    fetched = await client.get(f"/api/orders/{order['order_number']}")
+    assert fetched.json()["order"]["id"] == order["id"]
+
+
+async def test_create_order_rejects_unknown_product_and_short_stock(
+    client, product, repos
+):
+    unknown = order_payload({**product, "id": "nao-existe"})
+    assert (await client.post("/api/orders", json=unknown)).status_code == 400
+
+    await repos.products.store.update_one(
+        {"id": product["id"]}, {"$set": {"stock": 1}}
+    )
+    short = order_payload(product, quantity=2)
+    assert (await client.post("/api/orders", json=short)).status_code == 409
+
+
+async def test_my_orders_matches_user_and_guest_email(client, product):
+    mine = order_payload(product, user_id="u1", email="Cliente@Example.com")
+    guest = order_payload(product, user_id=None, email="cliente@example.com")
+    other = order_payload(product, user_id="u2", email="outro@example.com")
+    numbers = []
+    for payload in (mine, guest, other):
+        response = await client.post("/api/orders", json=payload)
+        numbers.append(response.json()["order"]["order_number"])
+
+    response = await client.get(
+        "/api/orders/my", params={"user_id": "u1", "email": "cliente@example.com"}
+    )
+    assert sorted(o["order_number"] for o in response.json()["orders"]) == sorted(
+        numbers[:2]
+    )
+
+    response = await client.get(
+        f"/api/orders/my/{numbers[2]}", params={"user_id": "u1"}
+    )
+    assert response.status_code == 404
+
+
+async def test_my_orders_cursor_pagination(client, product):
+    for _ in range(3):
+        await client.post("/api/orders", json=order_payload(product))
+
+    seen = []
+    params = {"user_id": "u1", "limit": 2}
+    while True:
+        page = (await client.get("/api/orders/my", params=params)).json()
+        seen += [o["order_number"] for o in page["orders"]]
+        if not page["next_cursor"]:
+            break
+        params["cursor"] = page["next_cursor"]
+    assert len(seen) == len(set(seen)) == 3
+
+
+ADMIN_HEADERS = {"X-User-Id": "admin", "X-Is-Admin": "true"}
+
+
+@pytest.fixture
+async def admin(repos):
+    await repos.users.insert(
+        {"id": "admin", "name": "Admin", "email": "admin@x.ao", "is_admin": True}
+    )
+
+
+async def test_admin_product_and_order_routes_use_repositories(
+    client, product, repos, admin
+):
+    current = (await client.get(f"/api/products/{product['id']}")).json()["product"]
+    response = await client.put(
+        f"/api/admin/products/{product['id']}",
+        json={**current, "price": 99.0},
+        headers=ADMIN_HEADERS,
+    )
+    assert response.json()["product"]["price"] == 99.0
+    listed = (await client.get("/api/admin/products", headers=ADMIN_HEADERS)).json()
+    assert listed["pagination"]["total"] == 1
+
+    numbers = [
+        (await client.post("/api/orders", json=order_payload(product))).json()[
+            "order"
+        ]["order_number"]
+        for _ in range(2)
+    ]
+    listed = (await client.get("/api/admin/orders", headers=ADMIN_HEADERS)).json()
+    assert sorted(o["order_number"] for o in listed["orders"]) == sorted(numbers)
+
+    response = await client.patch(
+        f"/api/admin/orders/{numbers[0]}",
+        json={"status": "cancelled"},
+        headers=ADMIN_HEADERS,
+    )
+    assert response.json()["order"]["status"] == "cancelled"
+
+    response = await client.post(
+        "/api/admin/orders/bulk-status",
+        json={"order_numbers": numbers, "status": "confirmed"},
+        headers=ADMIN_HEADERS,
+    )
+    outcomes = {r["order_number"]: r["outcome"] for r in response.json()["results"]}
+    assert outcomes == {numbers[0]: "invalid_transition", numbers[1]: "updated"}
+    assert (await repos.orders.get(numbers[1]))["status"] == "confirmed"
+
+    export = await client.get(
+        "/api/admin/orders/export", params={"format": "ndjson"}, headers=ADMIN_HEADERS
+    )
+    assert len(export.text.splitlines()) == 2
+
+    response = await client.delete(
+        f"/api/admin/products/{product['id']}", headers=ADMIN_HEADERS
+    )
+    assert response.status_code == 200
+    assert await repos.products.get(product["id"]) is None
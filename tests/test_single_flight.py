@@ -0,0 +1,85 @@
+"""SingleFlight: coalescência, cache negativo e `forget()` no checkout."""
+import asyncio
+
+import pytest
+
+import checkout
+from metrics import HttpMetrics
+from single_flight import SingleFlight
+from tests.conftest import order_payload
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def metrics():
+    return HttpMetrics()
+
+
+async def test_concurrent_lookups_share_one_fetch(metrics):
+    flight = SingleFlight("test", metrics=metrics)
+    release = asyncio.Event()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await release.wait()
+        return {"id": "p1"}
+
+    waiters = [asyncio.ensure_future(flight.do("p1", fetch)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters)
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert metrics.lookups == {("test", "executed"): 1, ("test", "coalesced"): 4}
+
+
+async def test_cancelled_caller_does_not_cancel_the_others(metrics):
+    flight = SingleFlight("test", metrics=metrics)
+    release = asyncio.Event()
+
+    async def fetch():
+        await release.wait()
+        return "ok"
+
+    first = asyncio.ensure_future(flight.do("k", fetch))
+    second = asyncio.ensure_future(flight.do("k", fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+
+    assert await second == "ok"
+    assert first.cancelled()
+
+
+async def test_missing_results_are_cached_until_forgotten(metrics):
+    flight = SingleFlight("test", negative_ttl=60, metrics=metrics)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return None
+
+    assert await flight.do("k", fetch) is None
+    assert await flight.do("k", fetch) is None
+    assert len(calls) == 1
+    assert metrics.lookups[("test", "negative_hit")] == 1
+
+    flight.forget("k")
+    assert await flight.do("k", fetch) is None
+    assert len(calls) == 2
+
+
+async def test_created_order_is_not_hidden_by_a_cached_404(
+    client, repos, product_doc, monkeypatch
+):
+    await repos.products.store.insert_one(product_doc)
+    monkeypatch.setattr(checkout, "_allocate_number", lambda: "1234567890")
+
+    assert (await client.get("/api/orders/1234567890")).status_code == 404
+    await client.post("/api/orders", json=order_payload(product_doc))
+
+    # o POST faz forget() do 404 guardado para este número
+    assert (await client.get("/api/orders/1234567890")).status_code == 200
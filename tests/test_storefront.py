@@ -0,0 +1,96 @@
+"""Payload da página inicial (storefront.py) sobre os repositórios em memória."""
+from datetime import datetime, timedelta
+import asyncio
+
+import pytest
+
+from storefront import HOME_SECTION_LIMIT, home_bundle
+
+pytestmark = pytest.mark.anyio
+
+T0 = datetime(2026, 1, 1)
+
+
+@pytest.fixture
+async def bundle(repos):
+    home_bundle.invalidate()
+    yield home_bundle
+    home_bundle.invalidate()
+
+
+def _product(product_doc, n, **flags):
+    return {
+        **product_doc,
+        "id": f"p{n:02d}",
+        "created_at": T0 + timedelta(days=n % 5),
+        **flags,
+    }
+
+
+async def test_sections_are_sorted_and_limited(client, repos, bundle, product_doc):
+    count = HOME_SECTION_LIMIT + 3
+    await repos.products.store.insert_many(
+        [_product(product_doc, n, featured=True) for n in reversed(range(count))]
+    )
+
+    featured = (await client.get("/api/storefront/home")).json()["featured"]
+
+    expected = sorted(
+        (_product(product_doc, n) for n in range(count)),
+        key=lambda p: (-p["created_at"].timestamp(), p["id"]),
+    )[:HOME_SECTION_LIMIT]
+    assert [p["id"] for p in featured] == [p["id"] for p in expected]
+
+
+async def test_etag_revalidation_returns_304(client, repos, bundle, product_doc):
+    await repos.products.store.insert_one({**product_doc, "featured": True})
+    builds = bundle.stats["builds"]
+
+    first = await client.get("/api/storefront/home")
+    etag = first.headers["ETag"]
+    again = await client.get("/api/storefront/home", headers={"If-None-Match": etag})
+
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["ETag"] == etag
+    assert bundle.stats["builds"] == builds + 1
+
+
+async def test_catalog_change_invalidates_the_bundle(
+    client, repos, bundle, product_doc
+):
+    from catalog_cache import invalidate_catalog
+
+    first = await client.get("/api/storefront/home")
+    assert first.json()["featured"] == []
+
+    await repos.products.store.insert_one({**product_doc, "featured": True})
+    await invalidate_catalog("test")
+
+    second = await client.get(
+        "/api/storefront/home", headers={"If-None-Match": first.headers["ETag"]}
+    )
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert [p["id"] for p in second.json()["featured"]] == [product_doc["id"]]
+
+
+async def test_build_started_before_invalidation_is_not_cached(
+    repos, bundle, monkeypatch
+):
+    import storefront
+
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_stats():
+        started.set()
+        await release.wait()
+        return []
+
+    monkeypatch.setattr(storefront.category_stats, "get", slow_stats)
+    building = asyncio.ensure_future(bundle.get())
+    await started.wait()
+    bundle.invalidate("product.update")
+    release.set()
+    await building
+
+    assert bundle.cached is None
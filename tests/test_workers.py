@@ -0,0 +1,80 @@
+"""ReconciliationWorker sobre as coleções Motor (mongomock)."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from workers import ReconciliationWorker
+
+pytestmark = pytest.mark.anyio
+
+
+def _order(number, status, created_at):
+    return {
+        "order_number": number,
+        "status": status,
+        "payment_status": "pending",
+        "created_at": created_at,
+        "items": [],
+    }
+
+
+async def test_abandoned_orders_skip_confirmed_unpaid(db):
+    old = datetime.utcnow() - timedelta(days=10)
+    await db.orders.insert_many(
+        [_order(f"C{i}", "confirmed", old) for i in range(3)]
+        + [_order("P1", "pending", old)]
+    )
+    worker = ReconciliationWorker(batch_size=2, max_batches_per_tick=1)
+
+    totals = await worker.run_once()
+
+    assert totals["expired_orders"] == 1
+    assert (await db.orders.find_one({"order_number": "P1"}))["status"] == "expired"
+    assert await db.orders.count_documents({"status": "confirmed"}) == 3
+
+
+async def test_expiry_releases_stock_only_for_orders_it_expired(db):
+    old = datetime.utcnow() - timedelta(days=10)
+    await db.products.insert_one({"id": "p1", "stock": 0})
+    reserved = {
+        "stock_reserved": True,
+        "items": [{"product_id": "p1", "quantity": 2}],
+    }
+    await db.orders.insert_many(
+        [
+            {**_order("R1", "pending", old), **reserved},
+            # já confirmado: não expira nem devolve stock
+            {**_order("R2", "confirmed", old), **reserved},
+        ]
+    )
+    worker = ReconciliationWorker(batch_size=10, max_batches_per_tick=1)
+
+    totals = await worker.run_once()
+    again = await worker.run_once()
+
+    assert totals["expired_orders"] == 1
+    assert totals["released_items"] == 2
+    assert again == {"expired_payments": 0, "expired_orders": 0, "released_items": 0}
+    assert (await db.products.find_one({"id": "p1"}))["stock"] == 2
+    assert (await db.orders.find_one({"order_number": "R2"}))["stock_reserved"]
+
+
+async def test_run_is_skipped_while_another_process_holds_the_lease(db):
+    old = datetime.utcnow() - timedelta(days=10)
+    await db.orders.insert_one(_order("P1", "pending", old))
+    holder = ReconciliationWorker(owner="outro:1")
+    assert await holder._acquire_lease()
+    worker = ReconciliationWorker(owner="este:2")
+
+    totals = await worker.run_once()
+
+    assert totals["expired_orders"] == 0
+    assert worker.stats["skipped_runs"] == 1
+    assert (await db.orders.find_one({"order_number": "P1"}))["status"] == "pending"
+
+    # lease expirado (mais de 1s: o mongomock guarda datas ao milissegundo)
+    await db.meta.update_one(
+        {"_id": "reconciliation_lease"},
+        {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}},
+    )
+    assert (await worker.run_once())["expired_orders"] == 1